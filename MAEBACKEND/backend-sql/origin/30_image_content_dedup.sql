@@ -0,0 +1,25 @@
+-- =====================================================
+-- 30. DEDUPLICACIÓN DE IMÁGENES POR CONTENIDO
+-- =====================================================
+-- Objetivo:
+-- 1) Guardar el SHA-256 del archivo subido para detectar resubidas.
+-- 2) Permitir que varias filas de core.images compartan los mismos
+--    archivos (mismo original_url). El conteo de referencias es el
+--    número de filas con ese original_url: los archivos se borran del
+--    disco solo al eliminar la última.
+
+-- =====================================================
+
+ALTER TABLE core.images
+    ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+COMMENT ON COLUMN core.images.content_hash IS 'SHA-256 (hex) del archivo original subido';
+
+-- Búsqueda de duplicados al subir
+CREATE INDEX IF NOT EXISTS images_content_hash_idx
+ON core.images (content_hash)
+WHERE content_hash IS NOT NULL;
+
+-- Conteo de referencias al eliminar
+CREATE INDEX IF NOT EXISTS images_original_url_idx
+ON core.images (original_url);
@@ -0,0 +1,41 @@
+-- =====================================================
+-- 31. HASH PERCEPTUAL DE IMÁGENES (MODERACIÓN)
+-- =====================================================
+-- Objetivo:
+-- Encontrar fotos casi iguales entre publicaciones (reposts de estafas)
+-- sin comparar contra todas las imágenes.
+--
+-- core.images.phash guarda el pHash de 64 bits como BIGINT. La búsqueda a
+-- distancia de Hamming <= k usa multi-index hashing: el hash se parte en 4
+-- bandas de 16 bits y, por el principio del palomar, cualquier imagen a
+-- distancia <= k coincide en al menos una banda a distancia <= floor(k/4).
+-- Cada banda tiene su índice de expresión; la distancia exacta se filtra
+-- con bit_count() sobre los pocos candidatos.
+
+-- =====================================================
+
+ALTER TABLE core.images
+    ADD COLUMN IF NOT EXISTS phash BIGINT;
+
+COMMENT ON COLUMN core.images.phash IS 'pHash de 64 bits (imagehash) como entero con signo';
+
+CREATE INDEX IF NOT EXISTS images_phash_band0_idx
+ON core.images (((phash >> 48) & 65535))
+WHERE phash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS images_phash_band1_idx
+ON core.images (((phash >> 32) & 65535))
+WHERE phash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS images_phash_band2_idx
+ON core.images (((phash >> 16) & 65535))
+WHERE phash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS images_phash_band3_idx
+ON core.images ((phash & 65535))
+WHERE phash IS NOT NULL;
+
+-- Backfill (job media.backfill_image_phash): recorre por id las pendientes
+CREATE INDEX IF NOT EXISTS images_phash_pending_idx
+ON core.images (id)
+WHERE phash IS NULL;
@@ -0,0 +1,41 @@
+"""image_content_hash
+
+Revision ID: b7c3e91d2f45
+Revises: a4f6e2fb3c10
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = 'b7c3e91d2f45'
+down_revision = 'a4f6e2fb3c10'
+branch_labels = None
+depends_on = None
+
+
+def _column_exists(table_name: str, column_name: str, schema: str = 'core') -> bool:
+    bind = op.get_bind()
+    columns = inspect(bind).get_columns(table_name, schema=schema)
+    return any(column['name'] == column_name for column in columns)
+
+
+def upgrade() -> None:
+    if not _column_exists('images', 'content_hash'):
+        op.add_column('images', sa.Column('content_hash', sa.Text(), nullable=True), schema='core')
+
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS images_content_hash_idx "
+        "ON core.images (content_hash) WHERE content_hash IS NOT NULL"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS images_original_url_idx ON core.images (original_url)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS core.images_original_url_idx")
+    op.execute("DROP INDEX IF EXISTS core.images_content_hash_idx")
+
+    if _column_exists('images', 'content_hash'):
+        op.drop_column('images', 'content_hash', schema='core')
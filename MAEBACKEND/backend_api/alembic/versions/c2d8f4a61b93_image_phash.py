@@ -0,0 +1,54 @@
+"""image_phash
+
+Revision ID: c2d8f4a61b93
+Revises: b7c3e91d2f45
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+# revision identifiers, used by Alembic.
+revision = 'c2d8f4a61b93'
+down_revision = 'b7c3e91d2f45'
+branch_labels = None
+depends_on = None
+
+
+PHASH_BAND_EXPRESSIONS = {
+    'images_phash_band0_idx': '((phash >> 48) & 65535)',
+    'images_phash_band1_idx': '((phash >> 32) & 65535)',
+    'images_phash_band2_idx': '((phash >> 16) & 65535)',
+    'images_phash_band3_idx': '(phash & 65535)',
+}
+
+
+def _column_exists(table_name: str, column_name: str, schema: str = 'core') -> bool:
+    bind = op.get_bind()
+    columns = inspect(bind).get_columns(table_name, schema=schema)
+    return any(column['name'] == column_name for column in columns)
+
+
+def upgrade() -> None:
+    if not _column_exists('images', 'phash'):
+        op.add_column('images', sa.Column('phash', sa.BigInteger(), nullable=True), schema='core')
+
+    for index_name, expression in PHASH_BAND_EXPRESSIONS.items():
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {index_name} "
+            f"ON core.images ({expression}) WHERE phash IS NOT NULL"
+        )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS images_phash_pending_idx "
+        "ON core.images (id) WHERE phash IS NULL"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS core.images_phash_pending_idx")
+    for index_name in PHASH_BAND_EXPRESSIONS:
+        op.execute(f"DROP INDEX IF EXISTS core.{index_name}")
+
+    if _column_exists('images', 'phash'):
+        op.drop_column('images', 'phash', schema='core')
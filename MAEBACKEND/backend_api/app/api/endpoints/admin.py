@@ -13,7 +13,8 @@ from app.schemas.admin import (
     UserSuspensionCreate, UserSuspensionResponse, AdminListingListResponse,
     AdminListingResponse, ListingFlagCreate, ListingFlagResponse,
     SystemHealthResponse, SystemMetricsResponse, AuditLogListResponse,
-    UserFilters, ListingFilters, AuditLogFilters
+    UserFilters, ListingFilters, AuditLogFilters,
+    SimilarImagesResponse, ListingSimilarImagesResponse
 )
 from app.schemas.admin_plans import (
     SubscriptionPlanUpdate,
@@ -27,6 +28,8 @@ from app.schemas.auth import UserResponse
 from app.core.exceptions import NotFoundError, ValidationError
 from app.models.subscription import Plan as SubscriptionPlan
 from app.models.auth import User
+from app.core.config import settings
+from app.services.image_similarity_service import ImageSimilarityService, MAX_SEARCH_DISTANCE
 
 router = APIRouter()
 
@@ -328,6 +331,82 @@ def flag_listing(
         )
 
 
+# Image Moderation Endpoints
+@router.get("/moderation/images/{image_id}/similar", response_model=SimilarImagesResponse)
+def get_similar_images(
+    image_id: UUID = Path(..., description="ID de la imagen"),
+    max_distance: Optional[int] = Query(None, ge=0, le=MAX_SEARCH_DISTANCE, description="Distancia de Hamming máxima"),
+    include_same_listing: bool = Query(False, description="Incluir imágenes del mismo listing"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Imágenes casi iguales a una imagen (pHash)
+    
+    - Busca en todos los listings fotos a distancia de Hamming <= max_distance
+    - Útil para detectar reposts de publicaciones fraudulentas
+    """
+    if max_distance is None:
+        max_distance = settings.image_phash_max_distance
+    
+    matches = ImageSimilarityService(db).similar_to_image(
+        str(image_id),
+        max_distance=max_distance,
+        include_same_listing=include_same_listing,
+        limit=limit
+    )
+    if matches is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Imagen no encontrada o sin hash perceptual"
+        )
+    
+    return SimilarImagesResponse(image_id=image_id, max_distance=max_distance, matches=matches)
+
+
+@router.get("/moderation/listings/{listing_id}/similar-images", response_model=ListingSimilarImagesResponse)
+def get_listing_similar_images(
+    listing_id: UUID = Path(..., description="ID del listing"),
+    max_distance: Optional[int] = Query(None, ge=0, le=MAX_SEARCH_DISTANCE, description="Distancia de Hamming máxima"),
+    limit_per_image: int = Query(20, ge=1, le=100),
+    current_user: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Imágenes de un listing que aparecen en otros listings
+    
+    - Para cada foto del listing, fotos casi iguales de otras publicaciones
+    - Solo incluye las fotos con coincidencias
+    """
+    if max_distance is None:
+        max_distance = settings.image_phash_max_distance
+    
+    images = ImageSimilarityService(db).similar_for_listing(
+        str(listing_id),
+        max_distance=max_distance,
+        limit_per_image=limit_per_image
+    )
+    
+    return ListingSimilarImagesResponse(listing_id=listing_id, max_distance=max_distance, images=images)
+
+
+@router.post("/moderation/images/phash-backfill", status_code=status.HTTP_202_ACCEPTED)
+def backfill_image_phash(
+    batch_size: Optional[int] = Query(None, ge=1, le=5000),
+    current_user: UserResponse = Depends(get_current_admin_user)
+):
+    """
+    Calcular el hash perceptual de las imágenes subidas antes de tenerlo
+    
+    - Se ejecuta en Celery por lotes hasta completar todas las imágenes
+    """
+    from app.tasks.media_tasks import backfill_image_phash_task
+    
+    task = backfill_image_phash_task.delay(batch_size=batch_size)
+    return {"task_id": task.id, "status": "queued"}
+
+
 # System Health Endpoints
 @router.get("/system/health", response_model=SystemHealthResponse)
 def get_system_health(
@@ -1,12 +1,12 @@
 """
 Endpoints para el sistema de reservas Airbnb
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from uuid import UUID
 import logging
 from decimal import Decimal
@@ -15,9 +15,10 @@ from pathlib import Path
 import hashlib
 
 from ...core.database import get_db
+from ...core.utils import decode_keyset_cursor, encode_keyset_cursor
 from ...api.deps import get_current_user
 from ...models.auth import User
-from ...models.booking import Booking, BookingPayment, BookingCalendar
+from ...models.booking import Booking, BookingPayment, BookingCalendar, BookingStatus
 from ...models.listing import Listing
 from ...models.media import Image
 from ...schemas.bookings import (
@@ -30,6 +31,7 @@ from ...schemas.bookings import (
 )
 from ...services.message_service import MessageService
 from ...services.notification_service import NotificationService
+from ...services.payment_deadline_queue import payment_deadline_queue
 from ...models.notification import NotificationType, NotificationPriority, DeliveryMethod
 from ...schemas.notifications import NotificationCreate
 from ...tasks.email_tasks import (
@@ -501,48 +503,186 @@ async def create_booking(
         )
 
 
+# Listado de reservas (huésped / anfitrión) en un único round-trip:
+# página por keyset (created_at, id) sobre idx_bookings_{guest,host}_created
+# (o por page/limit, o la lista completa si el cliente no pagina),
+# proyección con título/imagen principal del listing y datos de la contraparte,
+# y conteo por estado calculado en la misma consulta.
+_BOOKINGS_PAGE_SQL = """
+    WITH status_counts AS (
+        SELECT b.status, COUNT(*) AS cnt
+        FROM core.bookings b
+        WHERE b.{owner_column} = :user_id
+        GROUP BY b.status
+    ),
+    page AS (
+        SELECT
+            b.id,
+            b.listing_id,
+            b.check_in_date,
+            b.check_out_date,
+            b.nights,
+            b.number_of_guests,
+            b.total_price,
+            b.reservation_amount,
+            b.status,
+            b.guest_message,
+            b.payment_deadline,
+            b.reservation_paid_at,
+            b.payment_proof_url,
+            b.payment_proof_uploaded_at,
+            b.created_at,
+            l.title AS listing_title,
+            img.medium_url AS listing_image,
+            p.first_name AS party_first_name,
+            p.last_name AS party_last_name,
+            p.email AS party_email,
+            p.phone AS party_phone,
+            p.profile_picture_url AS party_profile_picture
+        FROM core.bookings b
+        LEFT JOIN core.listings l
+            ON l.id = b.listing_id AND l.created_at = b.listing_created_at
+        LEFT JOIN core.users p ON p.id = b.{party_column}
+        LEFT JOIN LATERAL (
+            SELECT i.medium_url
+            FROM core.images i
+            WHERE i.listing_id = b.listing_id
+            ORDER BY i.is_main DESC, i.display_order, i.created_at
+            LIMIT 1
+        ) img ON TRUE
+        WHERE b.{owner_column} = :user_id
+          {status_filter}
+          {cursor_filter}
+        ORDER BY b.created_at DESC, b.id DESC
+        LIMIT :page_limit OFFSET :page_offset
+    )
+    SELECT page.*, counts.status_counts
+    FROM (
+        SELECT COALESCE(json_object_agg(status, cnt), '{{}}'::json) AS status_counts
+        FROM status_counts
+    ) counts
+    LEFT JOIN page ON TRUE
+    ORDER BY page.created_at DESC, page.id DESC
+"""
+
+
+DEFAULT_BOOKINGS_PAGE_SIZE = 50
+_BOOKING_STATUS_VALUES = {booking_status.value for booking_status in BookingStatus}
+
+
+def _fetch_bookings_page(
+    db: Session,
+    user_id: UUID,
+    as_host: bool,
+    statuses: Optional[List[str]],
+    cursor: Optional[str],
+    limit: Optional[int],
+    page: Optional[int] = None,
+) -> dict:
+    """
+    Modos de paginación:
+    - ``cursor`` (o solo ``limit``): keyset, devuelve ``next_cursor``
+    - ``page``: offset clásico page/limit
+    - sin parámetros: todas las reservas (contrato anterior, sin recorte)
+    """
+    owner_column = "host_user_id" if as_host else "guest_user_id"
+    party_column = "guest_user_id" if as_host else "host_user_id"
+
+    paginated = cursor is not None or page is not None or limit is not None
+    if paginated:
+        limit = limit or DEFAULT_BOOKINGS_PAGE_SIZE
+    params = {
+        "user_id": user_id,
+        "page_limit": limit + 1 if paginated else None,
+        "page_offset": (page - 1) * limit if page and not cursor else 0,
+    }
+
+    status_filter = ""
+    if statuses:
+        invalid = sorted(set(statuses) - _BOOKING_STATUS_VALUES)
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Estado de reserva inválido: {', '.join(invalid)}")
+        # b.status es core.booking_status: un text[] no se compara con el enum
+        status_filter = "AND b.status = ANY(CAST(:statuses AS core.booking_status[]))"
+        params["statuses"] = list(statuses)
+
+    cursor_filter = ""
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_keyset_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+        cursor_filter = "AND (b.created_at, b.id) < (:cursor_created_at, :cursor_id)"
+        params["cursor_created_at"] = cursor_created_at
+        params["cursor_id"] = cursor_id
+
+    sql = _BOOKINGS_PAGE_SQL.format(
+        owner_column=owner_column,
+        party_column=party_column,
+        status_filter=status_filter,
+        cursor_filter=cursor_filter,
+    )
+    rows = db.execute(text(sql), params).fetchall()
+
+    status_counts = {key: int(value) for key, value in (rows[0].status_counts or {}).items()} if rows else {}
+    page_rows = [row for row in rows if row.id is not None]
+
+    has_more = paginated and len(page_rows) > limit
+    if paginated:
+        page_rows = page_rows[:limit]
+    next_cursor = None
+    if has_more and page_rows and page is None:
+        last = page_rows[-1]
+        next_cursor = encode_keyset_cursor(last.created_at, last.id)
+
+    if statuses:
+        total = sum(status_counts.get(status_value, 0) for status_value in set(statuses))
+    else:
+        total = sum(status_counts.values())
+
+    return {
+        "rows": page_rows,
+        "total": total,
+        "status_counts": status_counts,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    }
+
+
+def _party_name(row) -> str:
+    return f"{row.party_first_name or ''} {row.party_last_name or ''}".strip() or "N/A"
+
+
 @router.get("/my-bookings",
     summary="Mis reservas como huésped"
 )
 async def get_my_bookings(
-    status: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en next_cursor"),
+    page: Optional[int] = Query(None, ge=1, description="Paginación por offset (page/limit)"),
+    limit: Optional[int] = Query(None, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Lista todas las reservas del usuario actual como huésped.
+    Lista las reservas del usuario actual como huésped. Paginación por
+    cursor (opt-in con ``cursor``/``limit``) o por ``page``/``limit``; sin
+    esos parámetros devuelve todas.
     Incluye información del deadline de pago y estado.
     """
     try:
-        query = db.query(Booking).filter(Booking.guest_user_id == current_user.id)
-        
-        if status:
-            query = query.filter(Booking.status == status)
-        
-        bookings = query.order_by(Booking.created_at.desc()).all()
+        bookings_page = _fetch_bookings_page(db, current_user.id, False, status, cursor, limit, page)
+        now = datetime.now(timezone.utc)
         
         result = []
-        for booking in bookings:
-            # Obtener info del listing
-            listing = db.query(Listing).filter(Listing.id == booking.listing_id).first()
-            # Obtener info del host
-            host = db.query(User).filter(User.id == booking.host_user_id).first()
-            
-            # Obtener primera imagen del listing
-            first_image = db.query(Image).filter(
-                Image.listing_id == booking.listing_id
-            ).order_by(Image.display_order, Image.created_at).first()
-            
+        for booking in bookings_page["rows"]:
             # Calcular tiempo restante para pago
             hours_remaining = None
             payment_status = None
             if booking.status == 'confirmed' and booking.payment_deadline:
-                from datetime import datetime, timezone
-                now = datetime.now(timezone.utc)
                 deadline = booking.payment_deadline
                 if deadline.tzinfo is None:
-                    from datetime import timezone as tz
-                    deadline = deadline.replace(tzinfo=tz.utc)
+                    deadline = deadline.replace(tzinfo=timezone.utc)
                 
                 if booking.reservation_paid_at:
                     payment_status = 'paid'
@@ -555,12 +695,12 @@ async def get_my_bookings(
             result.append({
                 "id": str(booking.id),
                 "listing_id": str(booking.listing_id),
-                "listing_title": listing.title if listing else "N/A",
-                "listing_image": first_image.medium_url if first_image else None,
-                "host_name": f"{host.first_name or ''} {host.last_name or ''}".strip() if host else "N/A",
-                "host_email": host.email if host else None,
-                "host_phone": host.phone if host else None,
-                "host_profile_picture": host.profile_picture_url if host else None,
+                "listing_title": booking.listing_title or "N/A",
+                "listing_image": booking.listing_image,
+                "host_name": _party_name(booking),
+                "host_email": booking.party_email,
+                "host_phone": booking.party_phone,
+                "host_profile_picture": booking.party_profile_picture,
                 "check_in_date": booking.check_in_date.isoformat(),
                 "check_out_date": booking.check_out_date.isoformat(),
                 "nights": booking.nights,
@@ -576,8 +716,16 @@ async def get_my_bookings(
                 "created_at": booking.created_at.isoformat()
             })
         
-        return {"bookings": result, "total": len(result)}
+        return {
+            "bookings": result,
+            "total": bookings_page["total"],
+            "status_counts": bookings_page["status_counts"],
+            "next_cursor": bookings_page["next_cursor"],
+            "has_more": bookings_page["has_more"]
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo reservas del huésped: {e}")
         raise HTTPException(
@@ -591,46 +739,31 @@ async def get_my_bookings(
     summary="Mis reservas como anfitrión"
 )
 async def get_host_bookings(
-    status: Optional[List[str]] = None,
+    status: Optional[List[str]] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en next_cursor"),
+    page: Optional[int] = Query(None, ge=1, description="Paginación por offset (page/limit)"),
+    limit: Optional[int] = Query(None, ge=1, le=100),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Lista todas las reservas de las propiedades del usuario como anfitrión.
-    Filtra por status si se proporciona.
+    Lista las reservas de las propiedades del usuario como anfitrión.
+    Paginación por cursor (opt-in con ``cursor``/``limit``) o por
+    ``page``/``limit``; sin esos parámetros devuelve todas. Filtra por
+    status si se proporciona.
     """
     try:
-        print(f"🔍 DEBUG get_host_bookings - INICIO")
-        print(f"🔍 DEBUG get_host_bookings - user_id: {current_user.id}")
-        print(f"🔍 DEBUG get_host_bookings - status filter: {status}")
-        print(f"🔍 DEBUG get_host_bookings - status type: {type(status)}")
-        
-        # Buscar directamente por host_user_id (más eficiente)
-        query = db.query(Booking).filter(Booking.host_user_id == current_user.id)
-        print(f"🔍 DEBUG get_host_bookings - Query creada")
-        
-        if status and len(status) > 0:
-            print(f"🔍 DEBUG get_host_bookings - Aplicando filtro de status")
-            query = query.filter(Booking.status.in_(status))
-        
-        print(f"🔍 DEBUG get_host_bookings - Ejecutando query...")
-        bookings = query.order_by(Booking.created_at.desc()).all()
-        
-        print(f"🔍 DEBUG get_host_bookings - bookings count: {len(bookings)}")
+        bookings_page = _fetch_bookings_page(db, current_user.id, True, status, cursor, limit, page)
         
         result = []
-        for booking in bookings:
-            # Obtener info del listing
-            listing = db.query(Listing).filter(Listing.id == booking.listing_id).first()
-            # Obtener info del huésped
-            guest = db.query(User).filter(User.id == booking.guest_user_id).first()
-            
+        for booking in bookings_page["rows"]:
             result.append({
                 "id": str(booking.id),
                 "listing_id": str(booking.listing_id),
-                "listing_title": listing.title if listing else "N/A",
-                "guest_name": f"{guest.first_name or ''} {guest.last_name or ''}".strip() if guest else "N/A",
-                "guest_email": guest.email if guest else None,
+                "listing_title": booking.listing_title or "N/A",
+                "listing_image": booking.listing_image,
+                "guest_name": _party_name(booking),
+                "guest_email": booking.party_email,
                 "check_in_date": booking.check_in_date.isoformat(),
                 "check_out_date": booking.check_out_date.isoformat(),
                 "nights": booking.nights,
@@ -641,13 +774,17 @@ async def get_host_bookings(
                 "created_at": booking.created_at.isoformat()
             })
         
-        return {"bookings": result, "total": len(result)}
+        return {
+            "bookings": result,
+            "total": bookings_page["total"],
+            "status_counts": bookings_page["status_counts"],
+            "next_cursor": bookings_page["next_cursor"],
+            "has_more": bookings_page["has_more"]
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ ERROR en get_host_bookings: {e}")
-        print(f"❌ ERROR type: {type(e)}")
-        import traceback
-        traceback.print_exc()
         logger.error(f"Error obteniendo reservas del host: {e}")
         raise HTTPException(
             status_code=500,
@@ -725,6 +862,10 @@ async def confirm_booking(
         
         logger.info(f"Reserva {booking_id} confirmada por host {current_user.id}")
         
+        # Programar recordatorio y expiración del plazo en la cola diferida
+        if not payment_deadline_queue.register(str(booking.id), payment_deadline):
+            logger.warning(f"⚠️ No se pudo encolar el plazo de pago de la reserva {booking_id}")
+        
         # Obtener información del huésped y la propiedad para el email
         guest = db.query(User).filter(User.id == booking.guest_user_id).first()
         listing = db.query(Listing).filter(Listing.id == booking.listing_id).first()
@@ -1457,6 +1598,9 @@ async def process_payment(
         
         db.commit()
         
+        if booking.reservation_paid_at:
+            payment_deadline_queue.unregister(str(booking.id))
+        
         # TODO: Enviar email de confirmación de pago
         
         return {
@@ -1566,6 +1710,9 @@ async def verify_payment(
         
         db.commit()
         
+        if approved:
+            payment_deadline_queue.unregister(str(booking.id))
+        
         return {
             "message": message,
             "booking_id": str(booking.id),
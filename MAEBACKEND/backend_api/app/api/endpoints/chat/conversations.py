@@ -1,7 +1,7 @@
 """
 REST API endpoints for chat conversations and messages.
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from uuid import UUID
 from typing import List, Optional
 from sqlalchemy.orm import Session
@@ -14,8 +14,9 @@ from app.schemas.chat import (
     ConversationListResponse,
     UnreadCountResponse
 )
-from app.services.message_service import MessageService
+from app.services.message_service import MessageService, message_event_data
 from app.core.database import get_db
+from app.core.utils import encode_keyset_cursor
 from app.api.deps import get_current_user
 from app.models.auth import User
 
@@ -68,15 +69,20 @@ async def create_conversation(
 
 @router.get("/conversations", response_model=List[ConversationListResponse])
 async def list_conversations(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de conversaciones a saltar"),
     limit: int = Query(20, ge=1, le=100, description="Número máximo de conversaciones"),
     archived: bool = Query(False, description="Incluir conversaciones archivadas"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Listar todas las conversaciones del usuario actual.
     
+    **Paginación:** con `cursor` (keyset sobre `updated_at`) se ignora `skip`.
+    Si hay más páginas, la respuesta incluye la cabecera `X-Next-Cursor`.
+    
     **Retorna:**
     - Lista de conversaciones ordenadas por actividad (última actualización)
     - Información del otro participante
@@ -91,9 +97,14 @@ async def list_conversations(
         user_id=current_user.id,
         skip=skip,
         limit=limit,
-        include_archived=archived
+        include_archived=archived,
+        cursor=cursor
     )
     
+    if len(conversations) == limit:
+        last = conversations[-1]
+        response.headers["X-Next-Cursor"] = encode_keyset_cursor(last.updated_at, last.id)
+    
     return conversations
 
 
@@ -133,9 +144,11 @@ async def get_conversation(
 )
 async def get_messages(
     conversation_id: UUID,
-    skip: int = Query(0, ge=0, description="Número de mensajes a saltar"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Número de mensajes a saltar (legado, usar cursor)"),
     limit: int = Query(50, ge=1, le=100, description="Número máximo de mensajes"),
-    before: Optional[str] = Query(None, description="Timestamp ISO para paginación (mensajes anteriores)"),
+    before: Optional[str] = Query(None, description="Timestamp ISO (legado, usar cursor)"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -144,13 +157,15 @@ async def get_messages(
     
     **Paginación:**
     - Los mensajes se retornan en orden descendente (más recientes primero)
-    - Usa `before` con el timestamp del último mensaje para cargar mensajes anteriores (scroll infinito)
+    - Si hay más historial, la respuesta incluye la cabecera `X-Next-Cursor`;
+      envíala como `cursor` para cargar mensajes anteriores (scroll infinito)
+    - La primera página se sirve desde caché (mensajes recientes en Redis)
     
     **Ejemplo de uso:**
     ```
     GET /chat/conversations/{id}/messages?limit=50
     # Para cargar más mensajes antiguos:
-    GET /chat/conversations/{id}/messages?limit=50&before=2025-12-12T10:00:00Z
+    GET /chat/conversations/{id}/messages?limit=50&cursor=<X-Next-Cursor>
     ```
     
     **Requiere autenticación y acceso a la conversación.**
@@ -169,9 +184,14 @@ async def get_messages(
         conversation_id=conversation_id,
         skip=skip,
         limit=limit,
-        before=before
+        before=before,
+        cursor=cursor
     )
     
+    if len(messages) == limit:
+        last = messages[-1]
+        response.headers["X-Next-Cursor"] = encode_keyset_cursor(last.created_at, last.id)
+    
     return messages
 
 
@@ -197,43 +217,30 @@ async def send_message(
     """
     service = MessageService(db)
     
-    # Verificar acceso
-    conversation = await service.get_conversation(conversation_id, current_user.id)
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversación no encontrada o sin acceso"
-        )
-    
-    # Crear mensaje
-    message = await service.create_message(
+    # Verifica acceso e inserta en una sola sentencia (404 si no hay acceso)
+    result = await service.send_message(
         conversation_id=conversation_id,
         sender_id=current_user.id,
         content=message_data.content,
         message_type=message_data.message_type.value,
         media_url=message_data.media_url
     )
+    message = result["message"]
     
     # Notificar vía WebSocket si hay conexiones activas
     from app.services.chat.websocket_manager import manager
     await manager.broadcast_to_conversation(
         {
             "type": "message",
-            "data": {
-                "id": str(message.id),
-                "conversation_id": str(message.conversation_id),
-                "sender_user_id": str(message.sender_user_id),
-                "content": message.content,
-                "message_type": message.message_type,
-                "status": message.status,
-                "created_at": message.created_at.isoformat(),
-                "updated_at": message.updated_at.isoformat()
-            }
+            "data": message_event_data(message)
         },
         conversation_id
     )
     
-    return message
+    # Push/email al destinatario desconectado, fuera del camino de la respuesta
+    service.notify_offline_recipient(message, result["recipient_id"])
+    
+    return MessageResponse.model_validate(message)
 
 
 @router.patch("/messages/{message_id}/read", status_code=status.HTTP_204_NO_CONTENT)
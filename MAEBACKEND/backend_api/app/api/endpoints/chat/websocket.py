@@ -1,7 +1,7 @@
 """
 WebSocket endpoint for real-time chat.
 """
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Query, status
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, status
 from uuid import UUID
 from typing import Optional
 import json
@@ -9,8 +9,9 @@ import logging
 from datetime import datetime
 
 from app.services.chat.websocket_manager import manager
-from app.services.message_service import MessageService
-from app.core.database import get_db
+from app.services.message_service import MessageService, message_event_data
+from app.services.presence_service import presence_service
+from app.core.database import db_session
 from app.core.security import verify_token
 from sqlalchemy.orm import Session
 
@@ -62,8 +63,7 @@ async def get_current_user_websocket(token: str, db: Session):
 async def websocket_endpoint(
     websocket: WebSocket,
     conversation_id: UUID,
-    token: str = Query(..., description="JWT access token"),
-    db: Session = Depends(get_db)
+    token: str = Query(..., description="JWT access token")
 ):
     """
     WebSocket endpoint para chat en tiempo real.
@@ -77,7 +77,8 @@ async def websocket_endpoint(
     {
         "type": "message",
         "content": "Hola, me interesa la propiedad",
-        "message_type": "text"
+        "message_type": "text",
+        "client_message_id": "id-local-opcional"
     }
     
     // Indicador de escritura
@@ -86,13 +87,13 @@ async def websocket_endpoint(
         "is_typing": true
     }
     
-    // Marcar mensaje como leído
+    // Marcar como leído todo lo recibido hasta un mensaje (marca de agua)
     {
         "type": "read",
-        "message_id": "uuid-del-mensaje"
+        "read_up_to": "uuid-del-ultimo-mensaje-leido"
     }
     
-    // Ping (mantener conexión viva)
+    // Ping / heartbeat (mantener conexión viva y renovar presencia)
     {
         "type": "ping"
     }
@@ -111,7 +112,8 @@ async def websocket_endpoint(
             "created_at": "2025-12-12T10:00:00Z",
             "status": "delivered"
         },
-        "timestamp": "2025-12-12T10:00:00Z"
+        "timestamp": "2025-12-12T10:00:00Z",
+        "client_message_id": "id-local-opcional"  // solo si el emisor lo envió
     }
     
     // Indicador de escritura
@@ -130,12 +132,14 @@ async def websocket_endpoint(
         "timestamp": "2025-12-12T10:00:00Z"
     }
     
-    // Confirmación de lectura
+    // Confirmación de lectura (cubre todo hasta read_up_to)
     {
         "type": "read_receipt",
         "message_id": "uuid",
         "read_by": "uuid",
-        "read_at": "2025-12-12T10:00:00Z"
+        "read_at": "2025-12-12T10:00:00Z",
+        "read_up_to": "2025-12-12T09:59:00Z",
+        "read_count": 12
     }
     
     // Error
@@ -147,38 +151,37 @@ async def websocket_endpoint(
     ```
     """
     
+    # El socket no retiene sesión de BD: cada frame que necesita la base de
+    # datos abre una sesión corta con db_session() y la libera al terminar,
+    # así los sockets inactivos no ocupan conexiones del pool.
     try:
-        # Autenticar usuario
+        # Autenticar usuario y verificar acceso a la conversación
         logger.info(f"[WS] Authenticating WebSocket connection for conversation {conversation_id}")
-        current_user = await get_current_user_websocket(token, db)
-        logger.info(f"[WS] User authenticated: {current_user.id}")
-        
-        # Verificar acceso a la conversación
-        message_service = MessageService(db)
-        logger.info(f"[WS] Checking conversation access for user {current_user.id}")
-        conversation = await message_service.get_conversation(
-            conversation_id, 
-            current_user.id
-        )
+        with db_session() as db:
+            current_user = await get_current_user_websocket(token, db)
+            user_id = current_user.id
+            logger.info(f"[WS] User authenticated: {user_id}")
+            
+            logger.info(f"[WS] Checking conversation access for user {user_id}")
+            conversation = await MessageService(db).get_conversation(
+                conversation_id, 
+                user_id
+            )
         
         if not conversation:
-            logger.warning(f"[WS] User {current_user.id} has no access to conversation {conversation_id}")
+            logger.warning(f"[WS] User {user_id} has no access to conversation {conversation_id}")
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
         
         logger.info(f"[WS] Conversation access granted, connecting WebSocket")
         
         # Conectar al WebSocket manager
-        await manager.connect(websocket, current_user.id, conversation_id)
+        await manager.connect(websocket, user_id, conversation_id)
         logger.info(f"[WS] WebSocket connected to manager")
         
-        # Actualizar presencia del usuario
+        # Actualizar presencia del usuario (Redis, sin BD)
         try:
-            await message_service.update_user_presence(
-                current_user.id,
-                is_online=True,
-                increment_connections=1
-            )
+            presence_service.connect(user_id)
             logger.info(f"[WS] User presence updated")
         except Exception as e:
             logger.error(f"[WS] Error updating presence: {e}", exc_info=True)
@@ -187,7 +190,7 @@ async def websocket_endpoint(
         try:
             await manager.broadcast_presence(
                 conversation_id,
-                current_user.id,
+                user_id,
                 is_online=True
             )
             logger.info(f"[WS] Presence broadcasted")
@@ -195,7 +198,7 @@ async def websocket_endpoint(
             logger.error(f"[WS] Error broadcasting presence: {e}", exc_info=True)
         
         logger.info(
-            f"[WS] ✅ User {current_user.id} fully connected to conversation {conversation_id}"
+            f"[WS] ✅ User {user_id} fully connected to conversation {conversation_id}"
         )
         
         try:
@@ -205,7 +208,7 @@ async def websocket_endpoint(
                 try:
                     data = await websocket.receive_json()
                 except json.JSONDecodeError:
-                    await websocket.send_json({
+                    manager.send_to_socket(websocket, {
                         "type": "error",
                         "message": "Formato JSON inválido",
                         "timestamp": datetime.utcnow().isoformat()
@@ -221,47 +224,46 @@ async def websocket_endpoint(
                         msg_type = data.get("message_type", "text")
                         
                         if not content:
-                            await websocket.send_json({
+                            manager.send_to_socket(websocket, {
                                 "type": "error",
                                 "message": "El contenido del mensaje no puede estar vacío",
                                 "timestamp": datetime.utcnow().isoformat()
                             })
                             continue
                         
-                        # Guardar mensaje en BD
-                        saved_message = await message_service.create_message(
-                            conversation_id=conversation_id,
-                            sender_id=current_user.id,
-                            content=content,
-                            message_type=msg_type
-                        )
+                        # Guardar mensaje en BD (un único INSERT ... RETURNING)
+                        with db_session() as db:
+                            result = await MessageService(db).send_message(
+                                conversation_id=conversation_id,
+                                sender_id=user_id,
+                                content=content,
+                                message_type=msg_type
+                            )
+                        saved_message = result["message"]
                         
-                        # Broadcast a todos los participantes de la conversación
-                        await manager.broadcast_to_conversation(
-                            {
-                                "type": "message",
-                                "data": {
-                                    "id": str(saved_message.id),
-                                    "conversation_id": str(saved_message.conversation_id),
-                                    "sender_user_id": str(saved_message.sender_user_id),
-                                    "content": saved_message.content,
-                                    "message_type": saved_message.message_type,
-                                    "status": saved_message.status,
-                                    "created_at": saved_message.created_at.isoformat(),
-                                    "updated_at": saved_message.updated_at.isoformat()
-                                },
-                                "timestamp": datetime.utcnow().isoformat()
-                            },
-                            conversation_id
+                        # Broadcast a todos los participantes de la conversación;
+                        # para el remitente es el ack (eco de client_message_id)
+                        event = {
+                            "type": "message",
+                            "data": message_event_data(saved_message),
+                            "timestamp": datetime.utcnow().isoformat()
+                        }
+                        if data.get("client_message_id"):
+                            event["client_message_id"] = data["client_message_id"]
+                        await manager.broadcast_to_conversation(event, conversation_id)
+                        
+                        # Push/email para el destinatario desconectado, diferido a Celery
+                        MessageService.notify_offline_recipient(
+                            saved_message, result["recipient_id"]
                         )
                         
                         logger.info(
-                            f"Message sent in conversation {conversation_id} by user {current_user.id}"
+                            f"Message sent in conversation {conversation_id} by user {user_id}"
                         )
                         
                     except Exception as e:
                         logger.error(f"Error creating message: {e}")
-                        await websocket.send_json({
+                        manager.send_to_socket(websocket, {
                             "type": "error",
                             "message": "Error al enviar mensaje",
                             "timestamp": datetime.utcnow().isoformat()
@@ -273,44 +275,64 @@ async def websocket_endpoint(
                     
                     await manager.broadcast_typing_indicator(
                         conversation_id,
-                        current_user.id,
+                        user_id,
                         is_typing
                     )
                 
-                # ===== MARCAR MENSAJE COMO LEÍDO =====
+                # ===== MARCAR COMO LEÍDO (marca de agua) =====
                 elif message_type == "read":
                     try:
-                        message_id = UUID(data.get("message_id"))
+                        # read_up_to: id del último mensaje leído (message_id
+                        # se acepta por compatibilidad); read_up_to_at: ISO
+                        raw_message_id = data.get("read_up_to") or data.get("message_id")
+                        message_id = UUID(raw_message_id) if raw_message_id else None
+                        raw_read_up_to = data.get("read_up_to_at")
+                        read_up_to = (
+                            datetime.fromisoformat(raw_read_up_to.replace('Z', '+00:00'))
+                            if raw_read_up_to else None
+                        )
+                        if not message_id and not read_up_to:
+                            raise ValueError("read_up_to requerido")
                         
-                        # Marcar como leído en BD
-                        await message_service.mark_as_read(message_id, current_user.id)
+                        # Un solo UPDATE para todo lo recibido hasta la marca
+                        with db_session() as db:
+                            result = await MessageService(db).mark_read_up_to(
+                                conversation_id,
+                                user_id,
+                                message_id=message_id,
+                                read_up_to=read_up_to
+                            )
                         
-                        # Broadcast confirmación de lectura
-                        await manager.broadcast_read_receipt(
-                            conversation_id,
-                            message_id,
-                            current_user.id
-                        )
+                        # Un solo recibo, y solo si la marca avanzó
+                        if result["read_count"]:
+                            await manager.broadcast_read_receipt(
+                                conversation_id,
+                                message_id,
+                                user_id,
+                                read_up_to=result["read_up_to"],
+                                read_count=result["read_count"]
+                            )
                         
-                    except (ValueError, TypeError) as e:
-                        await websocket.send_json({
+                    except (ValueError, TypeError, AttributeError) as e:
+                        manager.send_to_socket(websocket, {
                             "type": "error",
-                            "message": "ID de mensaje inválido",
+                            "message": "Marca de lectura inválida",
                             "timestamp": datetime.utcnow().isoformat()
                         })
                     except Exception as e:
-                        logger.error(f"Error marking message as read: {e}")
+                        logger.error(f"Error marking messages as read: {e}")
                 
-                # ===== PING (mantener vivo) =====
-                elif message_type == "ping":
-                    await websocket.send_json({
+                # ===== PING / HEARTBEAT (mantener vivo) =====
+                elif message_type in ("ping", "presence"):
+                    presence_service.heartbeat(user_id)
+                    manager.send_to_socket(websocket, {
                         "type": "pong",
                         "timestamp": datetime.utcnow().isoformat()
                     })
                 
                 # ===== TIPO DESCONOCIDO =====
                 else:
-                    await websocket.send_json({
+                    manager.send_to_socket(websocket, {
                         "type": "error",
                         "message": f"Tipo de mensaje no reconocido: {message_type}",
                         "timestamp": datetime.utcnow().isoformat()
@@ -318,27 +340,20 @@ async def websocket_endpoint(
                     
         except WebSocketDisconnect:
             logger.info(
-                f"User {current_user.id} disconnected from conversation {conversation_id}"
+                f"User {user_id} disconnected from conversation {conversation_id}"
             )
         finally:
             # Desconectar del manager
             await manager.disconnect(websocket)
             
-            # Actualizar presencia
-            await message_service.update_user_presence(
-                current_user.id,
-                is_online=False,
-                increment_connections=-1
-            )
-            
-            # Verificar si el usuario sigue online en otras conexiones
-            is_still_online = manager.is_user_online(current_user.id)
+            # Liberar presencia; indica si quedan sockets en cualquier worker
+            is_still_online = presence_service.disconnect(user_id)
             
             # Notificar cambio de presencia solo si no hay más conexiones
             if not is_still_online:
                 await manager.broadcast_presence(
                     conversation_id,
-                    current_user.id,
+                    user_id,
                     is_online=False
                 )
             
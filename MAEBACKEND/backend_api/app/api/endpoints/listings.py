@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, UploadFile, File, Form, Body, Header
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.core.database import get_db
@@ -6,7 +6,7 @@ from app.schemas.listings import (
     CreateListingRequest, UpdateListingRequest, ListingResponse, ChangeListingStatusRequest
 )
 from app.schemas.images import ImageResponse, ImageUpdate
-from app.schemas.videos import VideoResponse
+from app.schemas.videos import VideoResponse, VideoUploadCreate, VideoUploadStatusResponse
 from app.services.listing_service import ListingService
 from app.services.api_cache_service import api_cache_service
 from app.services.search_cache_service import search_cache_service
@@ -14,7 +14,20 @@ from app.api.deps import get_current_user
 from app.models.listing import Listing
 from app.models.media import Image, Video
 from app.models.auth import User
-from app.core.exceptions import http_400_bad_request, http_403_forbidden, http_404_not_found, http_500_internal_error
+from app.core.exceptions import (
+    http_400_bad_request, http_403_forbidden, http_404_not_found, http_500_internal_error,
+    AuthorizationError, BusinessLogicError, ConflictError, NotFoundError, ValidationError
+)
+from app.services.image_dedup_service import ImageDedupService, content_path
+from app.services.image_renditions import delete_renditions
+from app.services.image_resize_service import delete_resized_renditions
+from app.utils.media_utils import compute_upright_phash
+from app.services.video_upload_service import video_upload_service
+from app.tasks.media_tasks import generate_image_renditions_task, transcode_video_task
+from app.utils.upload_spool import (
+    UploadTooLargeError, discard_spool_file, hash_file, move_spool_file, spool_upload
+)
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 from uuid import UUID, uuid4
 from pathlib import Path
@@ -36,18 +49,28 @@ ALLOWED_VIDEO_TYPES = ['video/mp4', 'video/avi', 'video/quicktime', 'video/webm'
 router = APIRouter()
 
 
-def _image_file_exists(image_url: Optional[str]) -> bool:
-    if not image_url:
-        return False
-
-    normalized = image_url.split("?", 1)[0].lstrip("/")
+def _media_file_path(media_url: str) -> Path:
+    normalized = media_url.split("?", 1)[0].lstrip("/")
     if normalized.startswith("resize/"):
         normalized = normalized[len("resize/"):]
     if normalized.startswith("media/"):
         normalized = normalized[len("media/"):]
 
-    file_path = MEDIA_DIR / normalized
-    return file_path.exists()
+    return MEDIA_DIR / normalized
+
+
+def _read_image_info(path: Path):
+    """Dimensiones (cabecera) y pHash (orientación EXIF aplicada) de una imagen."""
+    with PILImage.open(path) as img:
+        width, height = img.size
+        return width, height, compute_upright_phash(img)
+
+
+def _image_file_exists(image_url: Optional[str]) -> bool:
+    if not image_url:
+        return False
+
+    return _media_file_path(image_url).exists()
 
 @router.get("/", response_model=List[ListingResponse], summary="Listar propiedades")
 async def list_listings(
@@ -693,7 +716,8 @@ async def upload_listing_image(
 ):
     """
     Subir imagen a una publicación.
-    Archivos en: /media/listings/{listing_id}/images/
+    Archivos en: /media/images/{hash[:2]}/{hash}.{ext} (por contenido: si el
+    mismo archivo ya se subió, se reutiliza sin copiarlo)
     """
     try:
         # Convertir listing_id a UUID
@@ -714,39 +738,66 @@ async def upload_listing_image(
         if not file.content_type or file.content_type not in ALLOWED_IMAGE_TYPES:
             raise HTTPException(status_code=400, detail=f"Tipo de imagen inválido. Permitidos: {', '.join(ALLOWED_IMAGE_TYPES)}")
         
-        # Leer archivo
-        file_data = await file.read()
-        
-        # Validar tamaño
-        if len(file_data) > MAX_IMAGE_SIZE:
+        # Directorio de imágenes por contenido
+        images_dir = MEDIA_DIR / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+
+        # Volcar a disco por bloques en el mismo filesystem (el rename final es
+        # atómico) validando el tamaño mientras se copia
+        try:
+            spool_path, file_size = await spool_upload(
+                file, max_bytes=MAX_IMAGE_SIZE, directory=images_dir, suffix=".part"
+            )
+        except UploadTooLargeError:
             raise HTTPException(status_code=400, detail=f"Archivo muy grande. Máximo: {MAX_IMAGE_SIZE // (1024*1024)}MB")
-        
-        # Crear directorio para imágenes
-        listing_images_dir = MEDIA_DIR / "listings" / str(listing_uuid) / "images"
-        listing_images_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Contar imágenes existentes (solo para orden de visualización)
-        existing_count = db.query(Image).filter(Image.listing_id == listing_uuid).count()
 
-        # Generar nombre único para evitar colisiones y problemas de cache
-        file_ext = (os.path.splitext(file.filename)[1] or '.jpg').lower()
-        unique_filename = f"image_{uuid4().hex}{file_ext}"
-        file_path = listing_images_dir / unique_filename
-        
-        # Extraer dimensiones
-        width, height = None, None
         try:
-            img = PILImage.open(io.BytesIO(file_data))
-            width, height = img.size
-        except Exception as e:
-            logger.warning(f"No se pudieron extraer dimensiones: {e}")
-        
-        # Guardar archivo
-        with open(file_path, "wb") as f:
-            f.write(file_data)
-        
-        # URL relativa
-        image_url = f"/media/listings/{listing_uuid}/images/{unique_filename}"
+            content_hash = await run_in_threadpool(hash_file, spool_path)
+
+            # Serializar con otras subidas/borrados del mismo contenido hasta el commit
+            dedup_service = ImageDedupService(db)
+            dedup_service.lock(content_hash)
+            duplicate = dedup_service.find_by_hash(content_hash, str(listing_uuid))
+
+            # Resubida del mismo archivo a la misma publicación: devolver la existente
+            if duplicate and duplicate.listing_id == listing_uuid:
+                db.rollback()
+                logger.info(f"Imagen duplicada en listing {listing_id}, se devuelve {duplicate.id}")
+                return duplicate
+
+            if duplicate:
+                # Mismo contenido en otra publicación: compartir archivos
+                stored_filename = duplicate.filename
+                image_url = duplicate.original_url
+                file_size, width, height = duplicate.file_size, duplicate.width, duplicate.height
+                phash = duplicate.phash
+            else:
+                file_ext = (os.path.splitext(file.filename)[1] or '.jpg').lower()
+                relative_path = content_path(content_hash, file_ext)
+                file_path = MEDIA_DIR / relative_path
+                stored_filename = file_path.name
+                image_url = f"/media/{relative_path}"
+
+                # Dimensiones y hash perceptual (moderación de duplicados)
+                width, height, phash = None, None, None
+                try:
+                    width, height, phash = await run_in_threadpool(_read_image_info, spool_path)
+                except Exception as e:
+                    logger.warning(f"No se pudieron extraer dimensiones: {e}")
+
+                if not file_path.exists():
+                    move_spool_file(spool_path, file_path)
+
+                    # Renditions WebP/AVIF en background (Nginx sirve el original mientras tanto)
+                    try:
+                        generate_image_renditions_task.delay(str(file_path))
+                    except Exception as e:
+                        logger.warning(f"No se pudieron encolar renditions para {file_path}: {e}")
+        finally:
+            discard_spool_file(spool_path)
+
+        # Contar imágenes existentes (solo para orden de visualización)
+        existing_count = db.query(Image).filter(Image.listing_id == listing_uuid).count()
         
         # Si es main, desmarcar otras
         if is_main:
@@ -759,14 +810,16 @@ async def upload_listing_image(
         image_record = Image(
             listing_id=listing_uuid,
             listing_created_at=listing.created_at,
-            filename=unique_filename,
+            filename=stored_filename,
             original_url=image_url,
             alt_text=alt_text,
             display_order=display_order if display_order is not None else existing_count,
             is_main=is_main or existing_count == 0,  # Primera imagen es main por defecto
-            file_size=len(file_data),
+            file_size=file_size,
             width=width,
-            height=height
+            height=height,
+            content_hash=content_hash,
+            phash=phash
         )
         
         db.add(image_record)
@@ -933,17 +986,20 @@ async def delete_listing_image(
         if not image:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # Eliminar archivo físico
-        try:
-            file_path = Path(image.original_url.lstrip('/'))
-            if file_path.exists():
-                file_path.unlink()
-                logger.info(f"Archivo eliminado: {file_path}")
-        except Exception as e:
-            logger.warning(f"No se pudo eliminar archivo: {e}")
-        
-        db.delete(image)
-        db.commit()
+        def delete_image_files():
+            try:
+                file_path = _media_file_path(image.original_url)
+                if file_path.exists():
+                    file_path.unlink()
+                    logger.info(f"Archivo eliminado: {file_path}")
+                delete_renditions(file_path)
+                delete_resized_renditions(file_path)
+            except Exception as e:
+                logger.warning(f"No se pudo eliminar archivo: {e}")
+        
+        # Eliminar registro; el archivo físico solo si ninguna otra imagen lo
+        # referencia (resubidas, publicaciones duplicadas)
+        ImageDedupService(db).delete_reference(image, delete_image_files)
 
         api_cache_service.invalidate_listing_detail(
             listing_id=str(listing.id),
@@ -979,8 +1035,9 @@ async def upload_listing_video(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Sube un video para un listing específico.
+    Sube un video para un listing específico en una sola petición.
     El video se guardará en: /media/listings/{listing_uuid}/videos/
+    Para archivos grandes usar la subida por bloques (/videos/uploads).
     """
     try:
         # Validar UUID del listing
@@ -1004,48 +1061,28 @@ async def upload_listing_video(
         if not file.content_type or not file.content_type.startswith('video/'):
             raise HTTPException(status_code=400, detail="El archivo debe ser un video")
         
-        # Validar tamaño (máximo 100MB)
-        contents = await file.read()
-        file_size = len(contents)
-        if file_size > 100 * 1024 * 1024:  # 100MB
-            raise HTTPException(status_code=400, detail="El video no puede superar 100MB")
-        
         # Crear directorio para videos del listing
         listing_videos_dir = MEDIA_DIR / "listings" / str(listing_uuid) / "videos"
         listing_videos_dir.mkdir(parents=True, exist_ok=True)
         
-        # Generar nombre único
-        original_extension = Path(file.filename).suffix
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_filename = f"video_{timestamp}{original_extension}"
+        # Validar tamaño (máximo 100MB) mientras se vuelca a disco por bloques
+        try:
+            spool_path, file_size = await spool_upload(
+                file, max_bytes=100 * 1024 * 1024, directory=listing_videos_dir, suffix=".part"
+            )
+        except UploadTooLargeError:
+            raise HTTPException(status_code=400, detail="El video no puede superar 100MB")
         
         # Guardar video
-        file_path = listing_videos_dir / unique_filename
-        with open(file_path, 'wb') as f:
-            f.write(contents)
+        original_extension = Path(file.filename).suffix.lower()
+        unique_filename = f"video_{uuid4().hex}{original_extension}"
+        file_path = move_spool_file(spool_path, listing_videos_dir / unique_filename)
         
         logger.info(f"Video guardado en: {file_path}")
         
-        # URL del video
-        video_url = f"/media/listings/{listing_uuid}/videos/{unique_filename}"
-        
-        # Crear registro en BD
-        new_video = Video(
-            listing_id=listing_uuid,
-            listing_created_at=listing.created_at,
-            filename=unique_filename,
-            original_url=video_url,
-            title=title,
-            description=description,
-            display_order=display_order,
-            file_size=file_size,
-            duration=None,  # Podría extraerse con ffmpeg si se requiere
-            created_at=datetime.now(timezone.utc)
-        )
-        
-        db.add(new_video)
-        db.commit()
-        db.refresh(new_video)
+        # Crear registro en BD; duración, poster y rendition 720p en Celery
+        new_video = video_upload_service.register_video(db, listing, file_path, display_order)
+        transcode_video_task.delay(str(new_video.id))
 
         api_cache_service.invalidate_listing_detail(
             listing_id=str(listing.id),
@@ -1064,6 +1101,192 @@ async def upload_listing_video(
         raise HTTPException(status_code=500, detail=f"Error al subir video: {str(e)}")
 
 
+# ===================================================================
+# VIDEOS - Subida por bloques reanudable (ver video_upload_service)
+# ===================================================================
+
+def _get_owned_listing(db: Session, listing_id: str, current_user: User) -> Listing:
+    try:
+        listing_uuid = UUID(listing_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ID de listing inválido")
+
+    listing = db.query(Listing).filter(Listing.id == listing_uuid).first()
+    if not listing:
+        raise HTTPException(status_code=404, detail="Listing no encontrado")
+    if listing.owner_user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="No tienes permiso para subir videos a este listing")
+    return listing
+
+
+def _video_upload_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, ConflictError):
+        offset = e.details.get("offset")
+        headers = {"Upload-Offset": str(offset)} if offset is not None else None
+        return HTTPException(status_code=409, detail={"message": e.message, **e.details}, headers=headers)
+    if isinstance(e, NotFoundError):
+        return HTTPException(status_code=404, detail=e.message)
+    if isinstance(e, AuthorizationError):
+        return HTTPException(status_code=403, detail=e.message)
+    if isinstance(e, ValidationError):
+        return HTTPException(status_code=413, detail=e.message)
+    if isinstance(e, BusinessLogicError):
+        return HTTPException(status_code=503, detail=e.message)
+    logger.error(f"Error en subida de video: {e}")
+    return HTTPException(status_code=500, detail=f"Error en subida de video: {str(e)}")
+
+
+def _get_listing_upload(upload_id: str, listing: Listing, current_user: User) -> Dict[str, Any]:
+    state = video_upload_service.get(upload_id, str(current_user.id))
+    if state["listing_id"] != str(listing.id):
+        raise NotFoundError("Subida no encontrada o expirada")
+    return state
+
+
+@router.post("/{listing_id}/videos/uploads",
+    response_model=VideoUploadStatusResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Iniciar subida de video por bloques"
+)
+async def create_video_upload(
+    listing_id: str,
+    request: VideoUploadCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Crea una subida reanudable. Los bytes se envían con
+    ``PATCH /videos/uploads/{upload_id}`` y el header ``Upload-Offset``,
+    en bloques de hasta ``chunk_size`` bytes.
+    """
+    listing = _get_owned_listing(db, listing_id, current_user)
+    try:
+        return video_upload_service.create(
+            listing_id=str(listing.id),
+            user_id=str(current_user.id),
+            filename=request.filename,
+            size=request.size,
+            content_type=request.content_type,
+            display_order=request.display_order,
+        )
+    except Exception as e:
+        raise _video_upload_http_error(e)
+
+
+@router.head("/{listing_id}/videos/uploads/{upload_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Offset actual de una subida de video"
+)
+async def head_video_upload(
+    listing_id: str,
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Devuelve ``Upload-Offset`` / ``Upload-Length`` para reanudar la subida."""
+    listing = _get_owned_listing(db, listing_id, current_user)
+    try:
+        state = _get_listing_upload(upload_id, listing, current_user)
+    except Exception as e:
+        raise _video_upload_http_error(e)
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={
+            "Upload-Offset": str(state["offset"]),
+            "Upload-Length": str(state["size"]),
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.get("/{listing_id}/videos/uploads/{upload_id}",
+    response_model=VideoUploadStatusResponse,
+    summary="Estado de una subida de video"
+)
+async def get_video_upload(
+    listing_id: str,
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Offset recibido y avance de la transcodificación."""
+    listing = _get_owned_listing(db, listing_id, current_user)
+    try:
+        state = _get_listing_upload(upload_id, listing, current_user)
+        return video_upload_service.status(state)
+    except Exception as e:
+        raise _video_upload_http_error(e)
+
+
+@router.patch("/{listing_id}/videos/uploads/{upload_id}",
+    response_model=VideoUploadStatusResponse,
+    summary="Enviar un bloque de la subida de video"
+)
+async def upload_video_chunk(
+    listing_id: str,
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Escribe el cuerpo de la petición en ``Upload-Offset``. Si el offset no
+    coincide con el del servidor responde 409 con el offset correcto. Con el
+    último bloque se crea el video y se encola su transcodificación.
+    """
+    listing = _get_owned_listing(db, listing_id, current_user)
+    try:
+        _get_listing_upload(upload_id, listing, current_user)
+        state = await video_upload_service.append_chunk(
+            upload_id, str(current_user.id), upload_offset, request.stream()
+        )
+
+        if state.get("completed"):
+            try:
+                video = await run_in_threadpool(video_upload_service.complete, db, listing, state)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error registrando video de la subida {upload_id}: {e}")
+                video_upload_service.update_progress(upload_id, status="failed", error=str(e))
+                raise HTTPException(status_code=500, detail=f"Error al registrar video: {str(e)}")
+
+            state.update(video_id=str(video.id), stage="queued", progress=0)
+            api_cache_service.invalidate_listing_detail(
+                listing_id=str(listing.id),
+                slug=listing.slug,
+            )
+            search_cache_service.invalidate_on_listing_change("upload_listing_video")
+
+        response.headers["Upload-Offset"] = str(state["offset"])
+        return video_upload_service.status(state)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise _video_upload_http_error(e)
+
+
+@router.delete("/{listing_id}/videos/uploads/{upload_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Cancelar una subida de video"
+)
+async def abort_video_upload(
+    listing_id: str,
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Descarta una subida en curso y los bytes recibidos."""
+    listing = _get_owned_listing(db, listing_id, current_user)
+    try:
+        _get_listing_upload(upload_id, listing, current_user)
+        video_upload_service.abort(upload_id, str(current_user.id))
+    except Exception as e:
+        raise _video_upload_http_error(e)
+    return None
+
+
 @router.get("/{listing_id}/videos", 
     response_model=List[VideoResponse],
     summary="Obtener videos del listing"
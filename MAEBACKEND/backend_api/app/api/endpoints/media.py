@@ -1,22 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, Depends, HTTPException, File, UploadFile, Form, Header, status
+from starlette.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Optional
+from app.core.config import settings
 from app.core.database import get_db
 from app.api.deps import get_current_user
 from app.services.media_service import MediaService
+from app.services.api_cache_service import api_cache_service
+from app.services.search_cache_service import search_cache_service
+from app.services.image_resize_service import ResizeRequestError, ResizeSourceNotFound, image_resize_service
 from app.schemas.images import ImageResponse, ImageUpdate, ImagesListResponse, BulkMediaResponse
 from app.schemas.videos import VideoResponse, VideoUpdate, VideosListResponse
-from app.schemas.media import UploadUrlRequest, UploadUrlResponse
+from app.schemas.media import DirectUploadStatusResponse, UploadUrlRequest, UploadUrlResponse
 from app.models.listing import Listing
-from app.core.exceptions import BusinessLogicError
+from app.core.exceptions import (
+    AuthorizationError, BusinessLogicError, ConflictError, NotFoundError, ValidationError
+)
+from app.services.direct_upload_service import direct_upload_service
+import hmac
 import uuid
 import logging
 from datetime import datetime
-import base64
+from pathlib import Path
 
 from app.tasks.media_tasks import process_image_upload_task
+from app.utils.upload_spool import UploadTooLargeError, discard_spool_file, spool_upload
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -72,15 +82,24 @@ async def upload_images(
         failed = []
         
         for i, image_file in enumerate(images):
+            spool_path = None
             try:
                 # Validar tipo de archivo
-                if not image_file.content_type.startswith('image/'):
-                    errors.append(f"File {image_file.filename}: Invalid file type")
+                if not image_file.content_type or not image_file.content_type.startswith('image/'):
+                    failed.append({
+                        "filename": image_file.filename,
+                        "error": "Invalid file type"
+                    })
                     continue
                 
-                # Leer datos del archivo
-                file_data = await image_file.read()
-                if not file_data:
+                # Volcar a disco por bloques (memoria constante, límite de tamaño)
+                spool_path, file_size = await spool_upload(
+                    image_file,
+                    max_bytes=settings.max_image_size,
+                    suffix=Path(image_file.filename or "").suffix.lower(),
+                )
+                if not file_size:
+                    discard_spool_file(spool_path)
                     failed.append({
                         "filename": image_file.filename,
                         "error": "Empty file"
@@ -90,12 +109,12 @@ async def upload_images(
                 # Obtener descripción correspondiente
                 description = descriptions[i] if descriptions and i < len(descriptions) else None
                 
-                # Encolar procesamiento async en Celery
+                # Encolar procesamiento async en Celery (solo la ruta, no los bytes)
                 async_result = process_image_upload_task.delay(
                     listing_id=listing_id,
                     listing_created_at=listing.created_at.isoformat(),
                     filename=image_file.filename,
-                    file_data_b64=base64.b64encode(file_data).decode("utf-8"),
+                    spool_path=str(spool_path),
                     alt_text=description,
                 )
 
@@ -106,12 +125,18 @@ async def upload_images(
                 })
                 logger.info(f"Image queued successfully: file={image_file.filename}, task_id={async_result.id}")
                 
+            except UploadTooLargeError as e:
+                failed.append({
+                    "filename": image_file.filename,
+                    "error": str(e)
+                })
             except BusinessLogicError as e:
                 failed.append({
                     "filename": image_file.filename,
                     "error": str(e)
                 })
             except Exception as e:
+                discard_spool_file(spool_path)
                 failed.append({
                     "filename": image_file.filename,
                     "error": f"Unexpected error - {str(e)}"
@@ -133,6 +158,87 @@ async def upload_images(
         raise HTTPException(status_code=500, detail=f"Error uploading images: {str(e)}")
 
 
+@router.post("/listings/{listing_id}/images/bulk",
+            response_model=BulkMediaResponse,
+            status_code=status.HTTP_201_CREATED,
+            summary="Subir varias imágenes en lote")
+async def upload_images_bulk(
+    listing_id: str,
+    images: List[UploadFile] = File(...),
+    descriptions: Optional[List[str]] = Form(None),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """
+    Procesa varias imágenes en la misma petición: límite del plan validado
+    una vez, procesamiento en paralelo en el pool de imágenes, un solo
+    INSERT y una sola invalidación de caches para todo el lote.
+    """
+    listing = db.query(Listing).filter(Listing.id == listing_id).first()
+    if not listing:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    
+    if str(listing.owner_user_id) != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Not authorized to modify this listing")
+    
+    uploads = []
+    failed = []
+    try:
+        for i, image_file in enumerate(images):
+            if not image_file.content_type or not image_file.content_type.startswith('image/'):
+                failed.append({"filename": image_file.filename, "error": "Invalid file type"})
+                continue
+            
+            try:
+                spool_path, file_size = await spool_upload(
+                    image_file,
+                    max_bytes=settings.max_image_size,
+                    suffix=Path(image_file.filename or "").suffix.lower(),
+                )
+            except UploadTooLargeError as e:
+                failed.append({"filename": image_file.filename, "error": str(e)})
+                continue
+            
+            if not file_size:
+                discard_spool_file(spool_path)
+                failed.append({"filename": image_file.filename, "error": "Empty file"})
+                continue
+            
+            description = descriptions[i] if descriptions and i < len(descriptions) else None
+            uploads.append((str(spool_path), image_file.filename, description))
+        
+        created = []
+        if uploads:
+            media_service = MediaService(db)
+            try:
+                created, bulk_failed = await media_service.create_images_bulk_async(listing, uploads)
+            except BusinessLogicError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            failed.extend(bulk_failed)
+        
+        if created:
+            # Una sola invalidación por lote
+            api_cache_service.invalidate_listing_detail(listing_id=str(listing.id), slug=listing.slug)
+            search_cache_service.invalidate_on_listing_change("upload_images_bulk")
+        
+        return BulkMediaResponse(
+            message=f"{len(created)} images uploaded",
+            uploaded=[ImageResponse.model_validate(image) for image in created],
+            failed=failed,
+            total_uploaded=len(created),
+            total_failed=len(failed),
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error bulk uploading images for listing {listing_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Error uploading images: {str(e)}")
+    finally:
+        for spool_path, _, _ in uploads:
+            discard_spool_file(spool_path)
+
+
 @router.put("/listings/{listing_id}/images/{image_id}",
            response_model=ImageResponse,
            summary="Actualizar imagen")
@@ -372,19 +478,102 @@ async def get_upload_url(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Genera una URL de subida presignada para subida directa a S3 u otro storage"""
+    """
+    Genera una URL de subida presignada para subida directa a S3 u otro storage.
+    Tras subir el archivo llamar a ``POST /uploads/{upload_id}/complete``.
+    """
     try:
+        if request.listing_id:
+            listing = db.query(Listing).filter(Listing.id == request.listing_id).first()
+            if not listing:
+                raise HTTPException(status_code=404, detail="Listing not found")
+            if str(listing.owner_user_id) != str(current_user.id):
+                raise HTTPException(status_code=403, detail="Not authorized to modify this listing")
+        
         media_service = MediaService(db)
-        upload_response = media_service.generate_upload_url(request)
+        upload_response = media_service.generate_upload_url(request, user_id=str(current_user.id))
         
         return upload_response
         
+    except HTTPException:
+        raise
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=e.message)
     except BusinessLogicError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating upload URL: {str(e)}")
 
 
+def _direct_upload_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, NotFoundError):
+        return HTTPException(status_code=404, detail=e.message)
+    if isinstance(e, AuthorizationError):
+        return HTTPException(status_code=403, detail=e.message)
+    if isinstance(e, ConflictError):
+        return HTTPException(status_code=409, detail=e.message)
+    if isinstance(e, ValidationError):
+        return HTTPException(status_code=400, detail=e.message)
+    if isinstance(e, BusinessLogicError):
+        return HTTPException(status_code=503, detail=str(e))
+    logger.error(f"Error in direct upload: {e}")
+    return HTTPException(status_code=500, detail=f"Error in direct upload: {str(e)}")
+
+
+@router.post("/uploads/{upload_id}/complete",
+            response_model=DirectUploadStatusResponse,
+            status_code=status.HTTP_202_ACCEPTED,
+            summary="Completar subida directa")
+async def complete_direct_upload(
+    upload_id: str,
+    current_user = Depends(get_current_user)
+):
+    """
+    Verifica que el archivo está en el storage y encola su procesamiento.
+    Idempotente: repetir la llamada devuelve el estado actual sin reprocesar.
+    """
+    try:
+        return await run_in_threadpool(direct_upload_service.complete, upload_id, str(current_user.id))
+    except Exception as e:
+        raise _direct_upload_http_error(e)
+
+
+@router.get("/uploads/{upload_id}",
+           response_model=DirectUploadStatusResponse,
+           summary="Estado de una subida directa")
+async def get_direct_upload_status(
+    upload_id: str,
+    current_user = Depends(get_current_user)
+):
+    try:
+        return direct_upload_service.status(upload_id, str(current_user.id))
+    except Exception as e:
+        raise _direct_upload_http_error(e)
+
+
+@router.post("/uploads/events",
+            summary="Notificaciones de objetos creados en el bucket (S3/MinIO)")
+async def storage_upload_events(
+    payload: dict = Body(...),
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Webhook de notificaciones ``s3:ObjectCreated`` (MinIO webhook / SNS):
+    completa las subidas directas aunque el cliente no llame a complete.
+    """
+    token = settings.direct_upload_webhook_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not authorization or not hmac.compare_digest(authorization, f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    try:
+        results = await run_in_threadpool(direct_upload_service.complete_from_event, payload.get("Records") or [])
+    except Exception as e:
+        raise _direct_upload_http_error(e)
+    return {"processed": len(results)}
+
+
 # =====================================
 # UTILIDADES Y ESTADÍSTICAS
 # =====================================
@@ -446,36 +635,32 @@ async def invalidate_listing_cache(
            summary="Redimensionar imagen on-demand")
 async def resize_image(
     file_path: str,
-    width: Optional[int] = None,
-    height: Optional[int] = None,
-    quality: Optional[int] = 85
+    preset: Optional[str] = None
 ):
     """
     Redimensiona una imagen on-demand para el proxy de Nginx.
     Este endpoint es llamado internamente por Nginx cuando no encuentra un thumbnail.
+
+    El tamaño va en el nombre del archivo (``foto__w640.jpg``,
+    ``thumbs/{id}_medium.jpg``) o en ``preset`` sobre la ruta del original;
+    solo se aceptan los presets de ``RESIZE_PRESETS``. La rendition se guarda
+    junto al original, así Nginx la sirve directamente en las siguientes
+    peticiones.
     """
     try:
-        # TODO: Implementar redimensionado dinámico
-        # Por ahora retornamos un placeholder
-        
-        logger.info(f"Resize request for: {file_path}, size: {width}x{height}, quality: {quality}")
-        
-        # En implementación real:
-        # 1. Verificar que el archivo original existe
-        # 2. Generar thumbnail del tamaño solicitado
-        # 3. Guardarlo en el sistema de archivos
-        # 4. Retornar el archivo redimensionado
-        
-        return {
-            "message": "Image resize endpoint - Not implemented yet",
-            "file_path": file_path,
-            "requested_size": f"{width}x{height}" if width and height else "original",
-            "quality": quality
-        }
-        
+        target = await image_resize_service.get_or_create(file_path, preset)
+    except ResizeRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ResizeSourceNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
     except Exception as e:
         logger.error(f"Error resizing image {file_path}: {e}")
-        raise HTTPException(status_code=500, detail=f"Error resizing image: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error resizing image")
+
+    return FileResponse(
+        target,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
 
 
 # =====================================
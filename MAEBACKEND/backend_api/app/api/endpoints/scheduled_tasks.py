@@ -23,7 +23,9 @@ async def cancel_expired_payments(
     """
     Cancela reservas cuyo plazo de pago ha expirado.
     Solo ejecutable por administradores.
-    En producción, esta tarea debería ejecutarse automáticamente cada 15 minutos.
+    En producción la expiración la dispara la cola diferida de plazos
+    (Celery beat `bookings.process_payment_deadlines`); este escaneo completo
+    queda como mecanismo de reconciliación manual.
     """
     # Verificar que el usuario es admin
     if current_user.role != 'admin':
@@ -48,7 +50,8 @@ async def send_payment_reminders(
     """
     Envía recordatorios a huéspedes cuyo plazo de pago está próximo a vencer.
     Solo ejecutable por administradores.
-    En producción, esta tarea debería ejecutarse automáticamente cada 10 minutos.
+    En producción los recordatorios los dispara la cola diferida de plazos;
+    este escaneo completo queda como mecanismo de reconciliación manual.
     """
     # Verificar que el usuario es admin
     if current_user.role != 'admin':
@@ -62,6 +65,29 @@ async def send_payment_reminders(
     return result
 
 
+@router.post("/resync-payment-deadlines",
+    summary="Resincronizar cola de plazos de pago (Admin)",
+    description="Vuelve a registrar en Redis los plazos de todas las reservas confirmadas pendientes de pago"
+)
+async def resync_payment_deadlines(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Reconstruye la cola diferida de plazos de pago desde la base de datos.
+    Útil tras un reinicio/flush de Redis o en el primer despliegue.
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(
+            status_code=403,
+            detail="Solo administradores pueden ejecutar tareas programadas"
+        )
+    
+    result = BookingScheduledTasks.resync_payment_deadline_queue(db)
+    
+    return result
+
+
 @router.get("/booking-payment-status",
     summary="Ver estado de pagos de reservas (Admin)",
     description="Consulta el estado de pago de todas las reservas confirmadas"
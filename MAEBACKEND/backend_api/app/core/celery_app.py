@@ -15,6 +15,9 @@ celery_app = Celery(
         "app.tasks.media_tasks",
         "app.tasks.email_tasks",
         "app.tasks.notification_tasks",
+        "app.tasks.booking_tasks",
+        "app.tasks.unread_tasks",
+        "app.tasks.chat_tasks",
     ],
 )
 
@@ -30,6 +33,19 @@ celery_app.conf.update(
             "task": "notifications.process_queue",
             "schedule": schedule(run_every=max(5, settings.notification_queue_drain_interval_seconds)),
             "kwargs": {"batch_size": 50},
-        }
+        },
+        "bookings-payment-deadlines": {
+            "task": "bookings.process_payment_deadlines",
+            "schedule": schedule(run_every=max(1, settings.payment_deadline_drain_interval_seconds)),
+            "options": {"expires": max(1, settings.payment_deadline_drain_interval_seconds)},
+        },
+        "unread-counters-reconcile": {
+            "task": "unread.reconcile_counters",
+            "schedule": schedule(run_every=max(60, settings.unread_counter_reconcile_interval_seconds)),
+        },
+        "chat-presence-last-seen": {
+            "task": "chat.flush_presence_last_seen",
+            "schedule": schedule(run_every=max(10, settings.presence_last_seen_flush_interval_seconds)),
+        },
     },
 )
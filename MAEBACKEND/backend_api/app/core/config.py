@@ -53,6 +53,7 @@ class Settings(BaseSettings):
     smtp_from_email: str = "noreply@easyrent.com"
     email_from: str = "noreply@easyrent.pe"
     email_from_name: str = "EasyRent"
+    email_bulk_chunk_size: int = 200
     
     # Frontend
     frontend_url: str = "http://localhost:3000"
@@ -76,16 +77,34 @@ class Settings(BaseSettings):
     search_cache_prewarm_enabled: bool = True
     listing_detail_cache_ttl_seconds: int = 300
     static_cache_ttl_seconds: int = 1800
+    unread_counter_ttl_seconds: int = 604800
+
+    # Chat (WebSocket)
+    chat_pubsub_enabled: bool = True
+    chat_pubsub_retry_max_seconds: float = 30.0
+    chat_send_queue_size: int = 256
+    chat_send_timeout_seconds: float = 10.0
+    chat_typing_refresh_seconds: float = 2.0
+    chat_typing_idle_seconds: float = 4.0
+    chat_presence_ttl_seconds: int = 90
+    chat_recent_messages_size: int = 50
+    chat_recent_messages_ttl_seconds: int = 3600
 
     # Celery
     celery_broker_url: Optional[str] = None
     celery_result_backend: Optional[str] = None
     notification_queue_drain_interval_seconds: int = 30
+    payment_deadline_drain_interval_seconds: int = 5
+    payment_deadline_warning_minutes: int = 30
+    payment_deadline_drain_batch_size: int = 100
+    unread_counter_reconcile_interval_seconds: int = 900
+    presence_last_seen_flush_interval_seconds: int = 60
     
     # File Upload
     max_file_size: int = 10485760  # 10MB
     allowed_image_types: str = "image/jpeg,image/png,image/webp"
     upload_directory: str = "uploads"
+    upload_spool_chunk_size: int = 1048576  # 1MB por bloque al volcar subidas a disco
     
     # Media Storage
     use_s3: bool = False
@@ -94,6 +113,12 @@ class Settings(BaseSettings):
     aws_access_key_id: Optional[str] = None
     aws_secret_access_key: Optional[str] = None
     cdn_base_url: Optional[str] = None
+    s3_endpoint_url: Optional[str] = None  # S3 compatible (MinIO en desarrollo: http://minio:9000)
+    s3_public_endpoint_url: Optional[str] = None  # host con el que se firman las URLs que usa el cliente
+    s3_upload_prefix: str = "incoming"  # subidas directas pendientes de procesar
+    direct_upload_expires_seconds: int = 900
+    direct_upload_requeue_after_seconds: int = 900  # 'queued' sin avance: se puede volver a encolar
+    direct_upload_webhook_token: Optional[str] = None  # Bearer de las notificaciones del bucket
     upload_path: str = "./uploads"
     api_base_url: str = "http://localhost:8000"
     
@@ -102,6 +127,15 @@ class Settings(BaseSettings):
     default_max_videos_per_listing: int = 5
     max_image_size: int = 10485760  # 10MB
     max_video_size: int = 104857600  # 100MB
+    video_upload_chunk_size: int = 5242880  # 5MB por PATCH sugerido al cliente
+    video_upload_ttl_seconds: int = 86400  # subidas sin actividad se descartan
+    video_transcode_height: int = 720
+    video_transcode_timeout_seconds: int = 1800
+    image_pipeline_workers: int = 0  # 0 = un proceso por core
+    image_pipeline_max_pending: int = 0  # 0 = 2x workers
+    image_modern_formats: str = "webp,avif"  # renditions junto al JPEG (Nginx negocia por Accept)
+    image_phash_max_distance: int = 6  # Hamming (de 64 bits) para considerar dos fotos casi iguales
+    image_phash_backfill_batch_size: int = 500
     
     # Culqi Payment Gateway
     culqi_public_key: Optional[str] = None
@@ -1,10 +1,11 @@
 from sqlalchemy import create_engine, MetaData
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.orm import declarative_base
 from .config import settings
 import logging
 import os
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator
 
 # Set up logging for SQLAlchemy
 logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO if settings.debug else logging.WARNING)
@@ -128,6 +129,21 @@ def get_db():
         db.close()
 
 
+@contextmanager
+def db_session() -> Iterator[Session]:
+    """
+    Short-lived session for long-running handlers (e.g. WebSockets).
+
+    The pooled connection is returned as soon as the block exits, instead of
+    staying checked out for the lifetime of the caller.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def create_tables():
     """Create all tables defined in models."""
     Base.metadata.create_all(bind=engine)
@@ -2,6 +2,7 @@ import logging
 from typing import Optional
 
 import redis
+import redis.asyncio as redis_async
 from redis import Redis
 from redis.exceptions import RedisError
 
@@ -11,6 +12,7 @@ logger = logging.getLogger(__name__)
 
 
 _redis_client: Optional[Redis] = None
+_async_redis_client: Optional[redis_async.Redis] = None
 
 
 def get_redis_client() -> Optional[Redis]:
@@ -41,3 +43,33 @@ def get_redis_client() -> Optional[Redis]:
         _redis_client = None
 
     return _redis_client
+
+
+async def get_async_redis_client() -> Optional[redis_async.Redis]:
+    """Return a shared asyncio Redis client (pub/sub, WebSocket paths) if available."""
+    global _async_redis_client
+
+    if _async_redis_client is not None:
+        return _async_redis_client
+
+    try:
+        redis_url = settings.redis_url
+        if redis_url and redis_url.startswith("redis://"):
+            client = redis_async.from_url(redis_url, decode_responses=True)
+        else:
+            client = redis_async.Redis(
+                host=settings.redis_host,
+                port=settings.redis_port,
+                db=settings.redis_db,
+                password=settings.redis_password,
+                decode_responses=True,
+            )
+
+        await client.ping()
+        _async_redis_client = client
+        logger.info("Async Redis client initialized successfully")
+    except RedisError as exc:
+        logger.warning("Async Redis unavailable: %s", exc)
+        _async_redis_client = None
+
+    return _async_redis_client
@@ -8,6 +8,7 @@ import uuid
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 from pathlib import Path
+import base64
 import hashlib
 import re
 
@@ -121,6 +122,23 @@ def paginate_query_params(page: int = 1, limit: int = 20, max_limit: int = 100)
     }
 
 
+def encode_keyset_cursor(created_at: datetime, row_id: Any) -> str:
+    """Encode a ``(created_at, id)`` keyset position as an opaque URL-safe cursor."""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_keyset_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """Decode a cursor produced by ``encode_keyset_cursor``; raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at_raw, row_id_raw = raw.split("|", 1)
+        return datetime.fromisoformat(created_at_raw), uuid.UUID(row_id_raw)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError("Invalid pagination cursor") from exc
+
+
 def mask_email(email: str) -> str:
     """Mask email address for privacy."""
     if '@' not in email:
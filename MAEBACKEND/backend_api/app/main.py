@@ -35,6 +35,8 @@ from app.api.endpoints.admin_dashboard import router as admin_dashboard_router
 from app.api.endpoints.system import router as system_router
 from app.core.config import settings
 from app.core.firebase import firebase_service
+from app.services.chat.websocket_manager import manager as chat_manager
+from app.services.image_pipeline import image_pipeline
 import time
 
 
@@ -54,6 +56,9 @@ async def lifespan(app: FastAPI):
         print(f"❌ Firebase initialization failed: {e}")
         raise
     
+    # Fan-out del chat entre workers (Redis pub/sub)
+    await chat_manager.start()
+    
     if settings.api_docs_enabled:
         print(f"📚 API Documentation: http://localhost:8000/docs")
         print(f"🔍 Alternative docs: http://localhost:8000/redoc")
@@ -61,6 +66,8 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    await chat_manager.stop()
+    image_pipeline.shutdown(wait=False)
     print(f"👋 {settings.app_name} shutting down...")
 
 
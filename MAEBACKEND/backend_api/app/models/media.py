@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, BigInteger, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -22,6 +22,8 @@ class Image(Base):
     height = Column(Integer)
     file_size = Column(Integer)
     is_main = Column(Boolean, nullable=False, default=False)
+    content_hash = Column(Text)  # SHA-256 del archivo subido (deduplicación)
+    phash = Column(BigInteger)  # pHash de 64 bits (near-duplicates, moderación)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self):
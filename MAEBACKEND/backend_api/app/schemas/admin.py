@@ -258,6 +258,40 @@ class AdminListingListResponse(BaseModel):
     has_prev: bool
 
 
+# Image Moderation Schemas (near-duplicates por pHash)
+class SimilarImageMatch(BaseModel):
+    """Imagen parecida encontrada por hash perceptual"""
+    id: UUID
+    listing_id: UUID
+    listing_title: str
+    listing_status: str
+    owner_user_id: UUID
+    original_url: str
+    thumbnail_url: Optional[str] = None
+    distance: int = Field(..., description="Distancia de Hamming entre pHash (0-64)")
+
+
+class SimilarImagesResponse(BaseModel):
+    """Imágenes parecidas a una imagen"""
+    image_id: UUID
+    max_distance: int
+    matches: List[SimilarImageMatch]
+
+
+class ListingImageMatches(BaseModel):
+    """Imágenes de otros listings parecidas a una imagen del listing"""
+    image_id: UUID
+    original_url: str
+    matches: List[SimilarImageMatch]
+
+
+class ListingSimilarImagesResponse(BaseModel):
+    """Posibles reposts: imágenes de un listing presentes en otros listings"""
+    listing_id: UUID
+    max_distance: int
+    images: List[ListingImageMatches]
+
+
 # Audit Log Schemas
 class AuditLogCreate(BaseModel):
     """Schema para crear entrada de auditoría"""
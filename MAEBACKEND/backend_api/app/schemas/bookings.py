@@ -2,7 +2,7 @@
 Schemas para el sistema de reservas Airbnb
 """
 from pydantic import BaseModel, Field, validator, ConfigDict
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import date, datetime
 from decimal import Decimal
 
@@ -217,4 +217,7 @@ class HostBookingsResponse(BaseModel):
     """Respuesta para lista de reservas del host"""
     bookings: List[dict]
     total: int
+    status_counts: Dict[str, int] = {}
+    next_cursor: Optional[str] = None  # Cursor (created_at, id) de la siguiente página
+    has_more: bool = False
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from uuid import UUID
 from datetime import datetime
 from enum import Enum
@@ -91,3 +91,14 @@ class UploadUrlResponse(BaseModel):
     file_url: str
     expires_at: datetime
     upload_id: str
+
+class DirectUploadStatusResponse(BaseModel):
+    """State of a direct-to-storage upload"""
+    upload_id: str
+    status: Literal['pending', 'queued', 'processed', 'failed']
+    listing_id: Optional[str] = None
+    media_type: Optional[MediaType] = None
+    image_id: Optional[str] = None
+    video_id: Optional[str] = None
+    error: Optional[str] = None
+    queued_at: Optional[datetime] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional
+from typing import Optional, Literal
 from datetime import datetime
 import uuid
 
@@ -47,6 +47,35 @@ class VideoUploadResponse(BaseModel):
     thumbnail_url: Optional[str]
     message: str
 
+class VideoUploadCreate(BaseModel):
+    """Inicio de una subida de video por bloques"""
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0, description="Tamaño total en bytes")
+    content_type: str
+    display_order: int = 0
+
+    @field_validator('content_type')
+    @classmethod
+    def validate_content_type(cls, v):
+        if not v.startswith('video/'):
+            raise ValueError('El archivo debe ser un video')
+        return v
+
+class VideoUploadStatusResponse(BaseModel):
+    """Estado de una subida por bloques y de su procesamiento"""
+    upload_id: str
+    listing_id: str
+    filename: str
+    size: int
+    offset: int
+    chunk_size: int
+    status: Literal['uploading', 'processing', 'ready', 'failed']
+    stage: Optional[str] = None
+    progress: float = 0
+    video_id: Optional[str] = None
+    error: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
 class VideosListResponse(BaseModel):
     """Response containing a list of videos"""
     videos: list
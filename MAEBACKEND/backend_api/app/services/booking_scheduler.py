@@ -4,21 +4,126 @@ Servicio de tareas programadas para gestión de bookings
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Optional
 import logging
 
+from ..core.config import settings
 from ..core.database import get_db
-from ..tasks.email_tasks import (
-    send_payment_deadline_reminder_email_task,
-    send_payment_expired_email_task,
-)
+from ..tasks.email_tasks import enqueue_bulk_emails
+from .payment_deadline_queue import payment_deadline_queue
 
 logger = logging.getLogger(__name__)
 
 
+# Variante de core.cancel_expired_payment_bookings() acotada a un lote de IDs:
+# se resuelve por clave primaria en lugar de recorrer todas las reservas.
+CANCEL_EXPIRED_BY_IDS_SQL = """
+    WITH cancelled AS (
+        UPDATE core.bookings b
+        SET
+            status = 'cancelled_payment_expired',
+            cancelled_at = NOW(),
+            cancellation_reason = 'Pago no recibido dentro del plazo de 6 horas'
+        WHERE
+            b.id = ANY(CAST(:booking_ids AS uuid[]))
+            AND b.status = 'confirmed'
+            AND b.payment_deadline IS NOT NULL
+            AND b.payment_deadline <= NOW()
+            AND b.reservation_paid_at IS NULL
+        RETURNING
+            b.id,
+            b.guest_user_id,
+            b.listing_id,
+            b.payment_deadline
+    )
+    SELECT
+        c.id AS cancelled_booking_id,
+        u.email AS guest_email,
+        l.title AS listing_title,
+        c.payment_deadline AS deadline
+    FROM cancelled c
+    JOIN core.users u ON c.guest_user_id = u.id
+    JOIN core.listings l ON c.listing_id = l.id
+"""
+
+# Variante de core.get_payment_deadline_warnings() acotada a un lote de IDs
+PAYMENT_WARNINGS_BY_IDS_SQL = """
+    SELECT
+        b.id AS booking_id,
+        u.email AS guest_email,
+        CONCAT_WS(' ', u.first_name, u.last_name) AS guest_name,
+        l.title AS listing_title,
+        b.payment_deadline AS deadline,
+        EXTRACT(EPOCH FROM (b.payment_deadline - NOW()))/60 AS minutes_remaining
+    FROM core.bookings b
+    JOIN core.users u ON b.guest_user_id = u.id
+    JOIN core.listings l ON b.listing_id = l.id
+    WHERE
+        b.id = ANY(CAST(:booking_ids AS uuid[]))
+        AND b.status = 'confirmed'
+        AND b.payment_deadline IS NOT NULL
+        AND b.reservation_paid_at IS NULL
+        AND b.payment_deadline > NOW()
+    ORDER BY b.payment_deadline ASC
+"""
+
+# Reservas que siguen pendientes pero cuyo plazo aún no vence según la BD
+# (p.ej. desfase de reloj entre worker y Postgres): se vuelven a encolar.
+PENDING_DEADLINES_BY_IDS_SQL = """
+    SELECT b.id, b.payment_deadline
+    FROM core.bookings b
+    WHERE
+        b.id = ANY(CAST(:booking_ids AS uuid[]))
+        AND b.status = 'confirmed'
+        AND b.payment_deadline IS NOT NULL
+        AND b.reservation_paid_at IS NULL
+        AND b.payment_deadline > NOW()
+"""
+
+
 class BookingScheduledTasks:
     """
     Tareas programadas para gestión de reservas
     """
+
+    @staticmethod
+    def _serialize_cancelled(rows) -> list:
+        return [
+            {
+                "booking_id": str(row.cancelled_booking_id),
+                "guest_email": row.guest_email,
+                "listing_title": row.listing_title,
+                "deadline": row.deadline.isoformat()
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def _enqueue_payment_expired_emails(rows) -> int:
+        payloads = [
+            {
+                "guest_email": booking.guest_email,
+                "listing_title": booking.listing_title,
+                "deadline": booking.deadline.strftime("%d/%m/%Y %H:%M"),
+            }
+            for booking in rows
+        ]
+        return enqueue_bulk_emails("payment_expired", payloads)
+
+    @staticmethod
+    def _enqueue_payment_reminder_emails(rows) -> int:
+        payloads = [
+            {
+                "guest_email": warning.guest_email,
+                "guest_name": warning.guest_name,
+                "listing_title": warning.listing_title,
+                "deadline": warning.deadline.strftime("%d/%m/%Y %H:%M"),
+                "minutes_remaining": int(warning.minutes_remaining),
+                "booking_id": str(warning.booking_id),
+            }
+            for warning in rows
+        ]
+        return enqueue_bulk_emails("payment_deadline_reminder", payloads)
     
     @staticmethod
     def cancel_expired_payment_bookings(db: Session) -> dict:
@@ -32,35 +137,18 @@ class BookingScheduledTasks:
             """))
             
             cancelled_bookings = result.fetchall()
+            db.commit()
             
             if cancelled_bookings:
                 logger.info(f"🔴 Canceladas {len(cancelled_bookings)} reservas por pago expirado")
                 
                 # Encolar emails de notificación
-                for booking in cancelled_bookings:
-                    try:
-                        send_payment_expired_email_task.delay(
-                            {
-                                "guest_email": booking.guest_email,
-                                "listing_title": booking.listing_title,
-                                "deadline": booking.deadline.strftime("%d/%m/%Y %H:%M"),
-                            }
-                        )
-                    except Exception as e:
-                        logger.error(f"Error enviando email de cancelación: {e}")
+                BookingScheduledTasks._enqueue_payment_expired_emails(cancelled_bookings)
                 
                 return {
                     "success": True,
                     "cancelled_count": len(cancelled_bookings),
-                    "bookings": [
-                        {
-                            "booking_id": str(row.cancelled_booking_id),
-                            "guest_email": row.guest_email,
-                            "listing_title": row.listing_title,
-                            "deadline": row.deadline.isoformat()
-                        }
-                        for row in cancelled_bookings
-                    ]
+                    "bookings": BookingScheduledTasks._serialize_cancelled(cancelled_bookings)
                 }
             else:
                 logger.info("✅ No hay reservas con pago expirado")
@@ -71,6 +159,7 @@ class BookingScheduledTasks:
                 }
                 
         except Exception as e:
+            db.rollback()
             logger.error(f"❌ Error cancelando reservas expiradas: {e}")
             return {
                 "success": False,
@@ -92,23 +181,7 @@ class BookingScheduledTasks:
             if warnings:
                 logger.info(f"⚠️ Enviando {len(warnings)} recordatorios de pago")
 
-                sent_count = 0
-                
-                for warning in warnings:
-                    try:
-                        send_payment_deadline_reminder_email_task.delay(
-                            {
-                                "guest_email": warning.guest_email,
-                                "guest_name": warning.guest_name,
-                                "listing_title": warning.listing_title,
-                                "deadline": warning.deadline.strftime("%d/%m/%Y %H:%M"),
-                                "minutes_remaining": int(warning.minutes_remaining),
-                                "booking_id": str(warning.booking_id),
-                            }
-                        )
-                        sent_count += 1
-                    except Exception as e:
-                        logger.error(f"Error enviando recordatorio: {e}")
+                sent_count = BookingScheduledTasks._enqueue_payment_reminder_emails(warnings)
                 
                 return {
                     "success": True,
@@ -129,3 +202,143 @@ class BookingScheduledTasks:
                 "success": False,
                 "error": str(e)
             }
+
+    @staticmethod
+    def process_due_payment_deadlines(db: Session, batch_size: Optional[int] = None) -> dict:
+        """
+        Procesa los eventos de plazo de pago vencidos en la cola de Redis.
+
+        Solo se tocan las reservas cuyo evento venció (búsqueda por clave
+        primaria); si Redis no está disponible se recurre al escaneo completo
+        mediante las funciones SQL.
+        """
+        if not payment_deadline_queue.is_available():
+            logger.warning("Cola de plazos no disponible, usando escaneo SQL completo")
+            expired = BookingScheduledTasks.cancel_expired_payment_bookings(db)
+            warnings = BookingScheduledTasks.send_payment_deadline_warnings(db)
+            return {
+                "success": expired.get("success", False) and warnings.get("success", False),
+                "mode": "scan",
+                "cancelled_count": expired.get("cancelled_count", 0),
+                "warnings_count": warnings.get("warnings_count", 0),
+                "sent_count": warnings.get("sent_count", 0),
+            }
+
+        batch_size = batch_size or settings.payment_deadline_drain_batch_size
+        warnings_count = 0
+        sent_count = 0
+        cancelled_count = 0
+        requeued_count = 0
+        # IDs ya extraídos de Redis cuyo trabajo aún no terminó: si algo falla
+        # se devuelven a la cola en lugar de perderse
+        unsent_warning_ids = []
+        uncommitted_expiry_ids = []
+
+        try:
+            # Recordatorios: la consulta descarta reservas ya vencidas o pagadas
+            while True:
+                booking_ids = payment_deadline_queue.pop_due_warnings(limit=batch_size)
+                if not booking_ids:
+                    break
+                unsent_warning_ids = booking_ids
+
+                due_warnings = db.execute(
+                    text(PAYMENT_WARNINGS_BY_IDS_SQL), {"booking_ids": booking_ids}
+                ).fetchall()
+
+                # Encolar por lote: un fallo en un lote posterior no afecta
+                # a los correos de los anteriores
+                sent_count += BookingScheduledTasks._enqueue_payment_reminder_emails(due_warnings)
+                warnings_count += len(due_warnings)
+                unsent_warning_ids = []
+
+                if len(booking_ids) < batch_size:
+                    break
+
+            while True:
+                booking_ids = payment_deadline_queue.pop_due_expiries(limit=batch_size)
+                if not booking_ids:
+                    break
+                uncommitted_expiry_ids = booking_ids
+
+                cancelled = db.execute(
+                    text(CANCEL_EXPIRED_BY_IDS_SQL), {"booking_ids": booking_ids}
+                ).fetchall()
+
+                cancelled_ids = {str(row.cancelled_booking_id) for row in cancelled}
+                leftover_ids = [bid for bid in booking_ids if bid not in cancelled_ids]
+                if leftover_ids:
+                    pending = db.execute(
+                        text(PENDING_DEADLINES_BY_IDS_SQL), {"booking_ids": leftover_ids}
+                    ).fetchall()
+                    requeued_count += payment_deadline_queue.register_many(
+                        (row.id, row.payment_deadline) for row in pending
+                    )
+
+                db.commit()
+                uncommitted_expiry_ids = []
+
+                # Las cancelaciones ya están confirmadas: avisar a sus
+                # huéspedes antes de seguir con el siguiente lote
+                if cancelled:
+                    BookingScheduledTasks._enqueue_payment_expired_emails(cancelled)
+                    cancelled_count += len(cancelled)
+
+                if len(booking_ids) < batch_size:
+                    break
+
+            if cancelled_count:
+                logger.info(f"🔴 Canceladas {cancelled_count} reservas por pago expirado")
+
+            return {
+                "success": True,
+                "mode": "queue",
+                "cancelled_count": cancelled_count,
+                "warnings_count": warnings_count,
+                "sent_count": sent_count,
+                "requeued_count": requeued_count,
+            }
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Error procesando plazos de pago: {e}")
+            payment_deadline_queue.requeue_warnings(unsent_warning_ids)
+            payment_deadline_queue.requeue_expiries(uncommitted_expiry_ids)
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    @staticmethod
+    def resync_payment_deadline_queue(db: Session) -> dict:
+        """
+        Reconstruye la cola de plazos desde la BD (tras un flush de Redis o
+        al desplegar por primera vez). Es la única operación que recorre
+        todas las reservas confirmadas pendientes de pago.
+        """
+        try:
+            rows = db.execute(text("""
+                SELECT id, payment_deadline
+                FROM core.bookings
+                WHERE status = 'confirmed'
+                  AND payment_deadline IS NOT NULL
+                  AND reservation_paid_at IS NULL
+            """)).fetchall()
+
+            registered = payment_deadline_queue.register_many(
+                (row.id, row.payment_deadline) for row in rows
+            )
+            logger.info(f"🔁 Cola de plazos resincronizada: {registered}/{len(rows)} reservas")
+
+            return {
+                "success": True,
+                "pending_count": len(rows),
+                "registered_count": registered
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Error resincronizando cola de plazos: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
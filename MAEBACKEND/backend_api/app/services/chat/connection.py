@@ -0,0 +1,141 @@
+"""
+Per-socket outbound queue for the chat WebSocket system.
+Each connection owns a bounded queue drained by its own writer task, so a
+slow client only delays itself and never the broadcaster.
+"""
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Tuple
+from uuid import UUID
+import asyncio
+import logging
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+
+# Eventos efímeros: si la cola está llena se descartan antes que un mensaje
+DROPPABLE_EVENT_TYPES = frozenset({"typing", "presence"})
+
+
+class ClientConnection:
+    """
+    Conexión WebSocket con cola de salida acotada y tarea escritora propia.
+
+    Política de backpressure cuando la cola está llena:
+    - Eventos efímeros (typing/presence): se descarta el nuevo evento.
+    - Eventos persistentes (mensajes, recibos): se expulsa el evento efímero
+      más antiguo en cola; si no hay ninguno, el cliente se considera lento y
+      se cierra la conexión (al reconectar recupera el historial por REST).
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: UUID,
+        conversation_id: UUID,
+        max_queue_size: int,
+        send_timeout: float,
+        on_failure: Callable[["ClientConnection"], Awaitable[None]],
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.max_queue_size = max_queue_size
+        self.send_timeout = send_timeout
+        self._on_failure = on_failure
+
+        # (mensaje, es_efímero)
+        self._queue: Deque[Tuple[dict, bool]] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.sent_count = 0
+        self.dropped_count = 0
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def start(self) -> None:
+        self._writer_task = asyncio.create_task(self._writer())
+
+    def enqueue(self, message: dict) -> bool:
+        """
+        Encolar un mensaje sin bloquear.
+
+        Returns:
+            True si quedó encolado, False si se descartó
+        """
+        if self._closed:
+            return False
+
+        droppable = message.get("type") in DROPPABLE_EVENT_TYPES
+
+        if len(self._queue) >= self.max_queue_size:
+            if droppable:
+                self.dropped_count += 1
+                return False
+
+            if not self._evict_oldest_droppable():
+                logger.warning(
+                    f"Slow consumer: closing socket of user {self.user_id} "
+                    f"(queue={len(self._queue)})"
+                )
+                self._fail()
+                return False
+
+        self._queue.append((message, droppable))
+        self._wakeup.set()
+        return True
+
+    def _evict_oldest_droppable(self) -> bool:
+        for index, (_, droppable) in enumerate(self._queue):
+            if droppable:
+                del self._queue[index]
+                self.dropped_count += 1
+                return True
+        return False
+
+    async def _writer(self) -> None:
+        try:
+            while not self._closed:
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                message, _ = self._queue.popleft()
+                await asyncio.wait_for(
+                    self.websocket.send_json(message),
+                    timeout=self.send_timeout
+                )
+                self.sent_count += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending message to {self.user_id}: {e}")
+            self._fail()
+
+    def _fail(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.clear()
+        asyncio.create_task(self._on_failure(self))
+
+    async def close(self) -> None:
+        self._closed = True
+        self._queue.clear()
+        if self._writer_task and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._writer_task = None
@@ -0,0 +1,215 @@
+"""
+Redis pub/sub fan-out for the chat system.
+Relays WebSocket events between API workers/nodes so a message published on
+one process reaches recipients connected to any other.
+"""
+from typing import Awaitable, Callable, Optional, Set
+from uuid import UUID, uuid4
+import asyncio
+import json
+import logging
+import os
+import socket
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+EnvelopeHandler = Callable[[dict], Awaitable[None]]
+
+
+class ChatPubSub:
+    """
+    Puente Redis pub/sub entre workers del chat.
+
+    Cada worker se suscribe solo a los canales de las conversaciones y
+    usuarios que tienen sockets locales (``chat:conv:{id}`` / ``chat:user:{id}``),
+    por lo que el tráfico por nodo es proporcional a sus conexiones y no al
+    total del sistema. Los eventos llevan el ``node_id`` de origen para que el
+    emisor (que ya entregó localmente) los ignore al recibirlos de vuelta.
+    """
+
+    CONVERSATION_PREFIX = "chat:conv:"
+    USER_PREFIX = "chat:user:"
+    NODE_PREFIX = "chat:node:"
+
+    def __init__(self):
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.enabled = settings.chat_pubsub_enabled
+        self._client = None
+        self._pubsub = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._retry_task: Optional[asyncio.Task] = None
+        self._handler: Optional[EnvelopeHandler] = None
+        self._channels: Set[str] = set()
+
+    @property
+    def is_running(self) -> bool:
+        return self._listener_task is not None and not self._listener_task.done()
+
+    async def start(self, handler: EnvelopeHandler) -> bool:
+        """
+        Connect to Redis and start the listener task for this worker. If Redis
+        is unreachable a background task keeps retrying with backoff, so the
+        worker joins the fan-out as soon as Redis comes back.
+        """
+        if not self.enabled or self.is_running:
+            return self.is_running
+
+        self._handler = handler
+        if await self._connect():
+            return True
+
+        logger.warning("Chat pub/sub unavailable, delivery is worker-local until Redis reconnects")
+        if self._retry_task is None or self._retry_task.done():
+            self._retry_task = asyncio.create_task(self._retry_connect())
+        return False
+
+    async def _connect(self) -> bool:
+        client = await get_async_redis_client()
+        if not client:
+            return False
+
+        self._client = client
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+        try:
+            # Canal propio del nodo: mantiene la conexión suscrita aunque no
+            # haya sockets locales todavía.
+            await self._pubsub.subscribe(f"{self.NODE_PREFIX}{self.node_id}")
+            if self._channels:
+                await self._pubsub.subscribe(*self._channels)
+        except (RedisError, OSError) as exc:
+            logger.warning("Chat pub/sub subscribe failed: %s", exc)
+            self._pubsub = None
+            return False
+
+        self._listener_task = asyncio.create_task(self._listen())
+        logger.info("Chat pub/sub started (node_id=%s)", self.node_id)
+        return True
+
+    async def _retry_connect(self) -> None:
+        delay = 1.0
+        while not self.is_running:
+            await asyncio.sleep(delay)
+            try:
+                if await self._connect():
+                    return
+            except Exception as exc:
+                logger.warning("Chat pub/sub reconnect failed: %s", exc)
+            delay = min(delay * 2, settings.chat_pubsub_retry_max_seconds)
+
+    async def stop(self) -> None:
+        for task in (self._retry_task, self._listener_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._retry_task = None
+        self._listener_task = None
+
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.close()
+            except RedisError:
+                pass
+            self._pubsub = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+
+                envelope = json.loads(message["data"])
+                if envelope.get("origin") == self.node_id:
+                    continue
+
+                await self._handler(envelope)
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as exc:
+                logger.error("Chat pub/sub listener error: %s", exc)
+                await asyncio.sleep(1.0)
+            except Exception as exc:
+                logger.error("Error handling chat pub/sub event: %s", exc, exc_info=True)
+
+    async def _subscribe(self, channel: str) -> None:
+        if channel in self._channels:
+            return
+        self._channels.add(channel)
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.subscribe(channel)
+        except RedisError as exc:
+            logger.warning("Unable to subscribe to %s: %s", channel, exc)
+
+    async def _unsubscribe(self, channel: str) -> None:
+        if channel not in self._channels:
+            return
+        self._channels.discard(channel)
+        if self._pubsub is None:
+            return
+        try:
+            await self._pubsub.unsubscribe(channel)
+        except RedisError as exc:
+            logger.warning("Unable to unsubscribe from %s: %s", channel, exc)
+
+    async def subscribe_conversation(self, conversation_id: UUID) -> None:
+        await self._subscribe(f"{self.CONVERSATION_PREFIX}{conversation_id}")
+
+    async def unsubscribe_conversation(self, conversation_id: UUID) -> None:
+        await self._unsubscribe(f"{self.CONVERSATION_PREFIX}{conversation_id}")
+
+    async def subscribe_user(self, user_id: UUID) -> None:
+        await self._subscribe(f"{self.USER_PREFIX}{user_id}")
+
+    async def unsubscribe_user(self, user_id: UUID) -> None:
+        await self._unsubscribe(f"{self.USER_PREFIX}{user_id}")
+
+    async def _publish(self, channel: str, envelope: dict) -> bool:
+        if not self.is_running:
+            return False
+
+        envelope["origin"] = self.node_id
+        try:
+            await self._client.publish(channel, json.dumps(envelope, default=str))
+            return True
+        except RedisError as exc:
+            logger.warning("Chat pub/sub publish to %s failed: %s", channel, exc)
+            return False
+
+    async def publish_to_conversation(
+        self,
+        conversation_id: UUID,
+        message: dict,
+        exclude_user_id: Optional[UUID] = None
+    ) -> bool:
+        return await self._publish(
+            f"{self.CONVERSATION_PREFIX}{conversation_id}",
+            {
+                "scope": "conversation",
+                "target": str(conversation_id),
+                "exclude_user_id": str(exclude_user_id) if exclude_user_id else None,
+                "message": message,
+            }
+        )
+
+    async def publish_to_user(self, user_id: UUID, message: dict) -> bool:
+        return await self._publish(
+            f"{self.USER_PREFIX}{user_id}",
+            {
+                "scope": "user",
+                "target": str(user_id),
+                "message": message,
+            }
+        )
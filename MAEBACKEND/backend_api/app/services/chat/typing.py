@@ -0,0 +1,97 @@
+"""
+Server-side coalescing of typing indicators for the chat system.
+Keystroke-level typing frames are collapsed into one "started" event, a
+periodic refresh while the user keeps typing and one "stopped" event.
+"""
+from typing import Awaitable, Callable, Dict, Tuple
+from uuid import UUID
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+TypingKey = Tuple[UUID, UUID]  # (conversation_id, user_id)
+TypingBroadcast = Callable[[UUID, UUID, bool], Awaitable[None]]
+
+
+class TypingCoalescer:
+    """
+    Estado de "escribiendo..." por usuario y conversación.
+
+    - Un ``is_typing=True`` se difunde solo si el usuario no estaba escribiendo
+      o si pasó ``refresh_seconds`` desde la última difusión (mantiene vivo el
+      indicador del cliente, que lo expira por su cuenta).
+    - Un ``is_typing=False`` se difunde solo si el usuario estaba escribiendo.
+    - Si no llega ningún frame en ``idle_seconds`` se difunde el "stop"
+      automáticamente.
+    """
+
+    def __init__(
+        self,
+        broadcast: TypingBroadcast,
+        refresh_seconds: float,
+        idle_seconds: float,
+    ):
+        self._broadcast = broadcast
+        self.refresh_seconds = refresh_seconds
+        self.idle_seconds = idle_seconds
+        self._last_sent: Dict[TypingKey, float] = {}
+        self._idle_timers: Dict[TypingKey, asyncio.TimerHandle] = {}
+
+    def is_typing(self, conversation_id: UUID, user_id: UUID) -> bool:
+        return (conversation_id, user_id) in self._last_sent
+
+    async def update(self, conversation_id: UUID, user_id: UUID, is_typing: bool) -> bool:
+        """
+        Registrar un frame de typing.
+
+        Returns:
+            True si se difundió un evento
+        """
+        key = (conversation_id, user_id)
+
+        if not is_typing:
+            return await self.stop(conversation_id, user_id)
+
+        self._arm_idle_timer(key)
+
+        now = time.monotonic()
+        last_sent = self._last_sent.get(key)
+        if last_sent is not None and now - last_sent < self.refresh_seconds:
+            return False
+
+        self._last_sent[key] = now
+        await self._broadcast(conversation_id, user_id, True)
+        return True
+
+    async def stop(self, conversation_id: UUID, user_id: UUID) -> bool:
+        key = (conversation_id, user_id)
+        timer = self._idle_timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        if self._last_sent.pop(key, None) is None:
+            return False
+
+        await self._broadcast(conversation_id, user_id, False)
+        return True
+
+    def _arm_idle_timer(self, key: TypingKey) -> None:
+        timer = self._idle_timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        loop = asyncio.get_running_loop()
+        self._idle_timers[key] = loop.call_later(
+            self.idle_seconds,
+            lambda: asyncio.create_task(self._expire(key))
+        )
+
+    async def _expire(self, key: TypingKey) -> None:
+        self._idle_timers.pop(key, None)
+        try:
+            await self.stop(*key)
+        except Exception as e:
+            logger.error(f"Error expiring typing indicator {key}: {e}")
@@ -7,8 +7,17 @@ from fastapi import WebSocket
 from uuid import UUID
 import json
 import logging
+import os
 from datetime import datetime
 
+import psutil
+
+from app.core.config import settings
+from app.core.database import get_db_pool_diagnostics
+from .connection import ClientConnection
+from .pubsub import ChatPubSub
+from .typing import TypingCoalescer
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,20 +30,69 @@ class ConnectionManager:
     - Tracking de participantes por conversación
     - Broadcast de mensajes
     - Gestión de presencia
+    - Fan-out entre workers/nodos vía Redis pub/sub
     """
     
     def __init__(self):
+        # Puente pub/sub: los eventos se entregan a los sockets locales y se
+        # publican para que el resto de workers los entregue a los suyos.
+        self.pubsub = ChatPubSub()
+        
+        # Índices mantenidos en connect/disconnect para que toda operación
+        # sea O(sockets afectados), nunca O(conversaciones activas).
+        
         # user_id -> Set[WebSocket]
         self.active_connections: Dict[UUID, Set[WebSocket]] = {}
         
-        # conversation_id -> Set[user_id]
-        self.conversation_participants: Dict[UUID, Set[UUID]] = {}
+        # conversation_id -> Set[WebSocket]
+        self.conversation_sockets: Dict[UUID, Set[WebSocket]] = {}
+        
+        # user_id -> {conversation_id: nº de sockets del usuario en ella}
+        self.user_conversations: Dict[UUID, Dict[UUID, int]] = {}
         
         # websocket -> user_id (para cleanup rápido)
         self.websocket_to_user: Dict[WebSocket, UUID] = {}
         
         # websocket -> conversation_id
         self.websocket_to_conversation: Dict[WebSocket, UUID] = {}
+        
+        # websocket -> ClientConnection (cola de salida + tarea escritora)
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        
+        # Indicadores de escritura coalescidos por (conversación, usuario)
+        self.typing = TypingCoalescer(
+            self._broadcast_typing,
+            refresh_seconds=settings.chat_typing_refresh_seconds,
+            idle_seconds=settings.chat_typing_idle_seconds
+        )
+    
+    async def start(self):
+        """Iniciar el listener pub/sub de este worker (lifespan de la app)."""
+        await self.pubsub.start(self.handle_remote_event)
+    
+    async def stop(self):
+        await self.pubsub.stop()
+    
+    async def handle_remote_event(self, envelope: dict):
+        """
+        Entregar a los sockets locales un evento publicado por otro worker.
+        
+        Args:
+            envelope: Evento recibido del canal pub/sub
+        """
+        scope = envelope.get("scope")
+        message = envelope.get("message")
+        target = UUID(envelope["target"])
+        
+        if scope == "conversation":
+            exclude = envelope.get("exclude_user_id")
+            await self._broadcast_local(
+                message,
+                target,
+                exclude_user_id=UUID(exclude) if exclude else None
+            )
+        elif scope == "user":
+            await self._send_local(message, target)
     
     async def connect(
         self, 
@@ -52,19 +110,35 @@ class ConnectionManager:
         """
         await websocket.accept()
         
+        connection = ClientConnection(
+            websocket,
+            user_id,
+            conversation_id,
+            max_queue_size=settings.chat_send_queue_size,
+            send_timeout=settings.chat_send_timeout_seconds,
+            on_failure=self._on_connection_failure
+        )
+        connection.start()
+        self.connections[websocket] = connection
+        
         # Registrar conexión por usuario
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
+            await self.pubsub.subscribe_user(user_id)
         self.active_connections[user_id].add(websocket)
         
         # Mapear websocket -> user
         self.websocket_to_user[websocket] = user_id
         self.websocket_to_conversation[websocket] = conversation_id
         
-        # Registrar participante en conversación
-        if conversation_id not in self.conversation_participants:
-            self.conversation_participants[conversation_id] = set()
-        self.conversation_participants[conversation_id].add(user_id)
+        # Registrar socket en la conversación
+        if conversation_id not in self.conversation_sockets:
+            self.conversation_sockets[conversation_id] = set()
+            await self.pubsub.subscribe_conversation(conversation_id)
+        self.conversation_sockets[conversation_id].add(websocket)
+        
+        conversations = self.user_conversations.setdefault(user_id, {})
+        conversations[conversation_id] = conversations.get(conversation_id, 0) + 1
         
         logger.info(
             f"User {user_id} connected to conversation {conversation_id}. "
@@ -78,31 +152,46 @@ class ConnectionManager:
         Args:
             websocket: Conexión a desconectar
         """
-        user_id = self.websocket_to_user.get(websocket)
-        conversation_id = self.websocket_to_conversation.get(websocket)
+        # Se retiran los mapeos antes de cualquier await: una segunda llamada
+        # concurrente (cierre por fallo + finally del endpoint) es un no-op.
+        user_id = self.websocket_to_user.pop(websocket, None)
+        conversation_id = self.websocket_to_conversation.pop(websocket, None)
+        
+        connection = self.connections.pop(websocket, None)
+        if connection:
+            await connection.close()
         
         if not user_id:
             return
         
+        # Cerrar un "escribiendo..." que quedó abierto
+        if conversation_id:
+            await self.typing.stop(conversation_id, user_id)
+        
         # Remover websocket del usuario
-        if user_id in self.active_connections:
-            self.active_connections[user_id].discard(websocket)
-            
-            # Si no hay más conexiones del usuario, limpiarlo
-            if not self.active_connections[user_id]:
+        user_sockets = self.active_connections.get(user_id)
+        if user_sockets is not None:
+            user_sockets.discard(websocket)
+            if not user_sockets:
                 del self.active_connections[user_id]
-                
-                # Limpiar de todas las conversaciones
-                for conv_id, participants in list(self.conversation_participants.items()):
-                    participants.discard(user_id)
-                    if not participants:
-                        del self.conversation_participants[conv_id]
-        
-        # Limpiar mapeos
-        if websocket in self.websocket_to_user:
-            del self.websocket_to_user[websocket]
-        if websocket in self.websocket_to_conversation:
-            del self.websocket_to_conversation[websocket]
+                await self.pubsub.unsubscribe_user(user_id)
+        
+        # Remover websocket de su conversación (solo la suya, no todas)
+        if conversation_id:
+            conversation_sockets = self.conversation_sockets.get(conversation_id)
+            if conversation_sockets is not None:
+                conversation_sockets.discard(websocket)
+                if not conversation_sockets:
+                    del self.conversation_sockets[conversation_id]
+                    await self.pubsub.unsubscribe_conversation(conversation_id)
+            
+            conversations = self.user_conversations.get(user_id)
+            if conversations is not None and conversation_id in conversations:
+                conversations[conversation_id] -= 1
+                if conversations[conversation_id] <= 0:
+                    del conversations[conversation_id]
+                if not conversations:
+                    del self.user_conversations[user_id]
         
         logger.info(
             f"User {user_id} disconnected from conversation {conversation_id}"
@@ -114,7 +203,23 @@ class ConnectionManager:
         user_id: UUID
     ):
         """
-        Enviar un mensaje a todas las conexiones activas de un usuario.
+        Enviar un mensaje a todas las conexiones activas de un usuario,
+        en este worker y (vía pub/sub) en el resto.
+        
+        Args:
+            message: Diccionario con el mensaje a enviar
+            user_id: ID del usuario destinatario
+        """
+        await self._send_local(message, user_id)
+        await self.pubsub.publish_to_user(user_id, message)
+    
+    async def _send_local(
+        self, 
+        message: dict, 
+        user_id: UUID
+    ):
+        """
+        Enviar un mensaje a las conexiones de un usuario en este worker.
         
         Args:
             message: Diccionario con el mensaje a enviar
@@ -124,18 +229,36 @@ class ConnectionManager:
             logger.debug(f"User {user_id} is not connected")
             return
         
-        disconnected = set()
-        
+        # Encolado no bloqueante: cada socket lo drena su propia tarea
         for websocket in self.active_connections[user_id]:
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to {user_id}: {e}")
-                disconnected.add(websocket)
-        
-        # Cleanup de conexiones muertas
-        for ws in disconnected:
-            await self.disconnect(ws)
+            connection = self.connections.get(websocket)
+            if connection:
+                connection.enqueue(message)
+    
+    def send_to_socket(self, websocket: WebSocket, message: dict) -> bool:
+        """
+        Encolar un mensaje para un socket concreto (respuestas directas como
+        pong o errores), respetando el orden de su cola de salida.
+        
+        Args:
+            websocket: Conexión destino
+            message: Diccionario con el mensaje
+            
+        Returns:
+            True si quedó encolado
+        """
+        connection = self.connections.get(websocket)
+        if not connection:
+            return False
+        return connection.enqueue(message)
+    
+    async def _on_connection_failure(self, connection: ClientConnection):
+        """Cerrar y desregistrar un socket caído o demasiado lento."""
+        await self.disconnect(connection.websocket)
+        try:
+            await connection.websocket.close(code=1013)  # Try Again Later
+        except Exception:
+            pass
     
     async def broadcast_to_conversation(
         self, 
@@ -144,25 +267,44 @@ class ConnectionManager:
         exclude_user_id: Optional[UUID] = None
     ):
         """
-        Enviar un mensaje a todos los participantes activos de una conversación.
+        Enviar un mensaje a todos los participantes activos de una conversación,
+        conectados a este worker o a cualquier otro.
         
         Args:
             message: Diccionario con el mensaje a broadcast
             conversation_id: ID de la conversación
             exclude_user_id: ID de usuario a excluir (opcional, ej: el remitente)
         """
-        if conversation_id not in self.conversation_participants:
+        await self._broadcast_local(message, conversation_id, exclude_user_id)
+        await self.pubsub.publish_to_conversation(conversation_id, message, exclude_user_id)
+    
+    async def _broadcast_local(
+        self, 
+        message: dict, 
+        conversation_id: UUID,
+        exclude_user_id: Optional[UUID] = None
+    ):
+        """
+        Enviar un mensaje a los participantes de una conversación en este worker.
+        
+        Args:
+            message: Diccionario con el mensaje a broadcast
+            conversation_id: ID de la conversación
+            exclude_user_id: ID de usuario a excluir (opcional)
+        """
+        sockets = self.conversation_sockets.get(conversation_id)
+        if not sockets:
             logger.debug(f"No active participants in conversation {conversation_id}")
             return
         
-        participants = self.conversation_participants[conversation_id].copy()
-        
-        for user_id in participants:
-            # Excluir usuario si se especifica
-            if exclude_user_id and user_id == exclude_user_id:
+        # Encolado no bloqueante por socket de la conversación
+        for websocket in sockets:
+            if exclude_user_id and self.websocket_to_user.get(websocket) == exclude_user_id:
                 continue
             
-            await self.send_personal_message(message, user_id)
+            connection = self.connections.get(websocket)
+            if connection:
+                connection.enqueue(message)
     
     async def broadcast_typing_indicator(
         self,
@@ -171,13 +313,23 @@ class ConnectionManager:
         is_typing: bool
     ):
         """
-        Broadcast de indicador de "escribiendo..." a una conversación.
+        Registrar un indicador de "escribiendo..." del cliente.
+        Los frames por pulsación se coalescen: solo se difunden el inicio,
+        refrescos periódicos y el fin (explícito o por inactividad).
         
         Args:
             conversation_id: ID de la conversación
             user_id: ID del usuario que está escribiendo
             is_typing: True si está escribiendo, False si dejó de escribir
         """
+        await self.typing.update(conversation_id, user_id, is_typing)
+    
+    async def _broadcast_typing(
+        self,
+        conversation_id: UUID,
+        user_id: UUID,
+        is_typing: bool
+    ):
         message = {
             "type": "typing",
             "user_id": str(user_id),
@@ -221,23 +373,32 @@ class ConnectionManager:
     async def broadcast_read_receipt(
         self,
         conversation_id: UUID,
-        message_id: UUID,
-        user_id: UUID
+        message_id: Optional[UUID],
+        user_id: UUID,
+        read_up_to: Optional[datetime] = None,
+        read_count: Optional[int] = None
     ):
         """
-        Broadcast de confirmación de lectura de mensaje.
+        Broadcast de confirmación de lectura.
+        Con ``read_up_to`` el recibo cubre todos los mensajes hasta esa marca.
         
         Args:
             conversation_id: ID de la conversación
-            message_id: ID del mensaje leído
-            user_id: ID del usuario que leyó el mensaje
+            message_id: ID del último mensaje leído
+            user_id: ID del usuario que leyó los mensajes
+            read_up_to: Marca de agua (created_at del último mensaje leído)
+            read_count: Número de mensajes marcados como leídos
         """
         message = {
             "type": "read_receipt",
-            "message_id": str(message_id),
+            "message_id": str(message_id) if message_id else None,
             "read_by": str(user_id),
             "read_at": datetime.utcnow().isoformat()
         }
+        if read_up_to:
+            message["read_up_to"] = read_up_to.isoformat()
+        if read_count is not None:
+            message["read_count"] = read_count
         
         await self.broadcast_to_conversation(
             message,
@@ -280,10 +441,23 @@ class ConnectionManager:
         Returns:
             Set de UUIDs de usuarios online
         """
-        if conversation_id not in self.conversation_participants:
-            return set()
+        return {
+            self.websocket_to_user[websocket]
+            for websocket in self.conversation_sockets.get(conversation_id, ())
+            if websocket in self.websocket_to_user
+        }
+    
+    def get_user_conversations(self, user_id: UUID) -> Set[UUID]:
+        """
+        Obtener las conversaciones en las que un usuario tiene sockets abiertos.
         
-        return self.conversation_participants[conversation_id].copy()
+        Args:
+            user_id: ID del usuario
+            
+        Returns:
+            Set de UUIDs de conversaciones
+        """
+        return set(self.user_conversations.get(user_id, ()))
     
     def get_stats(self) -> dict:
         """
@@ -292,15 +466,29 @@ class ConnectionManager:
         Returns:
             Diccionario con estadísticas
         """
-        total_connections = sum(
-            len(connections) 
-            for connections in self.active_connections.values()
-        )
+        total_connections = len(self.websocket_to_user)
+        
+        queued_messages = sum(c.queue_size for c in self.connections.values())
+        dropped_messages = sum(c.dropped_count for c in self.connections.values())
+        
+        # Métricas del proceso: cada worker responde con las suyas, así que
+        # muestrear este endpoint bajo carga da memoria y pool por worker
+        try:
+            pool_checkedout = get_db_pool_diagnostics().get("checkedout")
+        except Exception:
+            pool_checkedout = None
         
         return {
             "total_connections": total_connections,
+            "queued_messages": queued_messages,
+            "dropped_messages": dropped_messages,
             "unique_users_online": len(self.active_connections),
-            "active_conversations": len(self.conversation_participants),
+            "active_conversations": len(self.conversation_sockets),
+            "node_id": self.pubsub.node_id,
+            "pubsub_running": self.pubsub.is_running,
+            "worker_pid": os.getpid(),
+            "worker_rss_mb": round(psutil.Process().memory_info().rss / 1024 / 1024, 2),
+            "db_pool_checkedout": pool_checkedout,
             "timestamp": datetime.utcnow().isoformat()
         }
 
@@ -0,0 +1,334 @@
+"""
+Subidas directas a storage S3 (MinIO en desarrollo) con URL presignada.
+
+Flujo (los bytes del archivo nunca pasan por los workers de la API):
+1. ``POST /v1/media/upload-url`` con ``listing_id``: se firma un PUT a
+   ``{s3_upload_prefix}/{listing_id}/{upload_id}{ext}`` (Content-Type y
+   Content-Length incluidos en la firma) y la subida queda pendiente en Redis
+2. El cliente sube el archivo directamente al bucket
+3. ``POST /v1/media/uploads/{upload_id}/complete`` o la notificación
+   ``s3:ObjectCreated`` del bucket: HEAD del objeto y se encola
+   ``media.process_direct_upload``
+4. El worker descarga el objeto, lo procesa como cualquier otra subida y
+   lo borra del prefijo de entrada
+
+``MediaCacheService.mark_upload_processed`` (SET NX) hace idempotente el
+paso 3: reintentos del cliente y notificaciones repetidas devuelven el mismo
+estado sin encolar dos veces. Si el mensaje de Celery se pierde (o el worker
+muere antes de marcar ``failed``) la subida quedaría ``queued``: pasados
+``direct_upload_requeue_after_seconds`` desde ``queued_at`` el siguiente
+complete la vuelve a encolar.
+"""
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.exceptions import (
+    AuthorizationError, BusinessLogicError, ConflictError, NotFoundError, ValidationError
+)
+from app.models.listing import Listing
+from app.schemas.media import UploadUrlRequest, UploadUrlResponse
+from app.services.image_resize_service import MEDIA_ROOT
+from app.services.media_cache_service import MediaCacheService
+from app.utils.upload_spool import discard_spool_file, get_spool_directory, move_spool_file
+
+# Hacer boto3 opcional
+try:
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+    HAS_BOTO3 = True
+except ImportError:
+    HAS_BOTO3 = False
+    boto3 = None
+    Config = None
+    ClientError = Exception
+
+logger = logging.getLogger(__name__)
+
+# El estado final se recuerda un día (reintentos tardíos del cliente)
+PROCESSED_TTL = 86400
+
+
+class DirectUploadService:
+    def __init__(self):
+        self._clients: Dict[bool, Any] = {}
+        self._cache_service: Optional[MediaCacheService] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.use_s3 and HAS_BOTO3
+
+    @property
+    def cache_service(self) -> MediaCacheService:
+        # Perezoso: no conectar a Redis al importar el módulo
+        if self._cache_service is None:
+            self._cache_service = MediaCacheService()
+        return self._cache_service
+
+    def client(self, public: bool = False):
+        """
+        Cliente S3. ``public=True`` firma contra ``s3_public_endpoint_url``:
+        la firma incluye el host, que para MinIO en Docker no es el mismo
+        desde el navegador que desde la red interna.
+        """
+        if not self.enabled:
+            raise BusinessLogicError("Direct uploads require S3 storage (USE_S3=true and boto3 installed)")
+
+        endpoint_url = settings.s3_endpoint_url
+        if public and settings.s3_public_endpoint_url:
+            endpoint_url = settings.s3_public_endpoint_url
+
+        if public not in self._clients:
+            self._clients[public] = boto3.client(
+                's3',
+                endpoint_url=endpoint_url or None,
+                region_name=settings.aws_region,
+                # Sin claves explícitas boto3 usa su cadena por defecto (rol IAM, ~/.aws)
+                aws_access_key_id=settings.aws_access_key_id or None,
+                aws_secret_access_key=settings.aws_secret_access_key or None,
+                config=Config(
+                    signature_version='s3v4',
+                    # MinIO no resuelve buckets como subdominio
+                    s3={'addressing_style': 'path'} if endpoint_url else {},
+                ),
+            )
+        return self._clients[public]
+
+    def object_url(self, key: str) -> str:
+        if settings.cdn_base_url:
+            return f"{settings.cdn_base_url.rstrip('/')}/{key}"
+        endpoint_url = settings.s3_public_endpoint_url or settings.s3_endpoint_url
+        if endpoint_url:
+            return f"{endpoint_url.rstrip('/')}/{settings.s3_bucket_name}/{key}"
+        return f"https://{settings.s3_bucket_name}.s3.{settings.aws_region}.amazonaws.com/{key}"
+
+    # =====================================
+    # 1. URL PRESIGNADA
+    # =====================================
+
+    def create_upload(self, request: UploadUrlRequest, user_id: str) -> UploadUrlResponse:
+        if not request.listing_id:
+            raise ValidationError("listing_id es obligatorio para subidas directas")
+
+        content_type = (request.content_type or "").lower()
+        if content_type.startswith("image/"):
+            media_type, max_size = "image", settings.max_image_size
+        elif content_type.startswith("video/"):
+            media_type, max_size = "video", settings.max_video_size
+        else:
+            raise ValidationError("Solo se aceptan imágenes y videos")
+        if request.file_size > max_size:
+            raise ValidationError(f"El archivo no puede superar {max_size // (1024 * 1024)}MB")
+
+        if not self.cache_service.is_available():
+            raise BusinessLogicError("Servicio de subidas directas no disponible")
+
+        upload_id = str(uuid.uuid4())
+        extension = Path(request.filename).suffix.lower()
+        key = f"{settings.s3_upload_prefix}/{request.listing_id}/{upload_id}{extension}"
+        expires_in = settings.direct_upload_expires_seconds
+
+        try:
+            upload_url = self.client(public=True).generate_presigned_url(
+                'put_object',
+                Params={
+                    'Bucket': settings.s3_bucket_name,
+                    'Key': key,
+                    'ContentType': request.content_type,
+                    'ContentLength': request.file_size,
+                },
+                ExpiresIn=expires_in,
+            )
+        except ClientError as e:
+            logger.error(f"Error generating S3 upload URL: {e}")
+            raise BusinessLogicError("Could not generate upload URL")
+
+        self.cache_service.register_pending_upload(upload_id, {
+            'upload_id': upload_id,
+            'user_id': str(user_id),
+            'listing_id': str(request.listing_id),
+            'media_type': media_type,
+            'key': key,
+            'filename': Path(request.filename).name,
+            'content_type': request.content_type,
+            'file_size': request.file_size,
+        }, ttl=expires_in + PROCESSED_TTL)
+
+        return UploadUrlResponse(
+            upload_url=upload_url,
+            file_url=self.object_url(key),
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+            upload_id=upload_id,
+        )
+
+    # =====================================
+    # 2. COMPLETAR (API / notificación del bucket)
+    # =====================================
+
+    def status(self, upload_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        pending = self.cache_service.get_pending_upload(upload_id)
+        processed = self.cache_service.is_upload_processed(upload_id)
+
+        owner = (pending or processed or {}).get('user_id')
+        if user_id is not None and owner is not None and owner != str(user_id):
+            raise AuthorizationError("No tienes permiso sobre esta subida")
+
+        if processed:
+            return processed
+        if not pending:
+            raise NotFoundError("Subida no encontrada o expirada")
+        return self._state(pending, 'pending')
+
+    @staticmethod
+    def _state(pending: Dict[str, Any], status: str, **fields: Any) -> Dict[str, Any]:
+        return {
+            'upload_id': pending['upload_id'],
+            'user_id': pending['user_id'],
+            'status': status,
+            'listing_id': pending['listing_id'],
+            'media_type': pending['media_type'],
+            **fields,
+        }
+
+    @staticmethod
+    def _queue_stalled(state: Dict[str, Any]) -> bool:
+        """``queued`` sin avance tras el timeout (estados sin ``queued_at`` también)."""
+        queued_at = state.get('queued_at')
+        if not queued_at:
+            return True
+        elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(queued_at)
+        return elapsed.total_seconds() >= settings.direct_upload_requeue_after_seconds
+
+    def complete(self, upload_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Verificar el objeto subido y encolar su procesamiento (una sola vez).
+        ``user_id`` None = notificación del bucket (sin usuario).
+        """
+        from app.tasks.media_tasks import process_direct_upload_task
+
+        if not self.cache_service.is_available():
+            raise BusinessLogicError("Servicio de subidas directas no disponible")
+
+        state = self.status(upload_id, user_id)
+        stalled = state['status'] == 'queued' and self._queue_stalled(state)
+        if state['status'] not in ('pending', 'failed') and not stalled:
+            return state
+
+        pending = self.cache_service.get_pending_upload(upload_id)
+        if not pending:
+            raise NotFoundError("Subida no encontrada o expirada")
+
+        try:
+            head = self.client().head_object(Bucket=settings.s3_bucket_name, Key=pending['key'])
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise ConflictError("El archivo aún no se subió al storage")
+            raise
+        if head.get('ContentLength') != pending['file_size']:
+            raise ValidationError("El tamaño del archivo subido no coincide con el declarado")
+
+        queued = self._state(pending, 'queued', queued_at=datetime.now(timezone.utc).isoformat())
+        if stalled:
+            # Solo una petición reemplaza el estado atascado
+            if not self.cache_service.replace_upload_processed(upload_id, state, queued, ttl=PROCESSED_TTL):
+                return self.cache_service.is_upload_processed(upload_id) or state
+            logger.warning(f"Direct upload {upload_id} stalled in queue since {state.get('queued_at')}, requeuing")
+        else:
+            if state['status'] == 'failed':
+                self.cache_service.clear_upload_processed(upload_id)
+            if not self.cache_service.mark_upload_processed(upload_id, queued, ttl=PROCESSED_TTL, only_if_new=True):
+                # Otra petición (o la notificación del bucket) ya lo encoló
+                return self.cache_service.is_upload_processed(upload_id) or queued
+
+        process_direct_upload_task.delay(upload_id)
+        logger.info(f"Direct upload {upload_id} queued for processing ({pending['key']})")
+        return queued
+
+    def complete_from_event(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Completar las subidas de una notificación S3 (``Records[].s3.object.key``)."""
+        from urllib.parse import unquote_plus
+
+        results = []
+        for record in records:
+            if not str(record.get('eventName', '')).startswith(('s3:ObjectCreated', 'ObjectCreated')):
+                continue
+            key = unquote_plus(record.get('s3', {}).get('object', {}).get('key', ''))
+            if not key.startswith(f"{settings.s3_upload_prefix}/"):
+                continue
+
+            upload_id = Path(key).stem
+            try:
+                results.append(self.complete(upload_id))
+            except (NotFoundError, ConflictError, ValidationError) as e:
+                logger.warning(f"Ignoring storage event for {key}: {e.message}")
+                results.append({'upload_id': upload_id, 'status': 'ignored', 'error': e.message})
+        return results
+
+    # =====================================
+    # 3. PROCESAMIENTO (worker de Celery)
+    # =====================================
+
+    def process(self, db: Session, upload_id: str) -> Dict[str, Any]:
+        """Descargar el objeto al spool del worker y procesarlo como una subida normal."""
+        from app.services.media_service import MediaService
+        from app.services.video_upload_service import video_upload_service
+        from app.tasks.media_tasks import transcode_video_task
+
+        pending = self.cache_service.get_pending_upload(upload_id)
+        if not pending:
+            raise NotFoundError("Subida no encontrada o expirada")
+
+        listing = db.query(Listing).filter(Listing.id == pending['listing_id']).first()
+        if not listing:
+            raise NotFoundError("Listing no encontrado")
+
+        extension = Path(pending['key']).suffix
+        local_path = get_spool_directory() / f"direct_{upload_id}{extension}"
+        try:
+            self.client().download_file(settings.s3_bucket_name, pending['key'], str(local_path))
+
+            result = self._state(pending, 'processed')
+            if pending['media_type'] == 'image':
+                image = MediaService(db).create_image(
+                    listing_id=str(listing.id),
+                    listing_created_at=listing.created_at,
+                    file_data=None,
+                    filename=pending['filename'],
+                    source_path=str(local_path),
+                )
+                result['image_id'] = str(image.id)
+            else:
+                videos_dir = MEDIA_ROOT / "listings" / str(listing.id) / "videos"
+                video_path = move_spool_file(local_path, videos_dir / f"video_{upload_id}{extension}")
+                video = video_upload_service.register_video(db, listing, video_path)
+                transcode_video_task.delay(str(video.id))
+                result['video_id'] = str(video.id)
+        finally:
+            discard_spool_file(local_path)
+
+        # El objeto de entrada ya no hace falta (el procesado vive en media/)
+        try:
+            self.client().delete_object(Bucket=settings.s3_bucket_name, Key=pending['key'])
+        except ClientError as e:
+            logger.warning(f"Could not delete processed upload object {pending['key']}: {e}")
+
+        self.cache_service.mark_upload_processed(upload_id, result, ttl=PROCESSED_TTL)
+        self.cache_service.delete_pending_upload(upload_id)
+        return result
+
+    def mark_failed(self, upload_id: str, error: str) -> None:
+        """Estado ``failed``: el cliente puede volver a llamar a complete para reintentar."""
+        pending = self.cache_service.get_pending_upload(upload_id)
+        if pending:
+            self.cache_service.mark_upload_processed(
+                upload_id, self._state(pending, 'failed', error=error), ttl=PROCESSED_TTL
+            )
+
+
+direct_upload_service = DirectUploadService()
@@ -4,6 +4,7 @@ Soporta múltiples proveedores: SMTP, SendGrid, AWS SES
 """
 import smtplib
 import os
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, List
@@ -32,6 +33,42 @@ class EmailService:
         # URL base del frontend y logo
         self.frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3000')
         self.logo_url = f"{self.frontend_url}/images/logo_sin_fondo.png"
+        
+        # Conexión SMTP compartida durante un envío masivo (ver smtp_session)
+        self._smtp_server: Optional[smtplib.SMTP] = None
+    
+    def _open_smtp(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        server.starttls()
+        if self.smtp_user and self.smtp_password:
+            server.login(self.smtp_user, self.smtp_password)
+        return server
+    
+    @contextmanager
+    def smtp_session(self):
+        """
+        Reutilizar una única conexión SMTP para todos los send_email()
+        ejecutados dentro del bloque (envíos masivos desde workers).
+        """
+        if not self.enabled or self._smtp_server is not None:
+            yield self
+            return
+        
+        try:
+            self._smtp_server = self._open_smtp()
+        except Exception as e:
+            logger.error(f"❌ Error opening SMTP session: {str(e)}")
+            self._smtp_server = None
+        
+        try:
+            yield self
+        finally:
+            server, self._smtp_server = self._smtp_server, None
+            if server is not None:
+                try:
+                    server.quit()
+                except Exception:
+                    server.close()
     
     def render_template(self, template_name: str, **context) -> str:
         """
@@ -105,19 +142,23 @@ class EmailService:
             html_part = MIMEText(html_content, 'html', 'utf-8')
             msg.attach(html_part)
             
+            recipients = [to_email]
+            if cc:
+                recipients.extend(cc)
+            if bcc:
+                recipients.extend(bcc)
+            
             # Enviar email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
-                server.starttls()
-                if self.smtp_user and self.smtp_password:
-                    server.login(self.smtp_user, self.smtp_password)
-                
-                recipients = [to_email]
-                if cc:
-                    recipients.extend(cc)
-                if bcc:
-                    recipients.extend(bcc)
-                
-                server.sendmail(self.from_email, recipients, msg.as_string())
+            if self._smtp_server is not None:
+                try:
+                    self._smtp_server.sendmail(self.from_email, recipients, msg.as_string())
+                except smtplib.SMTPServerDisconnected:
+                    # El servidor cerró la sesión a mitad del lote: reconectar una vez
+                    self._smtp_server = self._open_smtp()
+                    self._smtp_server.sendmail(self.from_email, recipients, msg.as_string())
+            else:
+                with self._open_smtp() as server:
+                    server.sendmail(self.from_email, recipients, msg.as_string())
             
             logger.info(f"✅ Email sent to {to_email}: {subject}")
             return True
@@ -0,0 +1,112 @@
+"""
+Deduplicación de imágenes por contenido y conteo de referencias.
+
+Cada imagen subida guarda el SHA-256 del archivo (``core.images.content_hash``)
+y se almacena en una ruta derivada del hash. Varias filas de core.images
+pueden apuntar a los mismos archivos (resubidas, listings duplicados): el
+número de referencias es el número de filas con el mismo ``original_url`` y
+los archivos solo se borran al eliminar la última.
+
+Alta y baja de referencias de un mismo contenido se serializan con un
+advisory lock de transacción, así una subida nunca reutiliza archivos que
+otra petición está borrando.
+"""
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.media import Image
+
+logger = logging.getLogger(__name__)
+
+
+def _advisory_lock_key(value: str) -> int:
+    digest = hashlib.sha256(f"image:{value}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], byteorder="big", signed=False) % 9223372036854775807
+
+
+def content_path(content_hash: str, extension: str = ".jpg") -> str:
+    """Ruta relativa por contenido: ``images/{hash[:2]}/{hash}{ext}``."""
+    return f"images/{content_hash[:2]}/{content_hash}{extension}"
+
+
+class ImageDedupService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lock(self, content_hash: str) -> None:
+        """Advisory lock de transacción sobre un contenido (se libera en commit/rollback)."""
+        self.db.execute(
+            text("SELECT pg_advisory_xact_lock(:lock_key)"),
+            {"lock_key": _advisory_lock_key(content_hash)}
+        )
+
+    def lock_many(self, resources: Iterable[str]) -> None:
+        # Orden fijo para no crear deadlocks entre transacciones
+        for resource in sorted(set(resources)):
+            self.lock(resource)
+
+    def find_by_hash(self, content_hash: str, listing_id: str) -> Optional[Image]:
+        """Imagen existente con ese contenido, priorizando la del mismo listing."""
+        return (self.db.query(Image)
+                .filter(Image.content_hash == content_hash)
+                .order_by((Image.listing_id == listing_id).desc(), Image.created_at)
+                .first())
+
+    def find_by_hashes(self, content_hashes: Iterable[str], listing_id: str) -> Dict[str, Image]:
+        """``find_by_hash`` para varios contenidos en una sola consulta."""
+        content_hashes = set(content_hashes)
+        if not content_hashes:
+            return {}
+        images = (self.db.query(Image)
+                  .filter(Image.content_hash.in_(content_hashes))
+                  .order_by((Image.listing_id == listing_id).desc(), Image.created_at)
+                  .all())
+        found: Dict[str, Image] = {}
+        for image in images:
+            found.setdefault(image.content_hash, image)
+        return found
+
+    def count_references(self, original_url: str) -> int:
+        return self.db.query(Image).filter(Image.original_url == original_url).count()
+
+    def delete_reference(self, image: Image, delete_files: Callable[[], Any]) -> bool:
+        """
+        Eliminar la fila y, si era la última referencia a sus archivos,
+        borrarlos del disco (antes del commit, con el lock tomado).
+
+        Returns:
+            bool: True si se borraron los archivos
+        """
+        original_url = image.original_url
+        self.lock(image.content_hash or original_url)
+
+        self.db.delete(image)
+        self.db.flush()
+
+        remaining = self.count_references(original_url)
+        if remaining == 0:
+            delete_files()
+        else:
+            logger.info(f"Image files kept, still referenced by {remaining} images: {original_url}")
+
+        self.db.commit()
+        return remaining == 0
+
+    @staticmethod
+    def processed_data(image: Image) -> Dict[str, Any]:
+        """Datos en el formato de ``LocalMediaService.save_image`` para reutilizar una imagen."""
+        return {
+            'original_url': image.original_url,
+            'thumbnail_url': image.thumbnail_url,
+            'medium_url': image.medium_url,
+            'metadata': {
+                'width': image.width,
+                'height': image.height,
+                'file_size': image.file_size,
+                'phash': image.phash,
+            }
+        }
@@ -0,0 +1,116 @@
+"""
+Pool de procesos para el pipeline de imágenes (decodificar, orientar,
+redimensionar, recodificar y generar thumbnails).
+El trabajo de Pillow es CPU-bound y retiene el GIL: se ejecuta en procesos
+aparte y los endpoints async lo esperan sin bloquear el event loop.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ImageResult = Tuple[str, Dict[str, Any]]
+
+# LocalMediaService propio de cada proceso del pool (se crea una sola vez)
+_worker_media_service = None
+
+
+def _init_worker() -> None:
+    global _worker_media_service
+    from app.services.local_media_service import LocalMediaService
+
+    _worker_media_service = LocalMediaService()
+
+
+def _save_image_job(listing_id: str, source_path: str, filename: str,
+                    alt_text: Optional[str], content_hash: Optional[str] = None) -> ImageResult:
+    if _worker_media_service is None:
+        _init_worker()
+    return _worker_media_service.save_image_file(
+        listing_id, Path(source_path), filename, alt_text, content_hash
+    )
+
+
+class ImagePipeline:
+    """
+    ProcessPoolExecutor acotado para ``LocalMediaService.save_image_file``.
+
+    - ``max_workers`` procesos (por defecto uno por core)
+    - como mucho ``max_pending`` imágenes en vuelo; el resto espera en
+      ``submit`` sin acumular trabajos (ni archivos abiertos) en el pool
+    - en procesos daemon (workers prefork de Celery, que no pueden tener
+      hijos) se procesa en línea
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or settings.image_pipeline_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or settings.image_pipeline_max_pending or self.max_workers * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def inline(self) -> bool:
+        return multiprocessing.current_process().daemon
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: los hijos no heredan hilos ni el event loop del proceso web
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_worker,
+                    )
+                    logger.info(f"Image pipeline started with {self.max_workers} worker processes")
+        return self._executor
+
+    async def submit(self, listing_id: str, source_path: Path, filename: str,
+                     alt_text: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> ImageResult:
+        """Procesar una imagen en el pool y esperar el resultado sin bloquear el loop."""
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_pending)
+
+        async with self._async_slots:
+            if self.inline:
+                return await asyncio.to_thread(
+                    _save_image_job, listing_id, str(source_path), filename, alt_text, content_hash
+                )
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(),
+                _save_image_job, listing_id, str(source_path), filename, alt_text, content_hash
+            )
+
+    def run(self, listing_id: str, source_path: Path, filename: str,
+            alt_text: Optional[str] = None,
+            content_hash: Optional[str] = None) -> ImageResult:
+        """Variante síncrona (hilos del threadpool, scripts)."""
+        if self.inline:
+            return _save_image_job(listing_id, str(source_path), filename, alt_text, content_hash)
+
+        with self._slots:
+            future = self._get_executor().submit(
+                _save_image_job, listing_id, str(source_path), filename, alt_text, content_hash
+            )
+            return future.result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,92 @@
+"""
+Renditions WebP/AVIF de las imágenes de listings.
+
+Cada JPEG (o PNG) publicado tiene hermanos con el mismo nombre base y otra
+extensión (``abc_medium.jpg`` → ``abc_medium.webp`` / ``abc_medium.avif``).
+Las URLs que devuelve la API siguen apuntando al archivo original y Nginx
+elige la rendition según el header ``Accept`` (ver ``nginx/nginx.conf``),
+cayendo al original si la rendition no existe.
+"""
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Plugin opcional para versiones de Pillow sin AVIF nativo
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Parámetros de codificación por formato (calidad visual similar a JPEG q85)
+FORMAT_OPTIONS: Dict[str, Dict] = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60, "speed": 6},
+}
+
+
+def enabled_formats() -> List[str]:
+    """Formatos configurados en ``image_modern_formats`` que Pillow puede escribir."""
+    Image.init()
+    formats = []
+    for name in settings.image_modern_formats.split(","):
+        name = name.strip().lower()
+        options = FORMAT_OPTIONS.get(name)
+        if not options:
+            continue
+        if options["format"] not in Image.SAVE:
+            logger.debug(f"Image format {name} not supported by this Pillow build")
+            continue
+        formats.append(name)
+    return formats
+
+
+def rendition_path(path: Path, format_name: str) -> Path:
+    return Path(path).with_suffix(f".{format_name}")
+
+
+def save_renditions(img: Image.Image, path: Path) -> List[str]:
+    """
+    Guardar las renditions modernas de ``img`` junto a ``path``.
+    Escritura atómica (temporal + rename) para que Nginx nunca sirva un
+    archivo a medio escribir.
+
+    Returns:
+        Formatos escritos
+    """
+    written = []
+    for format_name in enabled_formats():
+        target = rendition_path(path, format_name)
+        if target == Path(path):
+            continue
+        temp = target.with_name(f".{target.name}.tmp")
+        try:
+            img.save(temp, **FORMAT_OPTIONS[format_name])
+            temp.replace(target)
+            written.append(format_name)
+        except Exception as e:
+            logger.warning(f"Could not write {format_name} rendition for {path}: {e}")
+            temp.unlink(missing_ok=True)
+    return written
+
+
+def generate_renditions_for_file(path: Path) -> List[str]:
+    """Generar las renditions de una imagen ya guardada en disco."""
+    path = Path(path)
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+        return save_renditions(img, path)
+
+
+def delete_renditions(path: Path) -> None:
+    for format_name in FORMAT_OPTIONS:
+        target = rendition_path(path, format_name)
+        if target != Path(path):
+            target.unlink(missing_ok=True)
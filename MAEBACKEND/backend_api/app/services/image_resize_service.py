@@ -0,0 +1,202 @@
+"""
+Redimensionado on-demand de imágenes de /media para el fallback
+``@image_resize`` de Nginx.
+
+Esquema de URLs (el tamaño va en el nombre, así Nginx sirve el archivo
+generado directamente en las siguientes peticiones):
+
+- ``/media/.../{nombre}__{preset}.{ext}``: rendition ``preset`` de
+  ``/media/.../{nombre}.*``
+- ``/media/.../thumbs/{id}_{small|medium|large}.jpg``: thumbnail de
+  LocalMediaService regenerado desde ``/media/.../{id}.*``
+"""
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+
+from app.services.image_renditions import save_renditions
+
+logger = logging.getLogger(__name__)
+
+MEDIA_ROOT = Path(__file__).resolve().parents[2] / "media"
+
+RENDITION_SEPARATOR = "__"
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+OUTPUT_FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP", ".png": "PNG"}
+
+
+class ResizePreset(NamedTuple):
+    width: int
+    height: int
+    quality: int
+    pad: bool = False  # centrar en un canvas blanco de width x height
+
+
+# Únicos tamaños aceptados (evita que cualquier combinación de w/h/q llene el disco)
+RESIZE_PRESETS: Dict[str, ResizePreset] = {
+    "small": ResizePreset(150, 150, 80, pad=True),
+    "medium": ResizePreset(400, 300, 80, pad=True),
+    "large": ResizePreset(800, 600, 85, pad=True),
+    "w320": ResizePreset(320, 320 * 4, 80),
+    "w640": ResizePreset(640, 640 * 4, 80),
+    "w1024": ResizePreset(1024, 1024 * 4, 85),
+    "w1600": ResizePreset(1600, 1600 * 4, 85),
+}
+
+
+class ResizeRequestError(ValueError):
+    """Ruta o preset no válido."""
+
+
+class ResizeSourceNotFound(FileNotFoundError):
+    """No existe la imagen original de la rendition pedida."""
+
+
+def delete_resized_renditions(original: Path) -> None:
+    """
+    Borrar las renditions on-demand de una imagen (``{stem}__{preset}.*`` y
+    ``thumbs/{stem}_{preset}.*``, con sus copias WebP/AVIF). Nginx las sirve
+    desde disco: sin esto seguirían accesibles tras borrar la imagen.
+    """
+    original = Path(original)
+    prefix = f"{original.stem}{RENDITION_SEPARATOR}"
+    thumb_prefixes = tuple(f"{original.stem}_{name}." for name in RESIZE_PRESETS)
+
+    candidates = []
+    if original.parent.is_dir():
+        candidates.extend(path for path in original.parent.iterdir() if path.name.startswith(prefix))
+    thumbs_dir = original.parent / "thumbs"
+    if thumbs_dir.is_dir():
+        candidates.extend(path for path in thumbs_dir.iterdir() if path.name.startswith(thumb_prefixes))
+
+    for path in candidates:
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not delete resized rendition {path}: {e}")
+
+
+class ImageResizeService:
+    """Genera y persiste renditions de tamaño fijo junto a la imagen original."""
+
+    def __init__(self, media_root: Path = MEDIA_ROOT):
+        self.media_root = media_root.resolve()
+        self._locks: Dict[Path, asyncio.Lock] = {}
+
+    def resolve(self, file_path: str, preset_name: Optional[str] = None) -> Tuple[Path, Path, ResizePreset]:
+        """
+        Traducir la ruta pedida a (original, destino, preset).
+
+        ``preset_name`` permite pedir un preset sobre la ruta del original
+        (``/v1/media/resize/media/x.jpg?preset=w640``).
+        """
+        relative = file_path.split("?", 1)[0].lstrip("/")
+        for prefix in ("resize/", "media/"):
+            if relative.startswith(prefix):
+                relative = relative[len(prefix):]
+
+        requested = (self.media_root / relative).resolve()
+        if self.media_root not in requested.parents:
+            raise ResizeRequestError("Ruta fuera del directorio de media")
+
+        extension = requested.suffix.lower()
+        if extension not in OUTPUT_FORMATS:
+            raise ResizeRequestError(f"Formato no soportado: {extension}")
+
+        if preset_name:
+            preset = self._preset(preset_name)
+            source = requested
+            target = requested.with_name(f"{requested.stem}{RENDITION_SEPARATOR}{preset_name}{extension}")
+        elif RENDITION_SEPARATOR in requested.stem:
+            base, preset_name = requested.stem.rsplit(RENDITION_SEPARATOR, 1)
+            preset = self._preset(preset_name)
+            source = self._find_source(requested.parent, base)
+            target = requested
+        elif requested.parent.name == "thumbs" and "_" in requested.stem:
+            base, preset_name = requested.stem.rsplit("_", 1)
+            preset = self._preset(preset_name)
+            source = self._find_source(requested.parent.parent, base)
+            target = requested
+        else:
+            raise ResizeRequestError("La ruta no indica un tamaño de imagen")
+
+        if not source.is_file():
+            raise ResizeSourceNotFound(str(source))
+        return source, target, preset
+
+    async def get_or_create(self, file_path: str, preset_name: Optional[str] = None) -> Path:
+        """Devolver la rendition, generándola una sola vez si no existe."""
+        source, target, preset = self.resolve(file_path, preset_name)
+        if target.is_file():
+            return target
+
+        lock = self._locks.setdefault(target, asyncio.Lock())
+        try:
+            async with lock:
+                # Otra petición pudo generarla mientras se esperaba el lock
+                if not target.is_file():
+                    await run_in_threadpool(self._render, source, target, preset)
+        finally:
+            if not lock.locked() and self._locks.get(target) is lock:
+                self._locks.pop(target, None)
+
+        return target
+
+    def _preset(self, name: str) -> ResizePreset:
+        preset = RESIZE_PRESETS.get(name)
+        if not preset:
+            raise ResizeRequestError(f"Preset no permitido: {name}")
+        return preset
+
+    def _find_source(self, directory: Path, base: str) -> Path:
+        for extension in SOURCE_EXTENSIONS:
+            candidate = directory / f"{base}{extension}"
+            if candidate.is_file():
+                return candidate
+        raise ResizeSourceNotFound(str(directory / base))
+
+    def _render(self, source: Path, target: Path, preset: ResizePreset) -> None:
+        output_format = OUTPUT_FORMATS[target.suffix.lower()]
+
+        with Image.open(source) as img:
+            # JPEG: decodificar ya reducido (escala DCT) cerca del tamaño final
+            if img.format == "JPEG":
+                img.draft("RGB", (preset.width, preset.height))
+            img = ImageOps.exif_transpose(img)
+
+            if output_format == "JPEG" and img.mode != "RGB":
+                img = img.convert("RGBA") if img.mode in ("P", "LA") else img
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
+                img = background
+
+            img.thumbnail((preset.width, preset.height), Image.LANCZOS)
+
+            if preset.pad and img.size != (preset.width, preset.height):
+                canvas = Image.new("RGB", (preset.width, preset.height), (255, 255, 255))
+                canvas.paste(img, ((preset.width - img.width) // 2, (preset.height - img.height) // 2))
+                img = canvas
+
+            # Escritura atómica: Nginx nunca ve un archivo a medio escribir
+            temp = target.with_name(f".{target.name}.tmp")
+            try:
+                save_kwargs = {"quality": preset.quality}
+                if output_format == "JPEG":
+                    save_kwargs.update(optimize=True, progressive=True)
+                img.save(temp, output_format, **save_kwargs)
+                temp.replace(target)
+            except Exception:
+                temp.unlink(missing_ok=True)
+                raise
+
+            if output_format == "JPEG":
+                save_renditions(img, target)
+
+        logger.info(f"Generated image rendition {target} from {source}")
+
+
+image_resize_service = ImageResizeService()
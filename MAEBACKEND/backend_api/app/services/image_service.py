@@ -2,6 +2,8 @@ from sqlalchemy.orm import Session
 from app.models.media import Image
 from app.models.listing import Listing
 from app.schemas.images import ImageCreate, ImageUpdate
+from app.services.image_dedup_service import ImageDedupService
+from app.services.image_resize_service import delete_resized_renditions
 from typing import List, Optional
 import uuid
 from datetime import datetime
@@ -147,15 +149,16 @@ class ImageService:
         image = self._require_owned_image(image_id, owner_user_id)
         
         listing_id = str(image.listing_id)
-        
-        # Eliminar archivo físico
         file_path = Path(image.original_url.lstrip('/'))
-        if file_path.exists():
-            file_path.unlink()
         
-        # Eliminar registro
-        self.db.delete(image)
-        self.db.commit()
+        def delete_image_file():
+            if file_path.exists():
+                file_path.unlink()
+            delete_resized_renditions(file_path)
+        
+        # Eliminar registro; el archivo físico solo si no lo referencia otra
+        # imagen (mismo contenido en otro listing, listings duplicados)
+        ImageDedupService(self.db).delete_reference(image, delete_image_file)
         
         # Actualizar has_media en listing
         self._update_listing_has_media(listing_id)
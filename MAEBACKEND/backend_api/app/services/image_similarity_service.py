@@ -0,0 +1,201 @@
+"""
+Búsqueda de imágenes casi iguales entre publicaciones (moderación).
+
+Cada imagen guarda su pHash de 64 bits en ``core.images.phash``. La búsqueda
+a distancia de Hamming <= k usa multi-index hashing sobre 4 bandas de 16 bits
+con un índice de expresión por banda (ver ``31_image_phash_index.sql``): si
+dos hashes están a distancia <= k, alguna banda está a distancia <= k // 4.
+Se consultan solo las imágenes que comparten una banda cercana y la
+distancia exacta se filtra en Postgres.
+"""
+import logging
+import os
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from PIL import Image as PILImage
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.media import Image
+from app.services.image_resize_service import MEDIA_ROOT
+from app.utils.media_utils import compute_upright_phash
+
+logger = logging.getLogger(__name__)
+
+PHASH_BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+# Radio de banda 2 => 137 valores por banda; más allá la búsqueda deja de ser selectiva
+MAX_SEARCH_DISTANCE = PHASH_BANDS * 3 - 1
+
+_SIMILAR_IMAGES_SQL = text("""
+    SELECT
+        i.id,
+        i.listing_id,
+        i.original_url,
+        i.thumbnail_url,
+        i.phash,
+        l.title AS listing_title,
+        l.owner_user_id,
+        l.status AS listing_status,
+        bit_count(CAST(i.phash # :phash AS bit(64))) AS distance
+    FROM core.images i
+    JOIN core.listings l ON l.id = i.listing_id AND l.created_at = i.listing_created_at
+    WHERE i.phash IS NOT NULL
+      AND (
+            ((i.phash >> 48) & 65535) = ANY(:band0)
+         OR ((i.phash >> 32) & 65535) = ANY(:band1)
+         OR ((i.phash >> 16) & 65535) = ANY(:band2)
+         OR (i.phash & 65535) = ANY(:band3)
+      )
+      AND bit_count(CAST(i.phash # :phash AS bit(64))) <= :max_distance
+      AND (CAST(:exclude_image_id AS uuid) IS NULL OR i.id <> CAST(:exclude_image_id AS uuid))
+      AND (CAST(:exclude_listing_id AS uuid) IS NULL OR i.listing_id <> CAST(:exclude_listing_id AS uuid))
+    ORDER BY distance, i.created_at
+    LIMIT :limit
+""")
+
+
+def _band(phash: int, index: int) -> int:
+    # Banda 0 = bits altos, igual que las expresiones indexadas
+    return (phash >> (BAND_BITS * (PHASH_BANDS - 1 - index))) & BAND_MASK
+
+
+def _band_neighbours(value: int, radius: int) -> List[int]:
+    """Valores de banda a distancia de Hamming <= radius."""
+    values = [value]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flips):
+            variant = value
+            for bit in bits:
+                variant ^= 1 << bit
+            values.append(variant)
+    return values
+
+
+def resolve_media_file(media_url: str) -> Optional[Path]:
+    """Ruta local de una URL de imagen (``/media/...`` o ``MEDIA_BASE_URL/...``)."""
+    if not media_url:
+        return None
+    url = media_url.split("?", 1)[0]
+    media_base_url = os.getenv("MEDIA_BASE_URL", "http://localhost/media")
+    if url.startswith(media_base_url):
+        return Path(settings.upload_path) / url[len(media_base_url):].lstrip("/")
+    if url.startswith("/media/"):
+        return MEDIA_ROOT / url[len("/media/"):]
+    return None
+
+
+def compute_file_phash(path: Path) -> Optional[int]:
+    with PILImage.open(path) as img:
+        return compute_upright_phash(img)
+
+
+class ImageSimilarityService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def find_similar(self, phash: int, max_distance: Optional[int] = None,
+                     exclude_image_id: Optional[str] = None,
+                     exclude_listing_id: Optional[str] = None,
+                     limit: int = 50) -> List[Dict[str, Any]]:
+        """Imágenes con pHash a distancia <= max_distance, las más parecidas primero."""
+        if max_distance is None:
+            max_distance = settings.image_phash_max_distance
+        max_distance = max(0, min(max_distance, MAX_SEARCH_DISTANCE))
+        radius = max_distance // PHASH_BANDS
+
+        params: Dict[str, Any] = {
+            f"band{index}": _band_neighbours(_band(phash, index), radius)
+            for index in range(PHASH_BANDS)
+        }
+        params.update({
+            "phash": phash,
+            "max_distance": max_distance,
+            "exclude_image_id": str(exclude_image_id) if exclude_image_id else None,
+            "exclude_listing_id": str(exclude_listing_id) if exclude_listing_id else None,
+            "limit": limit,
+        })
+
+        rows = self.db.execute(_SIMILAR_IMAGES_SQL, params).mappings().all()
+        return [dict(row) for row in rows]
+
+    def similar_to_image(self, image_id: str, max_distance: Optional[int] = None,
+                         include_same_listing: bool = False,
+                         limit: int = 50) -> Optional[List[Dict[str, Any]]]:
+        """
+        Imágenes parecidas a una imagen existente.
+        None si la imagen no existe o aún no tiene pHash.
+        """
+        image = self.db.query(Image).filter(Image.id == image_id).first()
+        if not image or image.phash is None:
+            return None
+        return self.find_similar(
+            image.phash,
+            max_distance=max_distance,
+            exclude_image_id=str(image.id),
+            exclude_listing_id=None if include_same_listing else str(image.listing_id),
+            limit=limit,
+        )
+
+    def similar_for_listing(self, listing_id: str, max_distance: Optional[int] = None,
+                            limit_per_image: int = 20) -> List[Dict[str, Any]]:
+        """Por cada imagen del listing, las imágenes parecidas de otros listings."""
+        images = (self.db.query(Image)
+                  .filter(Image.listing_id == listing_id, Image.phash.isnot(None))
+                  .order_by(Image.display_order, Image.created_at)
+                  .all())
+        results = []
+        for image in images:
+            matches = self.find_similar(
+                image.phash,
+                max_distance=max_distance,
+                exclude_listing_id=listing_id,
+                limit=limit_per_image,
+            )
+            if matches:
+                results.append({"image_id": image.id, "original_url": image.original_url, "matches": matches})
+        return results
+
+    def backfill(self, after_id: Optional[str] = None,
+                 batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Calcular el pHash de un lote de imágenes que no lo tienen, en orden
+        de id a partir de ``after_id`` (las que fallan no se reintentan en
+        la misma pasada).
+        """
+        batch_size = batch_size or settings.image_phash_backfill_batch_size
+        query = self.db.query(Image.id, Image.original_url).filter(Image.phash.is_(None))
+        if after_id:
+            query = query.filter(Image.id > after_id)
+        rows = query.order_by(Image.id).limit(batch_size).all()
+
+        hashed, failed = 0, 0
+        for image_id, original_url in rows:
+            path = resolve_media_file(original_url)
+            try:
+                phash = compute_file_phash(path) if path else None
+            except Exception as e:
+                logger.warning(f"Could not compute pHash for image {image_id}: {e}")
+                phash = None
+
+            if phash is None:
+                failed += 1
+                continue
+
+            # Los archivos compartidos (mismo contenido) se hashean una vez
+            hashed += self.db.query(Image).filter(
+                Image.original_url == original_url, Image.phash.is_(None)
+            ).update({Image.phash: phash}, synchronize_session=False)
+        self.db.commit()
+
+        return {
+            "processed": len(rows),
+            "hashed": hashed,
+            "failed": failed,
+            "last_id": str(rows[-1][0]) if rows else None,
+            "done": len(rows) < batch_size,
+        }
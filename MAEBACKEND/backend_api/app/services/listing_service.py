@@ -3,6 +3,7 @@ from sqlalchemy import func, text
 from app.models.listing import Listing
 from app.schemas.listings import CreateListingRequest, UpdateListingRequest
 from app.services.api_cache_service import api_cache_service
+from app.services.image_dedup_service import ImageDedupService
 from app.services.search_cache_service import search_cache_service
 from app.utils.slug_generator import generate_listing_slug, ensure_unique_slug
 from typing import List, Optional, Dict, Any
@@ -423,6 +424,43 @@ class ListingService:
         )
         
         self.db.add(duplicate)
+        self.db.flush()
+        
+        # Las imágenes se copian como referencias a los mismos archivos (sin
+        # copiar bytes); el lock evita que se borren mientras se copian
+        image_dedup = ImageDedupService(self.db)
+        image_dedup.lock_many(
+            row[0] for row in self.db.execute(
+                text("""
+                    SELECT COALESCE(content_hash, original_url)
+                    FROM core.images
+                    WHERE listing_id = CAST(:listing_id AS uuid)
+                """),
+                {"listing_id": str(original.id)}
+            )
+        )
+        copied = self.db.execute(
+            text("""
+                INSERT INTO core.images (
+                    listing_id, listing_created_at, filename, original_url, thumbnail_url,
+                    medium_url, display_order, alt_text, width, height, file_size,
+                    is_main, content_hash
+                )
+                SELECT CAST(:new_listing_id AS uuid), :new_created_at, filename, original_url,
+                       thumbnail_url, medium_url, display_order, alt_text, width, height,
+                       file_size, is_main, content_hash
+                FROM core.images
+                WHERE listing_id = CAST(:listing_id AS uuid)
+            """),
+            {
+                "new_listing_id": str(duplicate.id),
+                "new_created_at": duplicate.created_at,
+                "listing_id": str(original.id),
+            }
+        ).rowcount
+        if copied:
+            duplicate.has_media = True
+        
         self.db.commit()
         self.db.refresh(duplicate)
         return duplicate
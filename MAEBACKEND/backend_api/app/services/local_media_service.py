@@ -3,11 +3,15 @@ import uuid
 import json
 import logging
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional, Any
+from typing import BinaryIO, List, Tuple, Dict, Optional, Any
 from datetime import datetime
 from PIL import Image, ImageOps
 from PIL.ExifTags import TAGS
-import hashlib
+
+from app.services.image_renditions import delete_renditions, save_renditions
+from app.services.image_resize_service import delete_resized_renditions
+from app.utils.media_utils import compute_upright_phash
+from app.utils.upload_spool import hash_file
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +69,8 @@ class LocalMediaService:
             directory.mkdir(parents=True, exist_ok=True)
     
     def save_image(self, listing_id: str, file_data: bytes, 
-                   filename: str, alt_text: str = None) -> Tuple[str, Dict[str, Any]]:
+                   filename: str, alt_text: str = None,
+                   content_hash: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
         """
         Guarda imagen, genera thumbnails y extrae metadatos
         
@@ -74,36 +79,72 @@ class LocalMediaService:
             file_data: Datos binarios del archivo
             filename: Nombre original del archivo
             alt_text: Texto alternativo
+            content_hash: SHA-256 del archivo; si se indica, se guarda por
+                contenido en ``images/{hash[:2]}/{hash}.jpg`` (compartible
+                entre listings) en vez de ``images/{listing_id}/{uuid}.jpg``
             
         Returns:
             Tuple[str, Dict]: (URL del archivo, metadatos completos)
         """
+        return self._save_image_source(
+            listing_id, io.BytesIO(file_data), file_data[:16], len(file_data), filename, alt_text,
+            content_hash
+        )
+    
+    def save_image_file(self, listing_id: str, source_path: Path,
+                        filename: str, alt_text: str = None,
+                        content_hash: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Igual que save_image pero leyendo desde un archivo en disco (spool),
+        sin cargar el original completo en memoria.
+        """
+        source_path = Path(source_path)
+        with open(source_path, 'rb') as source:
+            header = source.read(16)
+            source.seek(0)
+            return self._save_image_source(
+                listing_id, source, header, source_path.stat().st_size, filename, alt_text,
+                content_hash
+            )
+    
+    def _save_image_source(self, listing_id: str, source: BinaryIO, header: bytes,
+                           file_size: int, filename: str, alt_text: str = None,
+                           content_hash: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
         try:
             # Validar tamaño
-            if len(file_data) > self.max_image_size:
+            if file_size > self.max_image_size:
                 raise ValueError(f"File too large. Max size: {self.max_image_size / (1024*1024):.1f}MB")
             
-            # Crear directorio del listing
-            listing_dir = self.base_path / "images" / listing_id
+            # Crear directorio destino: por contenido (el mismo archivo siempre
+            # en la misma ruta) o por listing con nombre único
+            if content_hash:
+                relative_dir = f"images/{content_hash[:2]}"
+                file_id = content_hash
+            else:
+                relative_dir = f"images/{listing_id}"
+                file_id = str(uuid.uuid4())
+            listing_dir = self.base_path / relative_dir
             listing_dir.mkdir(parents=True, exist_ok=True)
             
-            # Generar nombre único
-            file_id = str(uuid.uuid4())
             original_ext = Path(filename).suffix.lower()
             if not original_ext:
                 original_ext = '.jpg'  # Default para imágenes sin extensión
             
             # Validar formato por extensión y contenido
-            self._validate_image_format(file_data, original_ext)
+            self._validate_image_format(header, original_ext)
             
             # Nombres de archivos
             optimized_filename = f"{file_id}.jpg"  # Siempre convertir a JPEG optimizado
             original_path = listing_dir / optimized_filename
             
             # Procesar imagen
-            with Image.open(io.BytesIO(file_data)) as img:
+            with Image.open(source) as img:
                 # Extraer metadatos EXIF antes de procesamiento
-                metadata = self._extract_image_metadata(img, filename, len(file_data))
+                metadata = self._extract_image_metadata(img, filename, file_size)
+                
+                # JPEG: decodificar a escala DCT (1/2, 1/4, 1/8) cercana al
+                # tamaño final en vez de la foto completa
+                self._draft_jpeg(img)
                 
                 # Orientación automática (EXIF)
                 img = ImageOps.exif_transpose(img)
@@ -122,13 +163,16 @@ class LocalMediaService:
                 
                 # Guardar imagen optimizada
                 img_optimized.save(original_path, 'JPEG', quality=85, optimize=True, progressive=True)
+                renditions = save_renditions(img_optimized, original_path)
                 
                 # Actualizar metadatos con imagen procesada
                 metadata.update({
                     'width': img_optimized.width,
                     'height': img_optimized.height,
                     'file_size': original_path.stat().st_size,
-                    'alt_text': alt_text
+                    'alt_text': alt_text,
+                    'renditions': ['jpg'] + renditions,
+                    'phash': compute_upright_phash(img_optimized)
                 })
                 
                 # Generar thumbnails
@@ -136,7 +180,7 @@ class LocalMediaService:
                 metadata['thumbnails'] = thumbnails
             
             # URLs finales
-            original_url = f"{self.media_base_url}/images/{listing_id}/{optimized_filename}"
+            original_url = f"{self.media_base_url}/{relative_dir}/{optimized_filename}"
             thumbnail_url = thumbnails.get('medium', original_url)
             
             logger.info(f"Image saved successfully: {original_url}")
@@ -232,9 +276,11 @@ class LocalMediaService:
                     if file_path.exists():
                         file_path.unlink()
                         logger.info(f"Deleted file: {file_path}")
+                    delete_renditions(file_path)
                     
                     # Eliminar thumbnails asociados si es imagen
                     if "/images/" in url:
+                        delete_resized_renditions(file_path)
                         thumb_dir = file_path.parent / "thumbs"
                         file_id = file_path.stem
                         
@@ -243,6 +289,7 @@ class LocalMediaService:
                             if thumb_path.exists():
                                 thumb_path.unlink()
                                 logger.info(f"Deleted thumbnail: {thumb_path}")
+                            delete_renditions(thumb_path)
                                 
             except Exception as e:
                 logger.error(f"Error deleting file {url}: {e}")
@@ -292,6 +339,26 @@ class LocalMediaService:
             
             raise ValueError("Invalid video format or corrupted file")
     
+    def _draft_jpeg(self, img: Image.Image, max_dimension: int = 1920) -> None:
+        """
+        Configura el decoder JPEG para que entregue directamente una versión
+        reducida (nunca menor que ``max_dimension`` en su lado mayor).
+        Debe llamarse antes de cargar los píxeles; en otros formatos no hace nada.
+        """
+        if img.format != 'JPEG':
+            return
+        
+        width, height = img.size
+        if max(width, height) <= max_dimension * 2:
+            return
+        
+        scale = max_dimension / max(width, height)
+        target = (max(1, int(width * scale + 0.5)), max(1, int(height * scale + 0.5)))
+        try:
+            img.draft('RGB', target)
+        except Exception as e:
+            logger.debug(f"JPEG draft mode not applied: {e}")
+    
     def _optimize_image(self, img: Image.Image, max_dimension: int = 1920) -> Image.Image:
         """Optimiza imagen reduciendo tamaño si es muy grande"""
         width, height = img.size
@@ -305,42 +372,57 @@ class LocalMediaService:
                 new_height = max_dimension  
                 new_width = int((width * max_dimension) / height)
             
-            img = img.resize((new_width, new_height), Image.LANCZOS)
+            # reducing_gap: reduce() entero (box) hasta ~3x el destino y
+            # LANCZOS solo para el último tramo
+            img = img.resize((new_width, new_height), Image.LANCZOS, reducing_gap=3.0)
         
         return img
     
     def _generate_thumbnails(self, img: Image.Image, output_dir: Path, 
                            file_id: str) -> Dict[str, str]:
-        """Genera thumbnails en diferentes tamaños"""
+        """
+        Genera thumbnails en diferentes tamaños.
+        
+        Los tamaños se derivan en cadena de mayor a menor (1920 → large →
+        medium → small): cada nivel se reduce desde el anterior y no desde la
+        imagen completa, así cada LANCZOS trabaja sobre pocos píxeles.
+        """
         thumbnails = {}
         thumb_dir = output_dir / "thumbs"
         thumb_dir.mkdir(exist_ok=True)
         
+        listing_id = output_dir.name
+        media_type = output_dir.parent.name  # 'images' o 'videos'
+        
+        ordered_sizes = sorted(
+            self.thumbnail_sizes.items(),
+            key=lambda item: item[1][0] * item[1][1],
+            reverse=True
+        )
+        
         try:
-            for size_name, (width, height) in self.thumbnail_sizes.items():
-                # Crear copia de la imagen
-                img_copy = img.copy()
-                
-                # Redimensionar manteniendo proporción (thumbnail)
-                img_copy.thumbnail((width, height), Image.LANCZOS)
+            current = img
+            for size_name, (width, height) in ordered_sizes:
+                # Reducir desde el nivel anterior (sin el relleno del canvas)
+                current = current.copy()
+                current.thumbnail((width, height), Image.LANCZOS)
                 
                 # Crear imagen final con fondo blanco si es necesario
-                if img_copy.size != (width, height):
+                final_img = current
+                if current.size != (width, height):
                     # Centrar imagen en canvas del tamaño deseado
                     final_img = Image.new('RGB', (width, height), (255, 255, 255))
-                    paste_x = (width - img_copy.width) // 2
-                    paste_y = (height - img_copy.height) // 2
-                    final_img.paste(img_copy, (paste_x, paste_y))
-                    img_copy = final_img
+                    paste_x = (width - current.width) // 2
+                    paste_y = (height - current.height) // 2
+                    final_img.paste(current, (paste_x, paste_y))
                 
                 # Guardar thumbnail
                 thumb_filename = f"{file_id}_{size_name}.jpg"
                 thumb_path = thumb_dir / thumb_filename
-                img_copy.save(thumb_path, 'JPEG', quality=80, optimize=True)
+                final_img.save(thumb_path, 'JPEG', quality=80, optimize=True)
+                save_renditions(final_img, thumb_path)
                 
                 # URL del thumbnail
-                listing_id = output_dir.name
-                media_type = output_dir.parent.name  # 'images' o 'videos'
                 thumbnails[size_name] = f"{self.media_base_url}/{media_type}/{listing_id}/thumbs/{thumb_filename}"
                 
         except Exception as e:
@@ -463,13 +545,7 @@ class LocalMediaService:
     
     def get_file_hash(self, file_path: Path) -> str:
         """Genera hash SHA-256 del archivo para detección de duplicados"""
-        hash_sha256 = hashlib.sha256()
-        
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        
-        return hash_sha256.hexdigest()
+        return hash_file(file_path)
 
 
 # Agregar import necesario que faltaba
@@ -1,13 +1,15 @@
 import redis
 import json
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 import pickle
 import os
 
 logger = logging.getLogger(__name__)
 
+THUMBNAIL_SIZES = ('small', 'medium', 'large')
+
 class MediaCacheService:
     """
     Servicio de cache con Redis para metadatos de media y thumbnails.
@@ -35,7 +37,8 @@ class MediaCacheService:
             'listing_images': 'listing_imgs:',
             'listing_videos': 'listing_vids:',
             'media_stats': 'stats:',
-            'processed_uploads': 'processed:'
+            'processed_uploads': 'processed:',
+            'pending_uploads': 'pending_upload:'
         }
         
         # Inicializar conexión Redis
@@ -159,6 +162,113 @@ class MediaCacheService:
             logger.error(f"Error getting video metadata {video_id}: {e}")
             return None
     
+    # =====================================
+    # CACHE DE METADATOS EN LOTE
+    # =====================================
+    
+    def _get_json_batch(self, prefix: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """MGET de varias keys JSON en un solo round-trip (solo devuelve los aciertos)"""
+        if not ids:
+            return {}
+        
+        values = self.redis.mget([f"{prefix}{item_id}" for item_id in ids])
+        return {
+            item_id: json.loads(value.decode('utf-8'))
+            for item_id, value in zip(ids, values)
+            if value
+        }
+    
+    def _set_json_batch(self, pipeline, prefix: str, items: Dict[str, Dict[str, Any]], ttl: int) -> None:
+        for item_id, data in items.items():
+            serialized_data = json.dumps(data, default=str, ensure_ascii=False)
+            pipeline.setex(f"{prefix}{item_id}", ttl, serialized_data)
+    
+    def get_image_metadata_batch(self, image_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtiene metadatos de varias imágenes con un solo MGET
+        
+        Args:
+            image_ids: IDs de las imágenes
+            
+        Returns:
+            Dict image_id -> metadatos (las que no están en cache se omiten)
+        """
+        if not self.is_available():
+            return {}
+        
+        try:
+            return self._get_json_batch(self.prefixes['image_meta'], image_ids)
+            
+        except Exception as e:
+            logger.error(f"Error getting image metadata batch ({len(image_ids)} ids): {e}")
+            return {}
+    
+    def cache_image_metadata_batch(self, metadata_by_id: Dict[str, Dict[str, Any]],
+                                   listing_id: Optional[str] = None) -> bool:
+        """
+        Cachea metadatos de varias imágenes en un solo pipeline
+        
+        Args:
+            metadata_by_id: Dict image_id -> metadatos (en orden de visualización)
+            listing_id: Si se indica, cachea también la lista de IDs del listing
+            
+        Returns:
+            bool: True si se cacheó correctamente
+        """
+        if not self.is_available() or not metadata_by_id:
+            return False
+        
+        try:
+            # Sin MULTI: son SETEX independientes, solo interesa ahorrar round-trips
+            pipeline = self.redis.pipeline(transaction=False)
+            self._set_json_batch(pipeline, self.prefixes['image_meta'], metadata_by_id, self.metadata_ttl)
+            if listing_id:
+                pipeline.setex(
+                    f"{self.prefixes['listing_images']}{listing_id}",
+                    self.listing_media_ttl,
+                    json.dumps(list(metadata_by_id))
+                )
+            
+            return all(pipeline.execute())
+            
+        except Exception as e:
+            logger.error(f"Error batch caching image metadata ({len(metadata_by_id)} ids): {e}")
+            return False
+    
+    def get_video_metadata_batch(self, video_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene metadatos de varios videos con un solo MGET"""
+        if not self.is_available():
+            return {}
+        
+        try:
+            return self._get_json_batch(self.prefixes['video_meta'], video_ids)
+            
+        except Exception as e:
+            logger.error(f"Error getting video metadata batch ({len(video_ids)} ids): {e}")
+            return {}
+    
+    def cache_video_metadata_batch(self, metadata_by_id: Dict[str, Dict[str, Any]],
+                                   listing_id: Optional[str] = None) -> bool:
+        """Cachea metadatos de varios videos (y opcionalmente la lista del listing) en un pipeline"""
+        if not self.is_available() or not metadata_by_id:
+            return False
+        
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            self._set_json_batch(pipeline, self.prefixes['video_meta'], metadata_by_id, self.metadata_ttl)
+            if listing_id:
+                pipeline.setex(
+                    f"{self.prefixes['listing_videos']}{listing_id}",
+                    self.listing_media_ttl,
+                    json.dumps(list(metadata_by_id))
+                )
+            
+            return all(pipeline.execute())
+            
+        except Exception as e:
+            logger.error(f"Error batch caching video metadata ({len(metadata_by_id)} ids): {e}")
+            return False
+    
     # =====================================
     # CACHE DE THUMBNAILS
     # =====================================
@@ -232,6 +342,52 @@ class MediaCacheService:
             logger.error(f"Error batch caching thumbnails {media_id}: {e}")
             return False
     
+    def get_thumbnail_paths_batch(self, media_ids: List[str],
+                                  sizes: Tuple[str, ...] = THUMBNAIL_SIZES) -> Dict[str, Dict[str, str]]:
+        """
+        Obtiene las rutas de thumbnails de varios media con un solo MGET
+        
+        Args:
+            media_ids: IDs de los media
+            sizes: Tamaños a consultar
+            
+        Returns:
+            Dict media_id -> {size: ruta} (solo los tamaños cacheados)
+        """
+        if not self.is_available() or not media_ids:
+            return {}
+        
+        try:
+            pairs = [(media_id, size) for media_id in media_ids for size in sizes]
+            values = self.redis.mget([f"{self.prefixes['thumbnail']}{media_id}:{size}" for media_id, size in pairs])
+            
+            paths: Dict[str, Dict[str, str]] = {}
+            for (media_id, size), value in zip(pairs, values):
+                if value:
+                    paths.setdefault(media_id, {})[size] = value.decode('utf-8')
+            return paths
+            
+        except Exception as e:
+            logger.error(f"Error getting thumbnail paths batch ({len(media_ids)} ids): {e}")
+            return {}
+    
+    def cache_thumbnail_paths_batch(self, thumbnails_by_media: Dict[str, Dict[str, str]]) -> bool:
+        """Cachea los thumbnails de varios media ({media_id: {size: ruta}}) en un solo pipeline"""
+        if not self.is_available() or not thumbnails_by_media:
+            return False
+        
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            for media_id, thumbnails in thumbnails_by_media.items():
+                for size, path in thumbnails.items():
+                    pipeline.setex(f"{self.prefixes['thumbnail']}{media_id}:{size}", self.thumbnail_ttl, path)
+            
+            return all(pipeline.execute())
+            
+        except Exception as e:
+            logger.error(f"Error batch caching thumbnail paths ({len(thumbnails_by_media)} ids): {e}")
+            return False
+    
     # =====================================
     # CACHE DE LISTADOS DE MEDIA
     # =====================================
@@ -366,16 +522,20 @@ class MediaCacheService:
     # CACHE DE UPLOADS PROCESADOS
     # =====================================
     
-    def mark_upload_processed(self, upload_id: str, result_data: Dict[str, Any]) -> bool:
+    def mark_upload_processed(self, upload_id: str, result_data: Dict[str, Any],
+                              ttl: int = 3600, only_if_new: bool = False) -> bool:
         """
         Marca un upload como procesado para evitar duplicados
         
         Args:
             upload_id: ID único del upload
             result_data: Datos del resultado del procesamiento
+            ttl: Segundos que se recuerda el resultado
+            only_if_new: Solo marcar si no estaba marcado (SET NX); así
+                dos peticiones concurrentes no procesan el mismo upload
             
         Returns:
-            bool: True si se marcó correctamente
+            bool: True si se marcó correctamente (con only_if_new, False si ya estaba marcado)
         """
         if not self.is_available():
             return False
@@ -384,13 +544,54 @@ class MediaCacheService:
             key = f"{self.prefixes['processed_uploads']}{upload_id}"
             serialized_data = json.dumps(result_data, default=str)
             
-            # Mantener por 1 hora para evitar resubidas inmediatas
-            return self.redis.setex(key, 3600, serialized_data)
+            if only_if_new:
+                return bool(self.redis.set(key, serialized_data, ex=ttl, nx=True))
+            return self.redis.setex(key, ttl, serialized_data)
             
         except Exception as e:
             logger.error(f"Error marking upload processed {upload_id}: {e}")
             return False
     
+    def clear_upload_processed(self, upload_id: str) -> bool:
+        """Olvida el resultado de un upload (p. ej. para reintentar uno fallido)"""
+        if not self.is_available():
+            return False
+        
+        try:
+            return bool(self.redis.delete(f"{self.prefixes['processed_uploads']}{upload_id}"))
+            
+        except Exception as e:
+            logger.error(f"Error clearing processed upload {upload_id}: {e}")
+            return False
+    
+    def replace_upload_processed(self, upload_id: str, expected: Dict[str, Any],
+                                 result_data: Dict[str, Any], ttl: int = 3600) -> bool:
+        """
+        Reemplaza el resultado de un upload solo si sigue siendo ``expected``
+        (WATCH/MULTI); False si otro proceso lo cambió mientras tanto
+        """
+        if not self.is_available():
+            return False
+        
+        key = f"{self.prefixes['processed_uploads']}{upload_id}"
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.watch(key)
+                cached_data = pipe.get(key)
+                if not cached_data or json.loads(cached_data.decode('utf-8')) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.setex(key, ttl, json.dumps(result_data, default=str))
+                pipe.execute()
+                return True
+            
+        except redis.WatchError:
+            return False
+        except Exception as e:
+            logger.error(f"Error replacing processed upload {upload_id}: {e}")
+            return False
+    
     def is_upload_processed(self, upload_id: str) -> Optional[Dict[str, Any]]:
         """Verifica si un upload ya fue procesado"""
         if not self.is_available():
@@ -409,6 +610,47 @@ class MediaCacheService:
             logger.error(f"Error checking processed upload {upload_id}: {e}")
             return None
     
+    def register_pending_upload(self, upload_id: str, upload_data: Dict[str, Any], ttl: int) -> bool:
+        """Guarda los datos de una subida directa a storage pendiente de completar"""
+        if not self.is_available():
+            return False
+        
+        try:
+            key = f"{self.prefixes['pending_uploads']}{upload_id}"
+            return self.redis.setex(key, ttl, json.dumps(upload_data, default=str))
+            
+        except Exception as e:
+            logger.error(f"Error registering pending upload {upload_id}: {e}")
+            return False
+    
+    def get_pending_upload(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene los datos de una subida directa pendiente"""
+        if not self.is_available():
+            return None
+        
+        try:
+            cached_data = self.redis.get(f"{self.prefixes['pending_uploads']}{upload_id}")
+            
+            if cached_data:
+                return json.loads(cached_data.decode('utf-8'))
+            
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error getting pending upload {upload_id}: {e}")
+            return None
+    
+    def delete_pending_upload(self, upload_id: str) -> bool:
+        if not self.is_available():
+            return False
+        
+        try:
+            return bool(self.redis.delete(f"{self.prefixes['pending_uploads']}{upload_id}"))
+            
+        except Exception as e:
+            logger.error(f"Error deleting pending upload {upload_id}: {e}")
+            return False
+    
     # =====================================
     # INVALIDACIÓN DE CACHE
     # =====================================
@@ -471,7 +713,7 @@ class MediaCacheService:
                 pipeline.delete(f"{self.prefixes['video_meta']}{media_id}")
             
             # Invalidar thumbnails
-            for size in ['small', 'medium', 'large']:
+            for size in THUMBNAIL_SIZES:
                 pipeline.delete(f"{self.prefixes['thumbnail']}{media_id}:{size}")
             
             pipeline.execute()
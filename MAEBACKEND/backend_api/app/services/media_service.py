@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, insert
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta, timezone
 from app.models.media import Image, Video
@@ -8,8 +8,14 @@ from app.schemas.images import ImageCreate, ImageUpdate
 from app.schemas.videos import VideoCreate, VideoUpdate
 from app.schemas.media import UploadUrlRequest, UploadUrlResponse
 from app.core.exceptions import BusinessLogicError
+from app.services.image_dedup_service import ImageDedupService
+from app.services.direct_upload_service import direct_upload_service
+from app.services.image_pipeline import image_pipeline
 from app.services.local_media_service import LocalMediaService
 from app.services.media_cache_service import MediaCacheService
+from app.utils.upload_spool import hash_file
+import asyncio
+import hashlib
 import uuid
 import os
 import logging
@@ -33,6 +39,7 @@ class MediaService:
         # Inicializar servicios de media
         self.local_media_service = LocalMediaService()
         self.cache_service = MediaCacheService()
+        self.dedup_service = ImageDedupService(db)
         
         # Configuración de S3/storage
         self.use_s3 = os.getenv("USE_S3", "false").lower() == "true"
@@ -43,7 +50,8 @@ class MediaService:
         
         # Solo inicializar S3 client si boto3 está disponible y S3 está habilitado
         if self.use_s3 and HAS_BOTO3:
-            self.s3_client = boto3.client('s3', region_name=self.s3_region)
+            # Mismo cliente que las subidas directas (endpoint de MinIO en desarrollo)
+            self.s3_client = direct_upload_service.client()
         elif self.use_s3 and not HAS_BOTO3:
             logger.warning("S3 is enabled but boto3 is not installed. Falling back to local storage.")
             self.use_s3 = False
@@ -60,19 +68,21 @@ class MediaService:
         cached_image_ids = self.cache_service.get_listing_images(listing_id)
         
         if cached_image_ids:
-            # Obtener imágenes usando IDs cacheados
-            images = []
-            for image_id in cached_image_ids:
-                cached_metadata = self.cache_service.get_image_metadata(image_id)
-                if cached_metadata:
+            # Metadatos de todas las imágenes en un solo MGET
+            cached_metadata = self.cache_service.get_image_metadata_batch(cached_image_ids)
+            
+            # Si falta alguna (expiró o se invalidó) se recarga todo desde BD
+            if len(cached_metadata) == len(cached_image_ids):
+                images = []
+                for image_id in cached_image_ids:
                     # Reconstruir objeto Image desde metadata cacheada
-                    image = self._build_image_from_cache(image_id, cached_metadata)
+                    image = self._build_image_from_cache(image_id, cached_metadata[image_id])
                     if image:
                         images.append(image)
-            
-            if images:
-                logger.debug(f"Retrieved {len(images)} images from cache for listing {listing_id}")
-                return images
+                
+                if len(images) == len(cached_image_ids):
+                    logger.debug(f"Retrieved {len(images)} images from cache for listing {listing_id}")
+                    return images
         
         # Si no hay cache, obtener desde BD
         images = (self.db.query(Image)
@@ -80,15 +90,12 @@ class MediaService:
                 .order_by(Image.display_order, Image.created_at)
                 .all())
         
-        # Cachear resultado
+        # Cachear lista de IDs y metadatos individuales en un solo pipeline
         if images:
-            image_ids = [str(img.id) for img in images]
-            self.cache_service.cache_listing_images(listing_id, image_ids)
-            
-            # Cachear metadatos individuales
-            for image in images:
-                metadata = self._extract_image_metadata_from_model(image)
-                self.cache_service.cache_image_metadata(str(image.id), metadata)
+            self.cache_service.cache_image_metadata_batch(
+                {str(image.id): self._extract_image_metadata_from_model(image) for image in images},
+                listing_id=listing_id,
+            )
         
         return images
     
@@ -99,79 +106,293 @@ class MediaService:
                 .first())
     
     def create_image(self, listing_id: str, listing_created_at: datetime, 
-                    file_data: bytes, filename: str, alt_text: str = None) -> Image:
-        """Crear una nueva imagen usando LocalMediaService"""
-        # Verificar que el listing existe
-        listing = self.db.query(Listing).filter(Listing.id == listing_id).first()
-        if not listing:
-            raise BusinessLogicError("Listing not found")
+                    file_data: Optional[bytes], filename: str, alt_text: str = None,
+                    source_path: Optional[str] = None) -> Image:
+        """
+        Crear una nueva imagen usando LocalMediaService.
         
-        # Verificar límites del plan del usuario
-        self._check_image_limits(listing_id)
+        Si se pasa ``source_path`` (archivo de spool) se procesa desde disco
+        y ``file_data`` se ignora. Si el mismo archivo ya se subió antes no
+        se procesa: se reutilizan sus archivos (ver ImageDedupService).
+        """
+        self._check_image_preconditions(listing_id)
         
         try:
+            if source_path:
+                content_hash = hash_file(source_path)
+            else:
+                content_hash = hashlib.sha256(file_data).hexdigest()
+            
+            duplicate = self._reuse_duplicate_image(
+                listing_id, listing_created_at, filename, alt_text, content_hash
+            )
+            if duplicate:
+                return duplicate
+            
             # Procesar imagen con LocalMediaService
-            if self.use_s3:
-                # TODO: Implementar subida a S3 más adelante
-                original_url, processed_data = self.local_media_service.save_image(
-                    listing_id, file_data, filename, alt_text
+            if source_path:
+                original_url, processed_data = self.local_media_service.save_image_file(
+                    listing_id, source_path, filename, alt_text, content_hash
                 )
             else:
                 original_url, processed_data = self.local_media_service.save_image(
-                    listing_id, file_data, filename, alt_text
+                    listing_id, file_data, filename, alt_text, content_hash
                 )
             
-            # Determinar si será la imagen principal
-            current_images_count = self.db.query(Image).filter(Image.listing_id == listing_id).count()
-            is_main = current_images_count == 0  # Primera imagen como principal
-            
-            if is_main:
-                self._unset_main_image(listing_id)
-            
-            # Crear registro en base de datos
-            image = Image(
-                listing_id=listing_id,
-                listing_created_at=listing_created_at,
-                filename=filename,
-                original_url=original_url,
-                thumbnail_url=processed_data.get('thumbnail_url'),
-                medium_url=processed_data.get('medium_url'),
-                alt_text=alt_text,
-                display_order=current_images_count,
-                is_main=is_main,
-                width=processed_data['metadata'].get('width'),
-                height=processed_data['metadata'].get('height'),
-                file_size=processed_data['metadata'].get('file_size')
+            return self._persist_processed_image(
+                listing_id, listing_created_at, filename, alt_text, original_url, processed_data,
+                content_hash
             )
             
-            self.db.add(image)
-            self.db.commit()
-            self.db.refresh(image)
-            
-            # Actualizar el flag has_media del listing
-            self._update_listing_has_media(listing_id)
-            
-            # Cachear metadatos de la nueva imagen
-            metadata = self._extract_image_metadata_from_model(image)
-            self.cache_service.cache_image_metadata(str(image.id), metadata)
-            
-            # Invalidar cache del listing para refrescar la lista
-            self.cache_service.invalidate_listing_cache(listing_id)
-            
-            # Incrementar estadísticas
-            self.cache_service.increment_media_stat('uploads_today')
-            self.cache_service.increment_media_stat('total_images')
-            
-            logger.info(f"Image created successfully: {image.id} for listing {listing_id}")
-            
-            return image
-            
         except Exception as e:
             logger.error(f"Error creating image for listing {listing_id}: {e}")
             # Rollback de la transacción
             self.db.rollback()
             raise BusinessLogicError(f"Failed to create image: {str(e)}")
     
+    async def create_images_bulk_async(self, listing: Listing,
+                                       uploads: List[Tuple[str, str, Optional[str]]]
+                                       ) -> Tuple[List[Image], List[Dict[str, Any]]]:
+        """
+        Crear varias imágenes de un listing en una sola operación.
+        
+        ``uploads`` son tuplas (archivo de spool, filename, alt_text). El límite
+        del plan se valida al inicio y de nuevo bajo el lock del listing, el
+        hash y el procesamiento de las imágenes corren en paralelo
+        (image_pipeline) y todas las filas se insertan con un solo INSERT, un
+        solo commit y una sola invalidación de cache.
+        
+        Returns:
+            (imágenes en el orden recibido, [{"filename", "error"}] de las que fallaron)
+        """
+        listing_id = str(listing.id)
+        failed: List[Dict[str, Any]] = []
+        
+        # Límite del plan (primera pasada; se revalida bajo el lock al insertar)
+        max_images = self._max_images_per_listing()
+        available = max_images - self.db.query(Image).filter(Image.listing_id == listing_id).count()
+        if available <= 0:
+            raise BusinessLogicError(f"Maximum image limit ({max_images}) reached for this listing")
+        for _, filename, _ in uploads[available:]:
+            failed.append({"filename": filename, "error": f"Maximum image limit ({max_images}) reached for this listing"})
+        uploads = uploads[:available]
+        
+        # 1. Hash de contenido en paralelo
+        hashes = await asyncio.gather(
+            *(asyncio.to_thread(hash_file, source_path) for source_path, _, _ in uploads),
+            return_exceptions=True
+        )
+        entries = []
+        for (source_path, filename, alt_text), content_hash in zip(uploads, hashes):
+            if isinstance(content_hash, Exception):
+                failed.append({"filename": filename, "error": f"Could not read file: {content_hash}"})
+            else:
+                entries.append((source_path, filename, alt_text, content_hash))
+        
+        # 2. Procesar en el pool solo el contenido nuevo (una vez por hash)
+        known = self.dedup_service.find_by_hashes([entry[3] for entry in entries], listing_id)
+        # No mantener la transacción abierta mientras se procesan las imágenes
+        self.db.rollback()
+        to_process: Dict[str, Tuple[str, str, Optional[str]]] = {}
+        for source_path, filename, alt_text, content_hash in entries:
+            if content_hash not in known:
+                to_process.setdefault(content_hash, (source_path, filename, alt_text))
+        
+        results = await asyncio.gather(
+            *(image_pipeline.submit(listing_id, source_path, filename, alt_text, content_hash)
+              for content_hash, (source_path, filename, alt_text) in to_process.items()),
+            return_exceptions=True
+        )
+        processed: Dict[str, Any] = dict(zip(to_process, results))
+        
+        # 3. Un INSERT para todas las filas, con los contenidos y el listing
+        #    bloqueados (el lock del listing serializa los lotes concurrentes)
+        try:
+            self.dedup_service.lock_many([f"listing:{listing_id}"] + [entry[3] for entry in entries])
+            # Releer bajo el lock: otra petición pudo crear o borrar referencias
+            # o llenar el cupo del plan mientras se procesaba
+            known = self.dedup_service.find_by_hashes([entry[3] for entry in entries], listing_id)
+            current_images_count = self.db.query(Image).filter(Image.listing_id == listing_id).count()
+            available = max_images - current_images_count
+            
+            rows: List[Dict[str, Any]] = []
+            queued_hashes = set()
+            existing_by_hash: Dict[str, Image] = {}
+            for source_path, filename, alt_text, content_hash in entries:
+                duplicate = known.get(content_hash)
+                if duplicate is not None and str(duplicate.listing_id) == listing_id:
+                    # Ya estaba en el listing (o se repite dentro del lote)
+                    existing_by_hash[content_hash] = duplicate
+                    continue
+                if content_hash in queued_hashes:
+                    continue
+                
+                if len(rows) >= available:
+                    failed.append({"filename": filename, "error": f"Maximum image limit ({max_images}) reached for this listing"})
+                    continue
+                
+                if duplicate is not None:
+                    original_url = duplicate.original_url
+                    processed_data = self.dedup_service.processed_data(duplicate)
+                elif isinstance(processed.get(content_hash), tuple):
+                    original_url, processed_data = processed[content_hash]
+                else:
+                    error = processed.get(content_hash) or "Duplicate source was deleted, retry the upload"
+                    logger.error(f"Error processing bulk image {filename} for listing {listing_id}: {error}")
+                    failed.append({"filename": filename, "error": f"Failed to create image: {error}"})
+                    continue
+                
+                display_order = current_images_count + len(rows)
+                rows.append({
+                    'id': uuid.uuid4(),
+                    'listing_id': listing.id,
+                    'listing_created_at': listing.created_at,
+                    'filename': filename,
+                    'original_url': original_url,
+                    'thumbnail_url': processed_data.get('thumbnail_url'),
+                    'medium_url': processed_data.get('medium_url'),
+                    'alt_text': alt_text,
+                    'display_order': display_order,
+                    'is_main': display_order == 0,  # Primera imagen del listing como principal
+                    'width': processed_data['metadata'].get('width'),
+                    'height': processed_data['metadata'].get('height'),
+                    'file_size': processed_data['metadata'].get('file_size'),
+                    'content_hash': content_hash,
+                    'phash': processed_data['metadata'].get('phash'),
+                })
+                queued_hashes.add(content_hash)
+            
+            if rows:
+                self.db.execute(insert(Image), rows)
+                self.db.query(Listing).filter(Listing.id == listing_id).update({Listing.has_media: True})
+            self.db.commit()
+            
+        except Exception as e:
+            logger.error(f"Error creating bulk images for listing {listing_id}: {e}")
+            self.db.rollback()
+            raise BusinessLogicError(f"Failed to create images: {str(e)}")
+        
+        # Recargar todas las filas con una consulta (el commit las expira)
+        image_ids = [row['id'] for row in rows] + [image.id for image in existing_by_hash.values()]
+        images_by_hash = {
+            image.content_hash: image
+            for image in self.db.query(Image).filter(Image.id.in_(image_ids)).all()
+        } if image_ids else {}
+        
+        images: List[Image] = []
+        for entry in entries:
+            image = images_by_hash.pop(entry[3], None)
+            if image is not None:
+                images.append(image)
+        
+        if rows:
+            created_ids = {row['id'] for row in rows}
+            created = [image for image in images if image.id in created_ids]
+            self.cache_service.cache_image_metadata_batch(
+                {str(image.id): self._extract_image_metadata_from_model(image) for image in created}
+            )
+            self.cache_service.invalidate_listing_cache(listing_id)
+            self.cache_service.increment_media_stat('uploads_today', len(rows))
+            self.cache_service.increment_media_stat('total_images', len(rows))
+        
+        logger.info(f"Bulk upload for listing {listing_id}: {len(rows)} created, "
+                    f"{len(images) - len(rows)} already present, {len(failed)} failed")
+        return images, failed
+    
+    def _check_image_preconditions(self, listing_id: str):
+        # Verificar que el listing existe
+        listing = self.db.query(Listing).filter(Listing.id == listing_id).first()
+        if not listing:
+            raise BusinessLogicError("Listing not found")
+        
+        # Verificar límites del plan del usuario
+        self._check_image_limits(listing_id)
+    
+    def _reuse_duplicate_image(self, listing_id: str, listing_created_at: datetime,
+                               filename: str, alt_text: Optional[str],
+                               content_hash: str) -> Optional[Image]:
+        """
+        Si ya existe una imagen con el mismo contenido, crear la nueva como
+        referencia a sus archivos (sin procesar ni escribir nada en disco).
+        El lock se mantiene hasta el commit para que no se borren en medio.
+        """
+        self.dedup_service.lock(content_hash)
+        duplicate = self.dedup_service.find_by_hash(content_hash, listing_id)
+        if not duplicate:
+            # Liberar el lock: el procesamiento puede tardar
+            self.db.rollback()
+            return None
+        
+        logger.info(f"Duplicate image upload for listing {listing_id} ({content_hash}), skipping processing")
+        return self._persist_processed_image(
+            listing_id, listing_created_at, filename, alt_text,
+            duplicate.original_url, self.dedup_service.processed_data(duplicate), content_hash
+        )
+    
+    def _persist_processed_image(self, listing_id: str, listing_created_at: datetime,
+                                 filename: str, alt_text: Optional[str],
+                                 original_url: str, processed_data: Dict[str, Any],
+                                 content_hash: Optional[str] = None) -> Image:
+        """Crear el registro Image de una imagen ya procesada y refrescar caches."""
+        if content_hash:
+            self.dedup_service.lock(content_hash)
+            # Resubida del mismo archivo al mismo listing: devolver la existente
+            existing = (self.db.query(Image)
+                        .filter(and_(Image.listing_id == listing_id,
+                                     Image.content_hash == content_hash))
+                        .first())
+            if existing:
+                self.db.rollback()
+                logger.info(f"Image {existing.id} already uploaded to listing {listing_id}")
+                return existing
+        
+        # Determinar si será la imagen principal
+        current_images_count = self.db.query(Image).filter(Image.listing_id == listing_id).count()
+        is_main = current_images_count == 0  # Primera imagen como principal
+        
+        if is_main:
+            self._unset_main_image(listing_id)
+        
+        # Crear registro en base de datos
+        image = Image(
+            listing_id=listing_id,
+            listing_created_at=listing_created_at,
+            filename=filename,
+            original_url=original_url,
+            thumbnail_url=processed_data.get('thumbnail_url'),
+            medium_url=processed_data.get('medium_url'),
+            alt_text=alt_text,
+            display_order=current_images_count,
+            is_main=is_main,
+            width=processed_data['metadata'].get('width'),
+            height=processed_data['metadata'].get('height'),
+            file_size=processed_data['metadata'].get('file_size'),
+            content_hash=content_hash,
+            phash=processed_data['metadata'].get('phash')
+        )
+        
+        self.db.add(image)
+        self.db.commit()
+        self.db.refresh(image)
+        
+        # Actualizar el flag has_media del listing
+        self._update_listing_has_media(listing_id)
+        
+        # Cachear metadatos de la nueva imagen
+        metadata = self._extract_image_metadata_from_model(image)
+        self.cache_service.cache_image_metadata(str(image.id), metadata)
+        
+        # Invalidar cache del listing para refrescar la lista
+        self.cache_service.invalidate_listing_cache(listing_id)
+        
+        # Incrementar estadísticas
+        self.cache_service.increment_media_stat('uploads_today')
+        self.cache_service.increment_media_stat('total_images')
+        
+        logger.info(f"Image created successfully: {image.id} for listing {listing_id}")
+        
+        return image
+    
     def create_image_from_upload(self, listing_id: str, listing_created_at: datetime, 
                                image_data: dict) -> Image:
         """Crear imagen desde datos de upload (método legacy para compatibilidad)"""
@@ -239,12 +460,11 @@ class MediaService:
             if image.medium_url:
                 urls_to_delete.append(image.medium_url)
             
-            # Eliminar archivos físicos
-            self.local_media_service.delete_media_files(urls_to_delete)
-            
-            # Eliminar registro de base de datos
-            self.db.delete(image)
-            self.db.commit()
+            # Eliminar registro; los archivos físicos solo si no los
+            # referencia otra imagen (resubidas, listings duplicados)
+            self.dedup_service.delete_reference(
+                image, lambda: self.local_media_service.delete_media_files(urls_to_delete)
+            )
             
             # Si era la imagen principal, asignar nueva imagen principal
             if image.is_main:
@@ -353,52 +573,19 @@ class MediaService:
     # UPLOAD URL GENERATION
     # =====================================
     
-    def generate_upload_url(self, request: UploadUrlRequest) -> UploadUrlResponse:
+    def generate_upload_url(self, request: UploadUrlRequest, user_id: Optional[str] = None) -> UploadUrlResponse:
         """Generar URL de subida presignada"""
+        if self.use_s3:
+            # Subida directa al bucket; se completa con /media/uploads/{upload_id}/complete
+            return direct_upload_service.create_upload(request, user_id)
+        
         upload_id = str(uuid.uuid4())
         
         # Generar nombre de archivo único
         file_extension = self._get_file_extension(request.filename)
         unique_filename = f"{upload_id}{file_extension}"
         
-        if self.use_s3:
-            return self._generate_s3_upload_url(unique_filename, request, upload_id)
-        else:
-            return self._generate_local_upload_url(unique_filename, request, upload_id)
-    
-    def _generate_s3_upload_url(self, filename: str, request: UploadUrlRequest, upload_id: str) -> UploadUrlResponse:
-        """Generar URL de subida para S3"""
-        if not HAS_BOTO3:
-            raise BusinessLogicError("S3 upload requested but boto3 is not available")
-        
-        key = f"media/{filename}"
-        expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
-        
-        try:
-            upload_url = self.s3_client.generate_presigned_url(
-                'put_object',
-                Params={
-                    'Bucket': self.s3_bucket,
-                    'Key': key,
-                    'ContentType': request.content_type
-                },
-                ExpiresIn=900  # 15 minutos
-            )
-            
-            file_url = f"https://{self.s3_bucket}.s3.{self.s3_region}.amazonaws.com/{key}"
-            if self.cdn_base_url:
-                file_url = f"{self.cdn_base_url}/{key}"
-            
-            return UploadUrlResponse(
-                upload_url=upload_url,
-                file_url=file_url,
-                expires_at=expires_at,
-                upload_id=upload_id
-            )
-            
-        except ClientError as e:
-            logger.error(f"Error generating S3 upload URL: {e}")
-            raise BusinessLogicError("Could not generate upload URL")
+        return self._generate_local_upload_url(unique_filename, request, upload_id)
     
     def _generate_local_upload_url(self, filename: str, request: UploadUrlRequest, upload_id: str) -> UploadUrlResponse:
         """Generar URL de subida para almacenamiento local"""
@@ -422,14 +609,16 @@ class MediaService:
     def _check_image_limits(self, listing_id: str):
         """Verificar límites de imágenes según el plan"""
         current_count = self.db.query(Image).filter(Image.listing_id == listing_id).count()
+        max_images = self._max_images_per_listing()
         
+        if current_count >= max_images:
+            raise BusinessLogicError(f"Maximum image limit ({max_images}) reached for this listing")
+    
+    def _max_images_per_listing(self) -> int:
         # TODO: Implementar verificación de límites según el plan del usuario
         # Por ahora, límite básico de 25 imágenes desde configuración
         from app.core.config import settings
-        max_images = getattr(settings, 'default_max_images_per_listing', 25)
-        
-        if current_count >= max_images:
-            raise BusinessLogicError(f"Maximum image limit ({max_images}) reached for this listing")
+        return getattr(settings, 'default_max_images_per_listing', 25)
     
     def _check_video_limits(self, listing_id: str):
         """Verificar límites de videos según el plan"""
@@ -0,0 +1,219 @@
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+from uuid import UUID
+
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Serializar fechas como MessageResponse.model_dump(mode="json")
+_DATETIME_ADAPTER = TypeAdapter(datetime)
+
+
+# Cada escritura (append, lectura, invalidación) incrementa la generación
+# ``{key}:gen``. ``seed`` recibe la generación leída antes de consultar
+# Postgres y solo escribe si no cambió: una siembra con datos viejos nunca
+# pisa un append o un cambio de estado posterior.
+_GENERATION_BUMP = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+"""
+
+# Añade el mensaje solo si la lista ya está sembrada: una lista existente
+# contiene siempre los N mensajes más recientes de la conversación, por lo
+# que empujar sobre una lista vacía dejaría una cola incompleta.
+_APPEND_SCRIPT = """
+if redis.call('LPUSHX', KEYS[1], ARGV[2]) > 0 then
+    redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[3]) - 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+""" + _GENERATION_BUMP + """
+return 1
+"""
+
+_SEED_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# Marca como leídos, dentro de la lista cacheada, los mensajes recibidos por
+# el lector (todos, o solo los ids indicados) sin descartar la cola.
+_MARK_READ_SCRIPT = """
+local reader, read_at = ARGV[2], ARGV[3]
+local ids = {}
+for i = 4, #ARGV do
+    ids[ARGV[i]] = true
+end
+local all = #ARGV < 4
+local items = redis.call('LRANGE', KEYS[1], 0, -1)
+local updated = 0
+for index, raw in ipairs(items) do
+    local message = cjson.decode(raw)
+    if message['sender_user_id'] ~= reader and message['status'] ~= 'read'
+            and (all or ids[message['id']]) then
+        message['status'] = 'read'
+        message['read_at'] = read_at
+        redis.call('LSET', KEYS[1], index - 1, cjson.encode(message))
+        updated = updated + 1
+    end
+end
+""" + _GENERATION_BUMP + """
+return updated
+"""
+
+_INVALIDATE_SCRIPT = """
+redis.call('DEL', KEYS[1])
+""" + _GENERATION_BUMP + """
+return 1
+"""
+
+
+class MessageCacheService:
+    """
+    Cola caliente de mensajes recientes por conversación en Redis.
+
+    ``chat:recent:{conversation_id}`` es una lista (más reciente primero) con
+    los últimos ``chat_recent_messages_size`` mensajes serializados. Abrir un
+    chat lee de aquí; el historial anterior se pagina contra Postgres.
+    """
+
+    KEY_PREFIX = "chat:recent:"
+
+    def __init__(self):
+        self.size = settings.chat_recent_messages_size
+        self.ttl_seconds = settings.chat_recent_messages_ttl_seconds
+        self._scripts = {}
+
+    def _key(self, conversation_id: UUID) -> str:
+        return f"{self.KEY_PREFIX}{conversation_id}"
+
+    def _keys(self, conversation_id: UUID) -> List[str]:
+        key = self._key(conversation_id)
+        return [key, f"{key}:gen"]
+
+    def _script(self, client, source: str):
+        if source not in self._scripts:
+            self._scripts[source] = client.register_script(source)
+        return self._scripts[source]
+
+    def generation(self, conversation_id: UUID) -> Optional[str]:
+        """Generación actual; se pasa a ``seed`` tras leer de Postgres."""
+        client = get_redis_client()
+        if not client:
+            return None
+        try:
+            return client.get(self._keys(conversation_id)[1]) or "0"
+        except RedisError as exc:
+            logger.warning("Unable to read recent messages generation for %s: %s", conversation_id, exc)
+            return None
+
+    def get_recent(self, conversation_id: UUID, limit: int) -> Optional[List[dict]]:
+        """Return up to ``limit`` newest messages, or ``None`` on cache miss."""
+        if limit > self.size:
+            return None
+
+        client = get_redis_client()
+        if not client:
+            return None
+
+        try:
+            items = client.lrange(self._key(conversation_id), 0, limit - 1)
+        except RedisError as exc:
+            logger.warning("Unable to read recent messages for %s: %s", conversation_id, exc)
+            return None
+
+        if not items:
+            return None
+        return [json.loads(item) for item in items]
+
+    def seed(self, conversation_id: UUID, messages: List[dict], generation: Optional[str]) -> None:
+        """
+        Replace the cached tail with ``messages`` (newest first), unless the
+        conversation changed since ``generation`` was read.
+        """
+        client = get_redis_client()
+        if not client or not messages or generation is None:
+            return
+
+        try:
+            seeded = self._script(client, _SEED_SCRIPT)(
+                keys=self._keys(conversation_id),
+                args=[self.ttl_seconds, generation,
+                      *[json.dumps(message, default=str) for message in messages[:self.size]]],
+            )
+            if not seeded:
+                logger.debug("Skipped stale seed of recent messages for %s", conversation_id)
+        except RedisError as exc:
+            logger.warning("Unable to seed recent messages for %s: %s", conversation_id, exc)
+
+    def append(self, conversation_id: UUID, message: dict) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+
+        try:
+            self._script(client, _APPEND_SCRIPT)(
+                keys=self._keys(conversation_id),
+                args=[self.ttl_seconds, json.dumps(message, default=str), self.size],
+            )
+        except RedisError as exc:
+            logger.warning("Unable to append recent message for %s: %s", conversation_id, exc)
+
+    def mark_read(self, conversation_id: UUID, reader_id: UUID, read_at: datetime,
+                  message_ids: Optional[Iterable[UUID]] = None) -> None:
+        """
+        Actualizar el estado de los mensajes cacheados tras un acuse de
+        lectura (todos los recibidos por ``reader_id`` o solo ``message_ids``).
+        """
+        client = get_redis_client()
+        if not client:
+            return
+
+        ids = [str(message_id) for message_id in message_ids] if message_ids is not None else []
+        if message_ids is not None and not ids:
+            return
+
+        try:
+            self._script(client, _MARK_READ_SCRIPT)(
+                keys=self._keys(conversation_id),
+                args=[self.ttl_seconds, str(reader_id), self._format_datetime(read_at), *ids],
+            )
+        except RedisError as exc:
+            logger.warning("Unable to mark recent messages read for %s: %s", conversation_id, exc)
+            self.invalidate(conversation_id)
+
+    @staticmethod
+    def _format_datetime(value: datetime) -> str:
+        # Los acuses usan utcnow() (naive): misma representación que las
+        # columnas timestamptz ya cacheadas
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return _DATETIME_ADAPTER.dump_python(value, mode="json")
+
+    def invalidate(self, conversation_id: UUID) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            self._script(client, _INVALIDATE_SCRIPT)(
+                keys=self._keys(conversation_id),
+                args=[self.ttl_seconds],
+            )
+        except RedisError as exc:
+            logger.warning("Unable to invalidate recent messages for %s: %s", conversation_id, exc)
+
+message_cache_service = MessageCacheService()
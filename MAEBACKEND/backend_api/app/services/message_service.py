@@ -4,19 +4,177 @@ Handles conversations, messages, and related operations.
 """
 from typing import List, Optional, Dict
 from uuid import UUID
+import logging
 from datetime import datetime
-from sqlalchemy import select, and_, or_, func, desc
+from sqlalchemy import select, and_, or_, func, desc, text, tuple_
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
-from app.models.chat import Conversation, Message, UserPresence, MessageStatus, MessageType
+from app.core.utils import decode_keyset_cursor
+from app.models.chat import Conversation, Message, MessageStatus, MessageType
 from app.models.listing import Listing
 from app.models.auth import User
+from app.services.message_cache_service import message_cache_service
+from app.services.presence_service import presence_service
+from app.services.unread_counter_service import unread_counter_service
 from app.schemas.chat import (
     ConversationResponse, MessageResponse, ConversationWithDetails,
     ConversationListResponse, UserInfo, ListingInfo, UnreadCountResponse
 )
 
+logger = logging.getLogger(__name__)
+
+
+# Bandeja de entrada en una sola consulta. Cada rama del UNION usa su índice
+# (client|owner)_user_id, updated_at DESC y los LATERAL resuelven último
+# mensaje y no leídos solo para las filas de la página. La presencia se
+# resuelve aparte con un MGET a Redis.
+_INBOX_PAGE_SQL = """
+    SELECT
+        c.id,
+        c.listing_id,
+        c.updated_at,
+        c.is_archived,
+        c.other_user_id,
+        ou.first_name AS other_first_name,
+        ou.last_name AS other_last_name,
+        ou.email AS other_email,
+        ou.profile_picture_url AS other_picture,
+        l.title AS listing_title,
+        l.price AS listing_price,
+        l.currency AS listing_currency,
+        lm.content AS last_message_content,
+        lm.created_at AS last_message_at,
+        lm.sender_user_id AS last_message_sender_id,
+        unread.unread_count
+    FROM (
+        (
+            SELECT c.id, c.listing_id, c.updated_at,
+                   c.archived_by_client AS is_archived,
+                   c.owner_user_id AS other_user_id
+            FROM chat.conversations c
+            WHERE c.client_user_id = :user_id
+              {client_archived_filter}
+              {cursor_filter}
+            ORDER BY c.updated_at DESC, c.id DESC
+            LIMIT :branch_limit
+        )
+        UNION ALL
+        (
+            SELECT c.id, c.listing_id, c.updated_at,
+                   c.archived_by_owner AS is_archived,
+                   c.client_user_id AS other_user_id
+            FROM chat.conversations c
+            WHERE c.owner_user_id = :user_id
+              {owner_archived_filter}
+              {cursor_filter}
+            ORDER BY c.updated_at DESC, c.id DESC
+            LIMIT :branch_limit
+        )
+        ORDER BY updated_at DESC, id DESC
+        OFFSET :page_offset
+        LIMIT :page_limit
+    ) c
+    LEFT JOIN core.users ou ON ou.id = c.other_user_id
+    LEFT JOIN LATERAL (
+        SELECT li.title, li.price, li.currency
+        FROM core.listings li
+        WHERE li.id = c.listing_id
+        LIMIT 1
+    ) l ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT m.content, m.created_at, m.sender_user_id
+        FROM chat.messages m
+        WHERE m.conversation_id = c.id
+          AND m.is_deleted = FALSE
+        ORDER BY m.created_at DESC
+        LIMIT 1
+    ) lm ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*) AS unread_count
+        FROM chat.messages m
+        WHERE m.conversation_id = c.id
+          AND m.sender_user_id <> :user_id
+          AND m.status <> 'read'
+          AND m.is_deleted = FALSE
+    ) unread ON TRUE
+    ORDER BY c.updated_at DESC, c.id DESC
+"""
+
+
+# Recibo de lectura como marca de agua: marca en un solo UPDATE todo lo
+# recibido hasta el mensaje indicado (o hasta ``read_up_to``).
+_MARK_READ_UP_TO_SQL = """
+    WITH mark AS (
+        SELECT COALESCE(
+            (
+                SELECT mm.created_at
+                FROM chat.messages mm
+                WHERE mm.id = :message_id
+                  AND mm.conversation_id = :conversation_id
+            ),
+            CAST(:read_up_to AS timestamptz)
+        ) AS created_at
+    ),
+    updated AS (
+        UPDATE chat.messages m
+        SET status = 'read', read_at = NOW()
+        FROM mark
+        WHERE m.conversation_id = :conversation_id
+          AND m.sender_user_id <> :user_id
+          AND m.status <> 'read'
+          AND m.is_deleted = FALSE
+          AND m.created_at <= mark.created_at
+        RETURNING m.id, m.created_at, m.read_at
+    )
+    SELECT COUNT(*) AS read_count, MAX(created_at) AS read_up_to,
+           MAX(read_at) AS read_at, array_agg(id) AS message_ids
+    FROM updated
+"""
+
+
+# Envío de mensaje en una sola sentencia: verifica acceso, inserta y devuelve
+# la fila (con el estado ya ajustado por trigger_auto_set_delivered) junto al
+# destinatario.
+_SEND_MESSAGE_SQL = """
+    WITH conv AS (
+        SELECT c.id, c.client_user_id, c.owner_user_id
+        FROM chat.conversations c
+        WHERE c.id = CAST(:conversation_id AS uuid)
+          AND (c.client_user_id = CAST(:sender_id AS uuid) OR c.owner_user_id = CAST(:sender_id AS uuid))
+    )
+    INSERT INTO chat.messages (
+        conversation_id, sender_user_id, message_type, content, media_url, status
+    )
+    SELECT
+        conv.id, CAST(:sender_id AS uuid),
+        CAST(:message_type AS chat.message_type), :content, :media_url,
+        CAST('sent' AS chat.message_status)
+    FROM conv
+    RETURNING
+        id, conversation_id, sender_user_id, message_type, content, media_url,
+        status, read_at, delivered_at, created_at, updated_at, is_deleted,
+        (
+            SELECT CASE WHEN conv.client_user_id = CAST(:sender_id AS uuid)
+                        THEN conv.owner_user_id ELSE conv.client_user_id END
+            FROM conv
+        ) AS recipient_id
+"""
+
+
+def message_event_data(message: Dict) -> Dict:
+    """Payload ``data`` del evento WebSocket ``message`` a partir de una fila."""
+    return {
+        "id": str(message["id"]),
+        "conversation_id": str(message["conversation_id"]),
+        "sender_user_id": str(message["sender_user_id"]),
+        "content": message["content"],
+        "message_type": message["message_type"],
+        "status": message["status"],
+        "created_at": message["created_at"].isoformat(),
+        "updated_at": message["updated_at"].isoformat()
+    }
+
 
 class MessageService:
     """
@@ -136,105 +294,76 @@ class MessageService:
         user_id: UUID,
         skip: int = 0,
         limit: int = 20,
-        include_archived: bool = False
+        include_archived: bool = False,
+        cursor: Optional[str] = None
     ) -> List[ConversationListResponse]:
         """
-        Obtener todas las conversaciones de un usuario.
+        Obtener las conversaciones de un usuario en una sola consulta.
         
         Args:
             user_id: ID del usuario
-            skip: Número de conversaciones a saltar (paginación)
+            skip: Número de conversaciones a saltar (ignorado si hay cursor)
             limit: Número máximo de conversaciones a retornar
             include_archived: Si incluir conversaciones archivadas
+            cursor: Cursor keyset (updated_at, id) de la última conversación vista
             
         Returns:
-            Lista de ConversationListResponse
+            Lista de ConversationListResponse ordenada por última actividad
+            
+        Raises:
+            HTTPException: Si el cursor es inválido
         """
-        # Query base
-        query = self.db.query(Conversation).filter(
-            or_(
-                Conversation.client_user_id == user_id,
-                Conversation.owner_user_id == user_id
-            )
-        )
+        params = {"user_id": user_id, "page_limit": limit}
         
-        # Filtrar archivadas
-        if not include_archived:
-            query = query.filter(
-                or_(
-                    and_(
-                        Conversation.client_user_id == user_id,
-                        Conversation.archived_by_client == False
-                    ),
-                    and_(
-                        Conversation.owner_user_id == user_id,
-                        Conversation.archived_by_owner == False
-                    )
-                )
-            )
-        
-        # Ordenar por última actividad
-        query = query.order_by(desc(Conversation.updated_at))
-        
-        # Paginación
-        conversations = query.offset(skip).limit(limit).all()
-        
-        # Construir respuesta
-        result = []
-        for conv in conversations:
-            # Determinar el "otro usuario"
-            is_client = conv.client_user_id == user_id
-            other_user_id = conv.owner_user_id if is_client else conv.client_user_id
-            
-            # Obtener info del otro usuario
-            other_user = self.db.query(User).filter(User.id == other_user_id).first()
-            
-            # Obtener info del listing
-            listing = self.db.query(Listing).filter(Listing.id == conv.listing_id).first()
-            
-            # Obtener último mensaje
-            last_message = self.db.query(Message).filter(
-                and_(
-                    Message.conversation_id == conv.id,
-                    Message.is_deleted == False
-                )
-            ).order_by(desc(Message.created_at)).first()
-            
-            # Contar no leídos
-            unread_count = self.db.query(func.count(Message.id)).filter(
-                and_(
-                    Message.conversation_id == conv.id,
-                    Message.sender_user_id != user_id,
-                    Message.status != MessageStatus.READ.value,
-                    Message.is_deleted == False
+        cursor_filter = ""
+        if cursor:
+            try:
+                cursor_updated_at, cursor_id = decode_keyset_cursor(cursor)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor de paginación inválido"
                 )
-            ).scalar() or 0
-            
-            # Verificar si está archivada para este usuario
-            is_archived = (
-                conv.archived_by_client if is_client else conv.archived_by_owner
+            cursor_filter = "AND (c.updated_at, c.id) < (:cursor_updated_at, :cursor_id)"
+            params["cursor_updated_at"] = cursor_updated_at
+            params["cursor_id"] = cursor_id
+            skip = 0
+        
+        params["page_offset"] = skip
+        params["branch_limit"] = skip + limit
+        
+        sql = _INBOX_PAGE_SQL.format(
+            client_archived_filter="" if include_archived else "AND c.archived_by_client = FALSE",
+            owner_archived_filter="" if include_archived else "AND c.archived_by_owner = FALSE",
+            cursor_filter=cursor_filter,
+        )
+        rows = self.db.execute(text(sql), params).fetchall()
+        online = presence_service.get_online_status(row.other_user_id for row in rows)
+        
+        return [
+            ConversationListResponse(
+                id=row.id,
+                listing_id=row.listing_id,
+                other_user_id=row.other_user_id,
+                other_user_name=(
+                    f"{row.other_first_name or ''} {row.other_last_name or ''}".strip()
+                    or row.other_email
+                    or "Usuario"
+                ),
+                other_user_picture=row.other_picture,
+                other_user_online=online.get(row.other_user_id, False),
+                listing_title=row.listing_title or "Listing no disponible",
+                listing_price=float(row.listing_price) if row.listing_price is not None else 0.0,
+                listing_currency=row.listing_currency or "PEN",
+                last_message_content=row.last_message_content,
+                last_message_at=row.last_message_at,
+                last_message_sender_id=row.last_message_sender_id,
+                unread_count=row.unread_count or 0,
+                is_archived=row.is_archived,
+                updated_at=row.updated_at
             )
-            
-            # Construir respuesta
-            result.append(ConversationListResponse(
-                id=conv.id,
-                listing_id=conv.listing_id,
-                other_user_id=other_user_id,
-                other_user_name=f"{other_user.first_name or ''} {other_user.last_name or ''}".strip() or other_user.email,
-                other_user_picture=other_user.profile_picture_url,
-                other_user_online=self._is_user_online(other_user_id),
-                listing_title=listing.title if listing else "Listing no disponible",
-                listing_price=float(listing.price) if listing else 0.0,
-                listing_currency=listing.currency if listing else "PEN",
-                last_message_content=last_message.content if last_message else None,
-                last_message_at=last_message.created_at if last_message else None,
-                last_message_sender_id=last_message.sender_user_id if last_message else None,
-                unread_count=unread_count,
-                is_archived=is_archived,
-                updated_at=conv.updated_at
-            ))
-        
-        return result
+            for row in rows
+        ]
     
     async def archive_conversation(
         self,
@@ -282,16 +411,16 @@ class MessageService:
     # MESSAGES
     # ========================================
     
-    async def create_message(
+    async def send_message(
         self,
         conversation_id: UUID,
         sender_id: UUID,
         content: str,
         message_type: str = "text",
         media_url: Optional[str] = None
-    ) -> MessageResponse:
+    ) -> Dict:
         """
-        Crear un nuevo mensaje en una conversación.
+        Persistir un mensaje con un único INSERT ... RETURNING.
         
         Args:
             conversation_id: ID de la conversación
@@ -301,51 +430,132 @@ class MessageService:
             media_url: URL del archivo multimedia (opcional)
             
         Returns:
-            MessageResponse con el mensaje creado
+            Dict con ``message`` (columnas del mensaje) y ``recipient_id``
+            
+        Raises:
+            HTTPException: Si la conversación no existe o no hay acceso
         """
-        # Verificar que la conversación existe y el usuario tiene acceso
-        conversation = await self.get_conversation(conversation_id, sender_id)
-        if not conversation:
+        row = self.db.execute(
+            text(_SEND_MESSAGE_SQL),
+            {
+                "conversation_id": str(conversation_id),
+                "sender_id": str(sender_id),
+                "message_type": message_type,
+                "content": content,
+                "media_url": media_url,
+            }
+        ).mappings().first()
+        
+        if not row:
+            self.db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Conversación no encontrada o sin acceso"
             )
         
-        # Crear mensaje
-        message = Message(
-            conversation_id=conversation_id,
-            sender_user_id=sender_id,
-            content=content,
-            message_type=message_type,
-            media_url=media_url,
-            status=MessageStatus.SENT.value  # El trigger lo cambiará a DELIVERED
+        self.db.commit()
+        
+        message = dict(row)
+        recipient_id = message.pop("recipient_id")
+        
+        unread_counter_service.increment_chat(recipient_id, conversation_id)
+        # Mismo formato que la siembra (model_dump JSON): fechas ISO uniformes
+        message_cache_service.append(
+            conversation_id, MessageResponse.model_validate(message).model_dump(mode="json")
         )
         
-        self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        return {"message": message, "recipient_id": recipient_id}
+    
+    async def create_message(
+        self,
+        conversation_id: UUID,
+        sender_id: UUID,
+        content: str,
+        message_type: str = "text",
+        media_url: Optional[str] = None
+    ) -> MessageResponse:
+        """
+        Crear un nuevo mensaje en una conversación.
         
-        return MessageResponse.model_validate(message)
+        Args:
+            conversation_id: ID de la conversación
+            sender_id: ID del remitente
+            content: Contenido del mensaje
+            message_type: Tipo de mensaje (text, image, document)
+            media_url: URL del archivo multimedia (opcional)
+            
+        Returns:
+            MessageResponse con el mensaje creado
+        """
+        result = await self.send_message(
+            conversation_id, sender_id, content, message_type, media_url
+        )
+        return MessageResponse.model_validate(result["message"])
+    
+    @staticmethod
+    def notify_offline_recipient(message: Dict, recipient_id: UUID) -> bool:
+        """
+        Encolar la notificación (in-app/email/push) de un mensaje si el
+        destinatario no tiene sockets abiertos. Se llama después del
+        broadcast para no retrasar la entrega en tiempo real.
+        
+        Returns:
+            True si se encoló la notificación
+        """
+        if presence_service.is_online(recipient_id):
+            return False
+        
+        try:
+            from app.tasks.chat_tasks import notify_offline_message_task
+            notify_offline_message_task.delay(
+                str(message["id"]),
+                str(message["conversation_id"]),
+                str(message["sender_user_id"]),
+                str(recipient_id),
+                message["content"][:200]
+            )
+            return True
+        except Exception as e:
+            logger.warning(
+                f"No se pudo encolar la notificación del mensaje {message['id']}: {e}"
+            )
+            return False
     
     async def get_messages(
         self,
         conversation_id: UUID,
         skip: int = 0,
         limit: int = 50,
-        before: Optional[str] = None
+        before: Optional[str] = None,
+        cursor: Optional[str] = None
     ) -> List[MessageResponse]:
         """
-        Obtener mensajes de una conversación con paginación.
+        Obtener mensajes de una conversación con paginación por cursor.
+        
+        La primera página se sirve desde la cola caliente en Redis; las
+        siguientes usan el cursor (created_at, id) sobre
+        idx_messages_conversation_timeline.
         
         Args:
             conversation_id: ID de la conversación
-            skip: Número de mensajes a saltar
+            skip: Número de mensajes a saltar (legado, ignorado con cursor)
             limit: Número máximo de mensajes
-            before: Timestamp ISO para paginación (mensajes anteriores a este)
+            before: Timestamp ISO (legado, usar cursor)
+            cursor: Cursor keyset del último mensaje de la página anterior
             
         Returns:
             Lista de MessageResponse ordenada por fecha descendente
+            
+        Raises:
+            HTTPException: Si el cursor es inválido
         """
+        first_page = not cursor and not before and skip == 0
+        
+        if first_page:
+            cached = message_cache_service.get_recent(conversation_id, limit)
+            if cached is not None:
+                return [MessageResponse.model_validate(item) for item in cached]
+        
         query = self.db.query(Message).filter(
             and_(
                 Message.conversation_id == conversation_id,
@@ -353,18 +563,47 @@ class MessageService:
             )
         )
         
-        # Filtrar por timestamp si se proporciona
-        if before:
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_keyset_cursor(cursor)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor de paginación inválido"
+                )
+            query = query.filter(
+                tuple_(Message.created_at, Message.id) < tuple_(cursor_created_at, cursor_id)
+            )
+        elif before:
             try:
                 before_dt = datetime.fromisoformat(before.replace('Z', '+00:00'))
                 query = query.filter(Message.created_at < before_dt)
             except ValueError:
                 pass  # Ignorar si el formato es inválido
         
-        # Ordenar y paginar
-        messages = query.order_by(desc(Message.created_at)).offset(skip).limit(limit).all()
+        query = query.order_by(desc(Message.created_at), desc(Message.id))
+        
+        if first_page:
+            # Sembrar la cola caliente con la ventana completa (la generación
+            # se lee antes de la consulta: si llega un mensaje mientras tanto
+            # la siembra se descarta)
+            generation = message_cache_service.generation(conversation_id)
+            fetch_limit = max(limit, message_cache_service.size)
+            messages = [
+                MessageResponse.model_validate(msg)
+                for msg in query.limit(fetch_limit).all()
+            ]
+            message_cache_service.seed(
+                conversation_id,
+                [msg.model_dump(mode="json") for msg in messages],
+                generation
+            )
+            return messages[:limit]
         
-        return [MessageResponse.model_validate(msg) for msg in messages]
+        if not cursor and skip:
+            query = query.offset(skip)
+        
+        return [MessageResponse.model_validate(msg) for msg in query.limit(limit).all()]
     
     async def mark_as_read(
         self,
@@ -407,6 +646,10 @@ class MessageService:
             message.status = MessageStatus.READ.value
             message.read_at = datetime.utcnow()
             self.db.commit()
+            unread_counter_service.decrement_chat(user_id, message.conversation_id)
+            message_cache_service.mark_read(
+                message.conversation_id, user_id, message.read_at, [message.id]
+            )
         
         return True
     
@@ -434,6 +677,7 @@ class MessageService:
             )
         
         # Actualizar mensajes
+        read_at = datetime.utcnow()
         result = self.db.query(Message).filter(
             and_(
                 Message.conversation_id == conversation_id,
@@ -444,14 +688,64 @@ class MessageService:
         ).update(
             {
                 "status": MessageStatus.READ.value,
-                "read_at": datetime.utcnow()
+                "read_at": read_at
             },
             synchronize_session=False
         )
         
         self.db.commit()
+        unread_counter_service.clear_conversation(user_id, conversation_id)
+        if result:
+            message_cache_service.mark_read(conversation_id, user_id, read_at)
         return result
     
+    async def mark_read_up_to(
+        self,
+        conversation_id: UUID,
+        user_id: UUID,
+        message_id: Optional[UUID] = None,
+        read_up_to: Optional[datetime] = None
+    ) -> Dict:
+        """
+        Marcar como leídos todos los mensajes recibidos hasta una marca.
+        El acceso a la conversación debe estar verificado por el llamador
+        (p. ej. al abrir el WebSocket).
+        
+        Args:
+            conversation_id: ID de la conversación
+            user_id: ID del usuario que lee
+            message_id: Último mensaje leído (tiene prioridad sobre read_up_to)
+            read_up_to: Timestamp hasta el que se leyó
+            
+        Returns:
+            Dict con read_count y read_up_to (None si no hubo cambios)
+        """
+        if not message_id and not read_up_to:
+            return {"read_count": 0, "read_up_to": None}
+        
+        row = self.db.execute(
+            text(_MARK_READ_UP_TO_SQL),
+            {
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                "message_id": message_id,
+                "read_up_to": read_up_to,
+            }
+        ).first()
+        self.db.commit()
+        
+        read_count = int(row.read_count) if row else 0
+        if read_count:
+            unread_counter_service.decrement_chat(user_id, conversation_id, read_count)
+            message_cache_service.mark_read(
+                conversation_id, user_id, row.read_at, row.message_ids
+            )
+        
+        return {
+            "read_count": read_count,
+            "read_up_to": row.read_up_to if read_count else None
+        }
+    
     async def delete_message(
         self,
         message_id: UUID,
@@ -481,9 +775,25 @@ class MessageService:
                 detail="Mensaje no encontrado"
             )
         
+        was_unread = message.status != MessageStatus.READ.value
+        
         message.is_deleted = True
         message.deleted_at = datetime.utcnow()
         self.db.commit()
+        message_cache_service.invalidate(message.conversation_id)
+        
+        # Un mensaje no leído eliminado deja de contar para el destinatario
+        if was_unread:
+            conversation = self.db.query(Conversation).filter(
+                Conversation.id == message.conversation_id
+            ).first()
+            if conversation:
+                recipient_id = (
+                    conversation.owner_user_id
+                    if conversation.client_user_id == user_id
+                    else conversation.client_user_id
+                )
+                unread_counter_service.decrement_chat(recipient_id, message.conversation_id)
         
         return True
     
@@ -498,6 +808,7 @@ class MessageService:
     ) -> int:
         """
         Obtener el número de mensajes no leídos.
+        Se lee del contador en Redis; si aún no existe se siembra desde la BD.
         
         Args:
             user_id: ID del usuario
@@ -506,28 +817,18 @@ class MessageService:
         Returns:
             Número de mensajes no leídos
         """
-        query = self.db.query(func.count(Message.id)).join(
-            Conversation, Message.conversation_id == Conversation.id
-        ).filter(
-            and_(
-                or_(
-                    Conversation.client_user_id == user_id,
-                    Conversation.owner_user_id == user_id
-                ),
-                Message.sender_user_id != user_id,
-                Message.status != MessageStatus.READ.value,
-                Message.is_deleted == False
-            )
-        )
+        cached = unread_counter_service.get_chat_unread(user_id, conversation_id)
+        if cached is not None:
+            return cached
         
+        per_conversation = unread_counter_service.seed_chat(self.db, user_id)
         if conversation_id:
-            query = query.filter(Message.conversation_id == conversation_id)
-        
-        return query.scalar() or 0
+            return per_conversation.get(conversation_id, 0)
+        return sum(per_conversation.values())
     
     def _is_user_online(self, user_id: UUID) -> bool:
         """
-        Verificar si un usuario está online.
+        Verificar si un usuario está online (presencia en Redis).
         
         Args:
             user_id: ID del usuario
@@ -535,48 +836,7 @@ class MessageService:
         Returns:
             True si está online
         """
-        presence = self.db.query(UserPresence).filter(
-            UserPresence.user_id == user_id
-        ).first()
-        
-        return presence.is_online if presence else False
-    
-    async def update_user_presence(
-        self,
-        user_id: UUID,
-        is_online: bool,
-        increment_connections: int = 0
-    ):
-        """
-        Actualizar el estado de presencia de un usuario.
-        
-        Args:
-            user_id: ID del usuario
-            is_online: Estado online/offline
-            increment_connections: +1 para conectar, -1 para desconectar, 0 para no cambiar
-        """
-        presence = self.db.query(UserPresence).filter(
-            UserPresence.user_id == user_id
-        ).first()
-        
-        if not presence:
-            # Crear nuevo registro de presencia
-            presence = UserPresence(
-                user_id=user_id,
-                is_online=is_online,
-                connection_count=max(0, increment_connections)
-            )
-            self.db.add(presence)
-        else:
-            # Actualizar existente
-            if increment_connections != 0:
-                presence.connection_count = max(0, presence.connection_count + increment_connections)
-            
-            # Solo está online si hay conexiones activas
-            presence.is_online = presence.connection_count > 0
-            presence.last_seen_at = datetime.utcnow()
-        
-        self.db.commit()
+        return presence_service.is_online(user_id)
     
     async def get_listing(self, listing_id: UUID) -> Optional[Listing]:
         """
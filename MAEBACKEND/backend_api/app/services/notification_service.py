@@ -17,6 +17,7 @@ from app.schemas.notifications import (
     NotificationMarkRead
 )
 from app.core.exceptions import NotFoundError, ValidationError
+from app.services.unread_counter_service import unread_counter_service
 
 
 class NotificationService:
@@ -91,6 +92,7 @@ class NotificationService:
         
         logger.info(f"💾 Haciendo commit...")
         self.db.commit()
+        unread_counter_service.adjust_notifications(user_id, 1)
         try:
             from app.tasks.notification_tasks import process_notification_queue_task
             process_notification_queue_task.delay()
@@ -192,20 +194,15 @@ class NotificationService:
                 notification.status = NotificationStatus.READ
         
         self.db.commit()
+        unread_counter_service.adjust_notifications(user_id, -count)
         return count
     
     def get_unread_count(self, user_id: UUID) -> int:
-        """Obtener cantidad de notificaciones no leídas"""
-        return self.db.query(Notification).filter(
-            and_(
-                Notification.user_id == user_id,
-                Notification.read_at.is_(None),
-                or_(
-                    Notification.expires_at.is_(None),
-                    Notification.expires_at > datetime.utcnow()
-                )
-            )
-        ).count()
+        """Obtener cantidad de notificaciones no leídas (contador en Redis, sembrado desde BD)"""
+        cached = unread_counter_service.get_notification_unread(user_id)
+        if cached is not None:
+            return cached
+        return unread_counter_service.seed_notifications(self.db, user_id)
     
     def delete_notification(self, notification_id: UUID, user_id: UUID) -> bool:
         """Eliminar notificación (solo del usuario)"""
@@ -213,8 +210,11 @@ class NotificationService:
         if not notification:
             return False
         
+        was_unread = notification.read_at is None
         self.db.delete(notification)
         self.db.commit()
+        if was_unread:
+            unread_counter_service.adjust_notifications(user_id, -1)
         return True
     
     # Métodos de configuración
@@ -0,0 +1,160 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+# Extrae y elimina atómicamente los miembros vencidos de un sorted set, de modo
+# que dos workers drenando a la vez nunca procesen la misma reserva.
+_POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+def _to_timestamp(value: datetime) -> float:
+    """Convert a (possibly naive UTC) datetime into a unix timestamp."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class PaymentDeadlineQueue:
+    """
+    Cola de trabajos diferidos para los plazos de pago de reservas.
+
+    Cada reserva confirmada registra dos eventos en sorted sets de Redis
+    (score = instante de disparo): el recordatorio previo al vencimiento y la
+    expiración del plazo. Un drenador periódico extrae solo los eventos
+    vencidos, evitando escanear ``core.bookings`` completo.
+    """
+
+    def __init__(self):
+        self.expiry_key = "bookings:payment_deadline:expiry"
+        self.warning_key = "bookings:payment_deadline:warning"
+        self.warning_minutes = settings.payment_deadline_warning_minutes
+        self._pop_due_script = None
+
+    def _get_pop_due_script(self, client):
+        if self._pop_due_script is None:
+            self._pop_due_script = client.register_script(_POP_DUE_SCRIPT)
+        return self._pop_due_script
+
+    def is_available(self) -> bool:
+        return get_redis_client() is not None
+
+    def _queue_events(self, pipe, booking_id: str, deadline: datetime, now_ts: float) -> None:
+        deadline_ts = _to_timestamp(deadline)
+        warning_ts = deadline_ts - timedelta(minutes=self.warning_minutes).total_seconds()
+        pipe.zadd(self.expiry_key, {booking_id: deadline_ts})
+        if warning_ts > now_ts:
+            pipe.zadd(self.warning_key, {booking_id: warning_ts})
+
+    def register(self, booking_id: str, deadline: datetime) -> bool:
+        """Register expiry and warning events for a confirmed booking."""
+        client = get_redis_client()
+        if not client:
+            return False
+
+        try:
+            pipe = client.pipeline(transaction=True)
+            self._queue_events(pipe, str(booking_id), deadline, datetime.now(timezone.utc).timestamp())
+            pipe.execute()
+            return True
+        except RedisError as exc:
+            logger.warning("Unable to register payment deadline for booking %s: %s", booking_id, exc)
+            return False
+
+    def unregister(self, booking_id: str) -> None:
+        """Drop pending deadline events (e.g. after the reservation is paid)."""
+        client = get_redis_client()
+        if not client:
+            return
+
+        member = str(booking_id)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zrem(self.expiry_key, member)
+            pipe.zrem(self.warning_key, member)
+            pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to unregister payment deadline for booking %s: %s", member, exc)
+
+    def pop_due_expiries(self, limit: int = 100, now: Optional[datetime] = None) -> List[str]:
+        return self._pop_due(self.expiry_key, limit, now)
+
+    def pop_due_warnings(self, limit: int = 100, now: Optional[datetime] = None) -> List[str]:
+        return self._pop_due(self.warning_key, limit, now)
+
+    def _pop_due(self, key: str, limit: int, now: Optional[datetime]) -> List[str]:
+        client = get_redis_client()
+        if not client:
+            return []
+
+        now_ts = _to_timestamp(now or datetime.now(timezone.utc))
+        try:
+            script = self._get_pop_due_script(client)
+            return list(script(keys=[key], args=[now_ts, limit]))
+        except RedisError as exc:
+            logger.warning("Unable to pop due payment deadlines from %s: %s", key, exc)
+            return []
+
+    def requeue_warnings(self, booking_ids: Iterable[str], now: Optional[datetime] = None) -> int:
+        return self._requeue(self.warning_key, booking_ids, now)
+
+    def requeue_expiries(self, booking_ids: Iterable[str], now: Optional[datetime] = None) -> int:
+        return self._requeue(self.expiry_key, booking_ids, now)
+
+    def _requeue(self, key: str, booking_ids: Iterable[str], now: Optional[datetime]) -> int:
+        """
+        Devolver a la cola eventos extraídos cuyo procesamiento falló. Quedan
+        vencidos (score = ahora) para que el siguiente drenado los reintente;
+        NX conserva un evento registrado de nuevo mientras tanto.
+        """
+        client = get_redis_client()
+        if not client:
+            return 0
+
+        now_ts = _to_timestamp(now or datetime.now(timezone.utc))
+        members = {str(booking_id): now_ts for booking_id in booking_ids}
+        if not members:
+            return 0
+
+        try:
+            client.zadd(key, members, nx=True)
+            return len(members)
+        except RedisError as exc:
+            logger.error("Unable to requeue %d payment deadlines into %s: %s", len(members), key, exc)
+            return 0
+
+    def register_many(self, deadlines: Iterable[Tuple[str, datetime]]) -> int:
+        """Bulk-register ``(booking_id, deadline)`` pairs in a single pipeline."""
+        client = get_redis_client()
+        if not client:
+            return 0
+
+        now_ts = datetime.now(timezone.utc).timestamp()
+        registered = 0
+        try:
+            pipe = client.pipeline(transaction=False)
+            for booking_id, deadline in deadlines:
+                self._queue_events(pipe, str(booking_id), deadline, now_ts)
+                registered += 1
+            if registered:
+                pipe.execute()
+            return registered
+        except RedisError as exc:
+            logger.warning("Unable to bulk-register payment deadlines: %s", exc)
+            return 0
+
+
+payment_deadline_queue = PaymentDeadlineQueue()
@@ -0,0 +1,180 @@
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+from uuid import UUID
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+# Resta una conexión; al llegar a cero borra la clave y anota last_seen para
+# el volcado diferido a chat.user_presence.
+_DISCONNECT_SCRIPT = """
+local remaining = redis.call('DECR', KEYS[1])
+if remaining <= 0 then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return remaining
+"""
+
+# Extrae atómicamente el hash de last_seen pendiente de volcar.
+_DRAIN_LAST_SEEN_SCRIPT = """
+local entries = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return entries
+"""
+
+UPSERT_LAST_SEEN_SQL = """
+    INSERT INTO chat.user_presence (user_id, is_online, last_seen_at, connection_count, updated_at)
+    SELECT CAST(entry.user_id AS uuid), FALSE, CAST(entry.last_seen AS timestamptz), 0, NOW()
+    FROM jsonb_to_recordset(CAST(:entries AS jsonb)) AS entry(user_id text, last_seen text)
+    ON CONFLICT (user_id) DO UPDATE
+    SET last_seen_at = GREATEST(chat.user_presence.last_seen_at, EXCLUDED.last_seen_at),
+        is_online = FALSE,
+        connection_count = 0,
+        updated_at = NOW()
+"""
+
+
+class PresenceService:
+    """
+    Presencia online/offline de usuarios en Redis.
+
+    ``presence:user:{id}`` guarda el número de sockets abiertos del usuario
+    (en todos los workers) con TTL: se crea al conectar, cada heartbeat
+    renueva el TTL y se borra al cerrar el último socket. Si un worker muere
+    sin cerrar sus sockets, la clave expira sola al dejar de recibir
+    heartbeats. Las consultas de presencia no tocan Postgres; el histórico
+    ``last_seen_at`` se vuelca de forma diferida a ``chat.user_presence``.
+    """
+
+    USER_PREFIX = "presence:user:"
+    LAST_SEEN_KEY = "presence:last_seen:pending"
+
+    def __init__(self):
+        self.ttl_seconds = settings.chat_presence_ttl_seconds
+        self._disconnect_script = None
+        self._drain_script = None
+
+    def _key(self, user_id: UUID) -> str:
+        return f"{self.USER_PREFIX}{user_id}"
+
+    def connect(self, user_id: UUID) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            pipe = client.pipeline(transaction=True)
+            pipe.incr(self._key(user_id))
+            pipe.expire(self._key(user_id), self.ttl_seconds)
+            pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to register presence for %s: %s", user_id, exc)
+
+    def heartbeat(self, user_id: UUID) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            # Si la clave expiró (p. ej. Redis reiniciado) se recrea con 1 socket
+            if not client.expire(self._key(user_id), self.ttl_seconds):
+                client.set(self._key(user_id), 1, ex=self.ttl_seconds, nx=True)
+        except RedisError as exc:
+            logger.warning("Unable to refresh presence for %s: %s", user_id, exc)
+
+    def disconnect(self, user_id: UUID) -> bool:
+        """
+        Release one connection of the user.
+
+        Returns:
+            True if the user still has other open sockets
+        """
+        client = get_redis_client()
+        if not client:
+            return False
+
+        if self._disconnect_script is None:
+            self._disconnect_script = client.register_script(_DISCONNECT_SCRIPT)
+
+        try:
+            remaining = self._disconnect_script(
+                keys=[self._key(user_id), self.LAST_SEEN_KEY],
+                args=[str(user_id), datetime.now(timezone.utc).isoformat(), self.ttl_seconds],
+            )
+            return int(remaining) > 0
+        except RedisError as exc:
+            logger.warning("Unable to release presence for %s: %s", user_id, exc)
+            return False
+
+    def is_online(self, user_id: UUID) -> bool:
+        return self.get_online_status([user_id]).get(user_id, False)
+
+    def get_online_status(self, user_ids: Iterable[UUID]) -> Dict[UUID, bool]:
+        """Bulk presence lookup with a single MGET."""
+        ids: List[UUID] = list(dict.fromkeys(user_ids))
+        if not ids:
+            return {}
+
+        client = get_redis_client()
+        if not client:
+            return {user_id: False for user_id in ids}
+
+        try:
+            values = client.mget([self._key(user_id) for user_id in ids])
+        except RedisError as exc:
+            logger.warning("Unable to read presence: %s", exc)
+            return {user_id: False for user_id in ids}
+
+        return {user_id: bool(value and int(value) > 0) for user_id, value in zip(ids, values)}
+
+    def flush_last_seen(self, db: Session) -> int:
+        """Persist pending last_seen timestamps to chat.user_presence in one upsert."""
+        client = get_redis_client()
+        if not client:
+            return 0
+
+        if self._drain_script is None:
+            self._drain_script = client.register_script(_DRAIN_LAST_SEEN_SCRIPT)
+
+        try:
+            flat = self._drain_script(keys=[self.LAST_SEEN_KEY])
+        except RedisError as exc:
+            logger.warning("Unable to drain pending last_seen entries: %s", exc)
+            return 0
+
+        entries = [
+            {"user_id": flat[index], "last_seen": flat[index + 1]}
+            for index in range(0, len(flat), 2)
+        ]
+        if not entries:
+            return 0
+
+        try:
+            db.execute(text(UPSERT_LAST_SEEN_SQL), {"entries": json.dumps(entries)})
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Devolver las entradas para el próximo intento
+            try:
+                client.hset(
+                    self.LAST_SEEN_KEY,
+                    mapping={entry["user_id"]: entry["last_seen"] for entry in entries},
+                )
+            except RedisError:
+                pass
+            raise
+
+        return len(entries)
+
+
+presence_service = PresenceService()
@@ -0,0 +1,289 @@
+import logging
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+# Los contadores solo se modifican si ya existen: una clave ausente significa
+# "no sembrado" y la siguiente lectura la reconstruye desde la BD. Así un
+# incremento nunca crea un contador parcial.
+_CHAT_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+redis.call('HINCRBY', KEYS[2], ARGV[1], ARGV[2])
+local ttl = redis.call('TTL', KEYS[1])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[2], ttl)
+end
+return redis.call('INCRBY', KEYS[1], ARGV[2])
+"""
+
+# Resta hasta ``ARGV[2]`` del contador de la conversación (``-1`` = todo) sin
+# bajar de cero y descuenta lo mismo del total del usuario.
+_CHAT_DECR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local current = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+local amount = tonumber(ARGV[2])
+if amount < 0 or amount > current then
+    amount = current
+end
+if current - amount <= 0 then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    redis.call('HINCRBY', KEYS[2], ARGV[1], -amount)
+end
+local total = tonumber(redis.call('DECRBY', KEYS[1], amount))
+if total < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    total = 0
+end
+return total
+"""
+
+_COUNTER_ADJUST_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local total = tonumber(redis.call('INCRBY', KEYS[1], ARGV[1]))
+if total < 0 then
+    redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+    total = 0
+end
+return total
+"""
+
+CHAT_UNREAD_SQL = """
+    SELECT p.user_id, m.conversation_id, COUNT(*) AS unread
+    FROM chat.messages m
+    JOIN chat.conversations c ON c.id = m.conversation_id
+    CROSS JOIN LATERAL (VALUES (c.client_user_id), (c.owner_user_id)) AS p(user_id)
+    WHERE p.user_id = ANY(CAST(:user_ids AS uuid[]))
+      AND m.sender_user_id <> p.user_id
+      AND m.status <> 'read'
+      AND m.is_deleted = FALSE
+    GROUP BY p.user_id, m.conversation_id
+"""
+
+NOTIFICATION_UNREAD_SQL = """
+    SELECT n.user_id, COUNT(*) AS unread
+    FROM core.notifications n
+    WHERE n.user_id = ANY(CAST(:user_ids AS uuid[]))
+      AND n.read_at IS NULL
+      AND (n.expires_at IS NULL OR n.expires_at > NOW())
+    GROUP BY n.user_id
+"""
+
+
+class UnreadCounterService:
+    """
+    Contadores de no leídos por usuario (chat y notificaciones) en Redis.
+
+    - ``unread:chat:total:{user}``: total de mensajes no leídos del usuario
+    - ``unread:chat:conv:{user}``: hash conversation_id -> no leídos
+    - ``unread:notif:{user}``: notificaciones no leídas
+
+    Se mantienen en cada inserción/lectura y un job periódico los reconcilia
+    contra la BD para corregir cualquier deriva (p. ej. expiraciones).
+    """
+
+    CHAT_TOTAL_PREFIX = "unread:chat:total:"
+    CHAT_CONV_PREFIX = "unread:chat:conv:"
+    NOTIFICATION_PREFIX = "unread:notif:"
+
+    def __init__(self):
+        self.ttl_seconds = settings.unread_counter_ttl_seconds
+        self._scripts: Dict[str, object] = {}
+
+    def _script(self, client, source: str):
+        script = self._scripts.get(source)
+        if script is None:
+            script = client.register_script(source)
+            self._scripts[source] = script
+        return script
+
+    def _chat_keys(self, user_id: UUID) -> List[str]:
+        return [f"{self.CHAT_TOTAL_PREFIX}{user_id}", f"{self.CHAT_CONV_PREFIX}{user_id}"]
+
+    # ========================================
+    # CHAT
+    # ========================================
+
+    def increment_chat(self, user_id: UUID, conversation_id: UUID, amount: int = 1) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            self._script(client, _CHAT_INCR_SCRIPT)(
+                keys=self._chat_keys(user_id), args=[str(conversation_id), amount]
+            )
+        except RedisError as exc:
+            logger.warning("Unable to increment chat unread counter for %s: %s", user_id, exc)
+
+    def decrement_chat(self, user_id: UUID, conversation_id: UUID, amount: int = 1) -> None:
+        self._decrement_chat(user_id, conversation_id, amount)
+
+    def clear_conversation(self, user_id: UUID, conversation_id: UUID) -> None:
+        self._decrement_chat(user_id, conversation_id, -1)
+
+    def _decrement_chat(self, user_id: UUID, conversation_id: UUID, amount: int) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            self._script(client, _CHAT_DECR_SCRIPT)(
+                keys=self._chat_keys(user_id), args=[str(conversation_id), amount]
+            )
+        except RedisError as exc:
+            logger.warning("Unable to decrement chat unread counter for %s: %s", user_id, exc)
+
+    def get_chat_unread(self, user_id: UUID, conversation_id: Optional[UUID] = None) -> Optional[int]:
+        """Return the cached count, or ``None`` if it has not been seeded yet."""
+        client = get_redis_client()
+        if not client:
+            return None
+
+        total_key, conv_key = self._chat_keys(user_id)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.get(total_key)
+            if conversation_id:
+                pipe.hget(conv_key, str(conversation_id))
+            values = pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to read chat unread counter for %s: %s", user_id, exc)
+            return None
+
+        if values[0] is None:
+            return None
+        if conversation_id:
+            return int(values[1] or 0)
+        return max(0, int(values[0]))
+
+    def set_chat_counts(self, user_id: UUID, per_conversation: Dict[UUID, int]) -> None:
+        """Overwrite a user's chat counters with authoritative values."""
+        client = get_redis_client()
+        if not client:
+            return
+
+        total_key, conv_key = self._chat_keys(user_id)
+        counts = {str(conv_id): int(count) for conv_id, count in per_conversation.items() if count}
+        try:
+            pipe = client.pipeline(transaction=True)
+            pipe.delete(conv_key)
+            if counts:
+                pipe.hset(conv_key, mapping=counts)
+                pipe.expire(conv_key, self.ttl_seconds)
+            pipe.set(total_key, sum(counts.values()), ex=self.ttl_seconds)
+            pipe.execute()
+        except RedisError as exc:
+            logger.warning("Unable to seed chat unread counters for %s: %s", user_id, exc)
+
+    def seed_chat(self, db: Session, user_id: UUID) -> Dict[UUID, int]:
+        """Load a user's per-conversation unread counts from the DB and cache them."""
+        rows = db.execute(text(CHAT_UNREAD_SQL), {"user_ids": [str(user_id)]}).fetchall()
+        per_conversation = {row.conversation_id: int(row.unread) for row in rows}
+        self.set_chat_counts(user_id, per_conversation)
+        return per_conversation
+
+    # ========================================
+    # NOTIFICATIONS
+    # ========================================
+
+    def adjust_notifications(self, user_id: UUID, delta: int) -> None:
+        client = get_redis_client()
+        if not client or not delta:
+            return
+        try:
+            self._script(client, _COUNTER_ADJUST_SCRIPT)(
+                keys=[f"{self.NOTIFICATION_PREFIX}{user_id}"], args=[delta]
+            )
+        except RedisError as exc:
+            logger.warning("Unable to adjust notification unread counter for %s: %s", user_id, exc)
+
+    def get_notification_unread(self, user_id: UUID) -> Optional[int]:
+        client = get_redis_client()
+        if not client:
+            return None
+        try:
+            value = client.get(f"{self.NOTIFICATION_PREFIX}{user_id}")
+        except RedisError as exc:
+            logger.warning("Unable to read notification unread counter for %s: %s", user_id, exc)
+            return None
+        return max(0, int(value)) if value is not None else None
+
+    def set_notification_count(self, user_id: UUID, count: int) -> None:
+        client = get_redis_client()
+        if not client:
+            return
+        try:
+            client.set(f"{self.NOTIFICATION_PREFIX}{user_id}", int(count), ex=self.ttl_seconds)
+        except RedisError as exc:
+            logger.warning("Unable to seed notification unread counter for %s: %s", user_id, exc)
+
+    def seed_notifications(self, db: Session, user_id: UUID) -> int:
+        row = db.execute(text(NOTIFICATION_UNREAD_SQL), {"user_ids": [str(user_id)]}).first()
+        count = int(row.unread) if row else 0
+        self.set_notification_count(user_id, count)
+        return count
+
+    # ========================================
+    # RECONCILIATION
+    # ========================================
+
+    def _scan_user_ids(self, client, prefix: str) -> Iterable[str]:
+        for key in client.scan_iter(match=f"{prefix}*", count=500):
+            yield key[len(prefix):]
+
+    def reconcile(self, db: Session, batch_size: int = 500) -> dict:
+        """
+        Recompute every seeded counter from the database.
+
+        Only users that currently have a counter in Redis are reconciled; the
+        rest are seeded lazily on their next badge read.
+        """
+        client = get_redis_client()
+        if not client:
+            return {"chat_users": 0, "notification_users": 0, "skipped": True}
+
+        try:
+            chat_users = list(self._scan_user_ids(client, self.CHAT_TOTAL_PREFIX))
+            notification_users = list(self._scan_user_ids(client, self.NOTIFICATION_PREFIX))
+        except RedisError as exc:
+            logger.warning("Unable to scan unread counters: %s", exc)
+            return {"chat_users": 0, "notification_users": 0, "skipped": True}
+
+        for start in range(0, len(chat_users), batch_size):
+            batch = chat_users[start:start + batch_size]
+            rows = db.execute(text(CHAT_UNREAD_SQL), {"user_ids": batch}).fetchall()
+            per_user: Dict[str, Dict[UUID, int]] = {user_id: {} for user_id in batch}
+            for row in rows:
+                per_user.setdefault(str(row.user_id), {})[row.conversation_id] = int(row.unread)
+            for user_id, per_conversation in per_user.items():
+                self.set_chat_counts(user_id, per_conversation)
+
+        for start in range(0, len(notification_users), batch_size):
+            batch = notification_users[start:start + batch_size]
+            rows = db.execute(text(NOTIFICATION_UNREAD_SQL), {"user_ids": batch}).fetchall()
+            counts = {str(row.user_id): int(row.unread) for row in rows}
+            for user_id in batch:
+                self.set_notification_count(user_id, counts.get(user_id, 0))
+
+        return {
+            "chat_users": len(chat_users),
+            "notification_users": len(notification_users),
+            "skipped": False,
+        }
+
+
+unread_counter_service = UnreadCounterService()
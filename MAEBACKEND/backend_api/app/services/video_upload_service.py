@@ -0,0 +1,373 @@
+"""
+Subida de videos por bloques (reanudable) y transcodificación en Celery.
+
+Protocolo:
+1. ``POST   /v1/listings/{id}/videos/uploads``: crea la subida (upload_id)
+2. ``PATCH  /v1/listings/{id}/videos/uploads/{upload_id}``: header
+   ``Upload-Offset`` + bytes del bloque; el offset debe coincidir con el
+   guardado, si no se responde 409 con el offset actual
+3. ``HEAD`` / ``GET`` de la misma URL: offset para reanudar tras un corte
+   y avance del procesamiento
+
+El estado vive en un hash de Redis (``video_upload:{upload_id}``) con TTL
+renovado en cada bloque; los bytes se escriben en un archivo ``.part`` del
+spool compartido. Con el último byte se crea el Video (apuntando al archivo
+original, reproducible de inmediato) y se encola ``media.transcode_video``:
+probe con ffprobe, poster y rendition H.264 720p, informando el progreso en
+el mismo hash.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.exceptions import (
+    AuthorizationError, BusinessLogicError, ConflictError, NotFoundError, ValidationError
+)
+from app.core.redis_client import get_redis_client
+from app.models.listing import Listing
+from app.models.media import Video
+from app.services.image_resize_service import MEDIA_ROOT
+from app.utils.upload_spool import discard_spool_file, get_spool_directory, move_spool_file
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_KEY = "video_upload:{upload_id}"
+LOCK_KEY = "video_upload:{upload_id}:lock"
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Liberar el lock solo si sigue siendo nuestro (pudo expirar y tomarlo otro)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _video_url(path: Path) -> str:
+    return f"/media/{path.relative_to(MEDIA_ROOT).as_posix()}"
+
+
+def _video_path(url: str) -> Path:
+    return MEDIA_ROOT / url.split("?", 1)[0][len("/media/"):]
+
+
+class VideoUploadService:
+    def __init__(self):
+        self.ttl = settings.video_upload_ttl_seconds
+        self._release_lock_script = None
+
+    def _client(self):
+        client = get_redis_client()
+        if not client:
+            raise BusinessLogicError("Servicio de subida de videos no disponible")
+        return client
+
+    def _part_path(self, upload_id: str) -> Path:
+        return get_spool_directory() / f"video_{upload_id}.part"
+
+    # =====================================
+    # ESTADO
+    # =====================================
+
+    def create(self, listing_id: str, user_id: str, filename: str, size: int,
+               content_type: str, display_order: int = 0) -> Dict[str, Any]:
+        if size > settings.max_video_size:
+            raise ValidationError(
+                f"El video no puede superar {settings.max_video_size // (1024 * 1024)}MB"
+            )
+
+        upload_id = uuid.uuid4().hex
+        self._part_path(upload_id).touch()
+
+        state = {
+            "upload_id": upload_id,
+            "listing_id": str(listing_id),
+            "user_id": str(user_id),
+            "filename": Path(filename).name,
+            "content_type": content_type,
+            "size": size,
+            "offset": 0,
+            "display_order": display_order,
+            "status": "uploading",
+            "progress": 0,
+        }
+        client = self._client()
+        key = UPLOAD_KEY.format(upload_id=upload_id)
+        pipe = client.pipeline(transaction=True)
+        pipe.hset(key, mapping=state)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return self.status(state)
+
+    def get(self, upload_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+        state = self._client().hgetall(UPLOAD_KEY.format(upload_id=upload_id))
+        if not state:
+            raise NotFoundError("Subida no encontrada o expirada")
+        if user_id is not None and state.get("user_id") != str(user_id):
+            raise AuthorizationError("No tienes permiso sobre esta subida")
+        for field in ("size", "offset", "display_order"):
+            state[field] = int(state.get(field) or 0)
+        state["progress"] = float(state.get("progress") or 0)
+        return state
+
+    def status(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Estado en el formato de VideoUploadStatusResponse."""
+        expires_at = None
+        if state["status"] == "uploading":
+            ttl = self._client().ttl(UPLOAD_KEY.format(upload_id=state["upload_id"]))
+            if ttl and ttl > 0:
+                expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        return {
+            "upload_id": state["upload_id"],
+            "listing_id": state["listing_id"],
+            "filename": state["filename"],
+            "size": int(state["size"]),
+            "offset": int(state["offset"]),
+            "chunk_size": settings.video_upload_chunk_size,
+            "status": state["status"],
+            "stage": state.get("stage"),
+            "progress": float(state.get("progress") or 0),
+            "video_id": state.get("video_id"),
+            "error": state.get("error"),
+            "expires_at": expires_at,
+        }
+
+    def update_progress(self, upload_id: Optional[str], **fields: Any) -> None:
+        """Actualizar el estado del procesamiento (no-op si la subida expiró)."""
+        if not upload_id:
+            return
+        client = get_redis_client()
+        if not client:
+            return
+        key = UPLOAD_KEY.format(upload_id=upload_id)
+        try:
+            if client.exists(key):
+                client.hset(key, mapping={k: v for k, v in fields.items() if v is not None})
+        except RedisError as exc:
+            logger.warning("Unable to update video upload %s progress: %s", upload_id, exc)
+
+    def abort(self, upload_id: str, user_id: str) -> None:
+        state = self.get(upload_id, user_id)
+        if state["status"] != "uploading":
+            raise ConflictError("La subida ya se completó", {"offset": state["offset"]})
+        self._client().delete(UPLOAD_KEY.format(upload_id=upload_id))
+        discard_spool_file(self._part_path(upload_id))
+
+    # =====================================
+    # BLOQUES
+    # =====================================
+
+    def _acquire_lock(self, upload_id: str) -> str:
+        token = uuid.uuid4().hex
+        if not self._client().set(LOCK_KEY.format(upload_id=upload_id), token, nx=True, ex=300):
+            raise ConflictError("Otro bloque de esta subida está en curso")
+        return token
+
+    def _release_lock(self, upload_id: str, token: str) -> None:
+        client = self._client()
+        if self._release_lock_script is None:
+            self._release_lock_script = client.register_script(_RELEASE_LOCK_SCRIPT)
+        self._release_lock_script(keys=[LOCK_KEY.format(upload_id=upload_id)], args=[token])
+
+    async def append_chunk(self, upload_id: str, user_id: str, offset: int,
+                           chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Escribir un bloque en ``offset``. Si el cliente se corta a mitad, lo
+        recibido hasta ese momento queda confirmado y el siguiente PATCH
+        continúa desde ahí. ``state["completed"]`` indica que este bloque
+        fue el último (hay que llamar a ``complete``).
+        """
+        state = self.get(upload_id, user_id)
+        if state["status"] != "uploading":
+            raise ConflictError("La subida ya se completó", {"offset": state["offset"]})
+        if offset != state["offset"]:
+            raise ConflictError("Upload-Offset no coincide con el offset actual", {"offset": state["offset"]})
+
+        token = self._acquire_lock(upload_id)
+        try:
+            # Releer con el lock tomado: otro PATCH pudo avanzar el offset
+            # entre la comprobación anterior y el SET NX
+            state = self.get(upload_id, user_id)
+            if state["status"] != "uploading":
+                raise ConflictError("La subida ya se completó", {"offset": state["offset"]})
+            if offset != state["offset"]:
+                raise ConflictError("Upload-Offset no coincide con el offset actual", {"offset": state["offset"]})
+
+            handle = await asyncio.to_thread(open, self._part_path(upload_id), "r+b")
+            written = 0
+            try:
+                # Descartar bytes de un bloque anterior no confirmado
+                await asyncio.to_thread(handle.truncate, offset)
+                await asyncio.to_thread(handle.seek, offset)
+
+                buffer = bytearray()
+                async for chunk in chunks:
+                    if offset + written + len(buffer) + len(chunk) > state["size"]:
+                        raise ValidationError("El bloque excede el tamaño declarado del video")
+                    buffer.extend(chunk)
+                    if len(buffer) >= WRITE_BUFFER_SIZE:
+                        await asyncio.to_thread(handle.write, bytes(buffer))
+                        written += len(buffer)
+                        buffer.clear()
+                if buffer:
+                    await asyncio.to_thread(handle.write, bytes(buffer))
+                    written += len(buffer)
+            finally:
+                await asyncio.to_thread(handle.close)
+                # Confirmar lo escrito (también si el cliente se desconectó)
+                state["offset"] = offset + written
+                key = UPLOAD_KEY.format(upload_id=upload_id)
+                pipe = self._client().pipeline(transaction=True)
+                pipe.hset(key, "offset", state["offset"])
+                if state["offset"] == state["size"]:
+                    # Marcar antes de soltar el lock: solo un PATCH completa la subida
+                    state["status"] = "processing"
+                    state["completed"] = True
+                    pipe.hset(key, "status", "processing")
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+        finally:
+            self._release_lock(upload_id, token)
+
+        return state
+
+    def complete(self, db: Session, listing: Listing, state: Dict[str, Any]) -> Video:
+        """
+        Mover el archivo recibido a la carpeta de videos del listing, crear el
+        Video y encolar la transcodificación.
+        """
+        from app.tasks.media_tasks import transcode_video_task
+
+        upload_id = state["upload_id"]
+        extension = Path(state["filename"]).suffix.lower() or ".mp4"
+        videos_dir = MEDIA_ROOT / "listings" / str(listing.id) / "videos"
+        video_path = move_spool_file(self._part_path(upload_id), videos_dir / f"video_{upload_id}{extension}")
+
+        video = self.register_video(db, listing, video_path, state["display_order"])
+        self.update_progress(
+            upload_id, status="processing", stage="queued", progress=0, video_id=str(video.id)
+        )
+        transcode_video_task.delay(str(video.id), upload_id)
+        return video
+
+    def register_video(self, db: Session, listing: Listing, video_path: Path,
+                       display_order: int = 0) -> Video:
+        """Crear el Video de un archivo ya guardado; los metadatos los completa el transcodificado."""
+        is_main = db.query(Video).filter(Video.listing_id == listing.id).count() == 0
+        video = Video(
+            listing_id=listing.id,
+            listing_created_at=listing.created_at,
+            filename=video_path.name,
+            original_url=_video_url(video_path),
+            display_order=display_order,
+            file_size=video_path.stat().st_size,
+            is_main=is_main,
+        )
+        db.add(video)
+        if not listing.has_media:
+            listing.has_media = True
+        db.commit()
+        db.refresh(video)
+        return video
+
+    # =====================================
+    # TRANSCODIFICACIÓN (worker de Celery)
+    # =====================================
+
+    def process_video(self, db: Session, video_id: str, upload_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Probe, poster y rendition H.264 del video. Si la transcodificación
+        falla el video sigue publicado con el archivo original.
+        """
+        from app.utils.media_utils import video_processor
+
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if not video:
+            raise NotFoundError("Video no encontrado")
+        source = _video_path(video.original_url)
+
+        # 1. Metadatos
+        self.update_progress(upload_id, stage="probe", progress=1)
+        info = video_processor.get_video_info(source)
+        if not info.get("success"):
+            raise BusinessLogicError(f"No se pudo analizar el video: {info.get('error')}")
+        duration = info.get("duration") or 0
+        video.duration_seconds = int(round(duration))
+        video.width = info["video"].get("width")
+        video.height = info["video"].get("height")
+        db.commit()
+
+        # 2. Poster (cerca del inicio, dentro de la duración)
+        self.update_progress(upload_id, stage="poster", progress=5)
+        poster_path = source.parent / "thumbs" / f"{source.stem}_poster.jpg"
+        poster_path.parent.mkdir(parents=True, exist_ok=True)
+        timestamp = "00:00:01" if duration >= 2 else "00:00:00"
+        if video_processor.extract_thumbnail(source, poster_path, timestamp=timestamp, size="1280x720"):
+            video.thumbnail_url = _video_url(poster_path)
+            db.commit()
+
+        # 3. Rendition H.264 (el avance ocupa del 10% al 100%)
+        self.update_progress(upload_id, stage="transcode", progress=10)
+        target_height = settings.video_transcode_height
+        output_path = source.with_name(f"{source.stem}_{target_height}p.mp4")
+        last_reported = [10.0]
+
+        def report(percent: float) -> None:
+            overall = 10 + percent * 0.9
+            if overall - last_reported[0] >= 1:
+                last_reported[0] = overall
+                self.update_progress(upload_id, progress=round(overall, 1))
+
+        result = video_processor.compress_video(
+            source, output_path,
+            max_height=target_height,
+            duration=duration,
+            progress_callback=report,
+            timeout=settings.video_transcode_timeout_seconds,
+        )
+        if not result.get("success"):
+            output_path.unlink(missing_ok=True)
+            raise BusinessLogicError(f"Transcodificación fallida: {result.get('error')}")
+
+        output_info = video_processor.get_video_info(output_path)
+        video.original_url = _video_url(output_path)
+        video.filename = output_path.name
+        video.file_size = output_path.stat().st_size
+        if output_info.get("success"):
+            video.width = output_info["video"].get("width")
+            video.height = output_info["video"].get("height")
+        db.commit()
+        source.unlink(missing_ok=True)
+
+        self.update_progress(upload_id, status="ready", stage="done", progress=100)
+        return {
+            "video_id": str(video.id),
+            "original_url": video.original_url,
+            "thumbnail_url": video.thumbnail_url,
+            "duration_seconds": video.duration_seconds,
+            "compression_ratio": result.get("compression_ratio"),
+        }
+
+
+    def mark_transcode_failed(self, db: Session, video_id: str, upload_id: Optional[str], error: str) -> None:
+        """
+        Si el archivo original sigue publicado el video es reproducible: se
+        informa ``ready`` con ``stage="degraded"`` (sin rendition ni poster)
+        en lugar de ``failed``.
+        """
+        video = db.query(Video).filter(Video.id == video_id).first()
+        if video and _video_path(video.original_url).exists():
+            self.update_progress(upload_id, status="ready", stage="degraded", progress=100, error=error)
+        else:
+            self.update_progress(upload_id, status="failed", error=error)
+
+
+video_upload_service = VideoUploadService()
@@ -0,0 +1,18 @@
+import logging
+
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="bookings.process_payment_deadlines")
+def process_payment_deadlines_task(batch_size: int | None = None) -> dict:
+    """Drain due payment-deadline events (reminders and expiries) from Redis."""
+    db = SessionLocal()
+    try:
+        from app.services.booking_scheduler import BookingScheduledTasks
+
+        return BookingScheduledTasks.process_due_payment_deadlines(db, batch_size=batch_size)
+    finally:
+        db.close()
@@ -0,0 +1,103 @@
+import logging
+
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="chat.flush_presence_last_seen")
+def flush_presence_last_seen_task() -> dict:
+    """Persist last_seen timestamps buffered in Redis to chat.user_presence."""
+    db = SessionLocal()
+    try:
+        from app.services.presence_service import presence_service
+
+        flushed = presence_service.flush_last_seen(db)
+        return {"flushed": flushed}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="chat.notify_offline_message")
+def notify_offline_message_task(
+    message_id: str,
+    conversation_id: str,
+    sender_id: str,
+    recipient_id: str,
+    preview: str,
+) -> dict:
+    """
+    Notify (in-app/email/push) a recipient who was offline when a chat message
+    was sent. Runs outside the send path so the sender's ack and the
+    WebSocket fan-out never wait on notification delivery.
+    """
+    from app.services.presence_service import presence_service
+
+    # El destinatario pudo conectarse mientras la tarea esperaba en la cola
+    if presence_service.is_online(recipient_id):
+        return {"notified": False, "reason": "online"}
+
+    db = SessionLocal()
+    try:
+        from sqlalchemy import text
+
+        from app.models.auth import User
+        from app.models.notification import DeliveryMethod, NotificationPriority, NotificationType
+        from app.schemas.notifications import NotificationCreate
+        from app.services.notification_service import NotificationService
+
+        # Una sola notificación pendiente por conversación: si ya hay una sin
+        # leer no se vuelve a notificar por cada mensaje
+        pending = db.execute(
+            text(
+                """
+                SELECT 1 FROM core.notifications
+                WHERE user_id = :user_id
+                  AND notification_type = 'message'
+                  AND related_entity_id = :conversation_id
+                  AND read_at IS NULL
+                LIMIT 1
+                """
+            ),
+            {"user_id": recipient_id, "conversation_id": conversation_id},
+        ).first()
+        if pending:
+            return {"notified": False, "reason": "pending"}
+
+        sender = db.query(User).filter(User.id == sender_id).first()
+        sender_name = (
+            f"{sender.first_name or ''} {sender.last_name or ''}".strip() or sender.email
+            if sender else "Un usuario"
+        )
+
+        NotificationService(db).create_notification(
+            NotificationCreate(
+                user_id=recipient_id,
+                notification_type=NotificationType.MESSAGE,
+                category="chat_message",
+                title=f"💬 Nuevo mensaje de {sender_name}",
+                message=preview,
+                summary=f"Mensaje de {sender_name}",
+                priority=NotificationPriority.MEDIUM,
+                related_entity_type="conversation",
+                related_entity_id=conversation_id,
+                action_url=f"/messages/{conversation_id}",
+                action_data={
+                    "conversation_id": conversation_id,
+                    "message_id": message_id,
+                    "sender_id": sender_id,
+                },
+                delivery_methods=[
+                    DeliveryMethod.IN_APP.value,
+                    DeliveryMethod.EMAIL.value,
+                    DeliveryMethod.PUSH.value,
+                ],
+            )
+        )
+        return {"notified": True}
+    except Exception as exc:
+        logger.error(f"Error notifying offline recipient {recipient_id} of message {message_id}: {exc}")
+        raise
+    finally:
+        db.close()
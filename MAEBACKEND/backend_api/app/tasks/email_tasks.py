@@ -1,11 +1,21 @@
 import logging
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.services.email_service import EmailService
 
 logger = logging.getLogger(__name__)
 
 
+# Métodos de EmailService habilitados para envío masivo (kind -> método)
+BULK_EMAIL_METHODS = {
+    "payment_expired": "send_payment_expired_notification",
+    "payment_deadline_reminder": "send_payment_deadline_reminder",
+    "payment_request": "send_payment_request_email",
+    "booking_request": "send_booking_request_notification",
+}
+
+
 @celery_app.task(name="email.send_booking_request")
 def send_booking_request_email_task(payload: dict) -> bool:
     service = EmailService()
@@ -48,3 +58,49 @@ def send_generic_notification_email_task(payload: dict) -> bool:
         html_content=html_content,
         text_content=text_content,
     )
+
+
+@celery_app.task(name="email.send_bulk")
+def send_bulk_email_task(kind: str, payloads: list[dict]) -> dict:
+    """Send a batch of same-kind emails over a single reused SMTP connection."""
+    method_name = BULK_EMAIL_METHODS.get(kind)
+    if not method_name:
+        logger.warning("Invalid bulk email kind: %s", kind)
+        return {"kind": kind, "sent": 0, "failed": len(payloads)}
+
+    service = EmailService()
+    send = getattr(service, method_name)
+
+    sent = 0
+    failed = 0
+    with service.smtp_session():
+        for payload in payloads:
+            try:
+                ok = send(**payload)
+            except Exception:
+                logger.exception("Error sending bulk email (%s)", kind)
+                ok = False
+
+            if ok:
+                sent += 1
+            else:
+                failed += 1
+
+    return {"kind": kind, "sent": sent, "failed": failed}
+
+
+def enqueue_bulk_emails(kind: str, payloads: list[dict], chunk_size: int | None = None) -> int:
+    """Enqueue payloads as ``send_bulk_email_task`` chunks; returns the number enqueued."""
+    if not payloads:
+        return 0
+
+    chunk_size = max(1, chunk_size or settings.email_bulk_chunk_size)
+    enqueued = 0
+    for start in range(0, len(payloads), chunk_size):
+        chunk = payloads[start:start + chunk_size]
+        try:
+            send_bulk_email_task.delay(kind, chunk)
+            enqueued += len(chunk)
+        except Exception as exc:
+            logger.error("Error enqueuing bulk email chunk (%s): %s", kind, exc)
+    return enqueued
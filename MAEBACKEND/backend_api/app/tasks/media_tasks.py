@@ -5,6 +5,7 @@ from datetime import datetime
 from app.core.celery_app import celery_app
 from app.core.database import SessionLocal
 from app.services.media_service import MediaService
+from app.utils.upload_spool import discard_spool_file
 
 logger = logging.getLogger(__name__)
 
@@ -14,22 +15,29 @@ def process_image_upload_task(
     listing_id: str,
     listing_created_at: str,
     filename: str,
-    file_data_b64: str,
+    spool_path: str | None = None,
     alt_text: str | None = None,
+    file_data_b64: str | None = None,
 ) -> dict:
-    """Process and persist an uploaded image asynchronously."""
+    """
+    Process and persist an uploaded image asynchronously.
+
+    The API streams the upload to a spool file on the shared uploads volume
+    and only passes its path; the spool file is removed once processed.
+    ``file_data_b64`` is kept only for messages queued by older API versions.
+    """
     db = SessionLocal()
     try:
         service = MediaService(db)
-        file_data = base64.b64decode(file_data_b64)
         created_at = datetime.fromisoformat(listing_created_at)
 
         image = service.create_image(
             listing_id=listing_id,
             listing_created_at=created_at,
-            file_data=file_data,
+            file_data=base64.b64decode(file_data_b64) if file_data_b64 else None,
             filename=filename,
             alt_text=alt_text,
+            source_path=spool_path,
         )
 
         return {
@@ -46,5 +54,104 @@ def process_image_upload_task(
             "filename": filename,
             "error": str(exc),
         }
+    finally:
+        discard_spool_file(spool_path)
+        db.close()
+
+
+@celery_app.task(name="media.generate_image_renditions")
+def generate_image_renditions_task(file_path: str) -> dict:
+    """Write WebP/AVIF siblings for an image stored as-is by the upload endpoint."""
+    from app.services.image_renditions import generate_renditions_for_file
+
+    try:
+        formats = generate_renditions_for_file(file_path)
+        return {"success": True, "file_path": file_path, "formats": formats}
+    except FileNotFoundError:
+        # La imagen se eliminó antes de procesarse
+        return {"success": False, "file_path": file_path, "error": "not_found"}
+    except Exception as exc:
+        logger.exception("Error generating renditions for %s", file_path)
+        return {"success": False, "file_path": file_path, "error": str(exc)}
+
+
+@celery_app.task(name="media.backfill_image_phash")
+def backfill_image_phash_task(after_id: str | None = None, batch_size: int | None = None) -> dict:
+    """
+    Compute perceptual hashes for images stored before pHash existed.
+
+    Processes one batch in id order and re-enqueues itself with the last id
+    until no images without pHash remain.
+    """
+    from app.services.image_similarity_service import ImageSimilarityService
+
+    db = SessionLocal()
+    try:
+        result = ImageSimilarityService(db).backfill(after_id=after_id, batch_size=batch_size)
+    except Exception as exc:
+        logger.exception("Error backfilling image pHash after %s", after_id)
+        return {"success": False, "after_id": after_id, "error": str(exc)}
+    finally:
+        db.close()
+
+    if not result["done"]:
+        backfill_image_phash_task.delay(after_id=result["last_id"], batch_size=batch_size)
+    return {"success": True, **result}
+
+
+@celery_app.task(name="media.transcode_video")
+def transcode_video_task(video_id: str, upload_id: str | None = None) -> dict:
+    """
+    Probe, poster frame and H.264 rendition for an uploaded video.
+
+    Runs ffprobe/ffmpeg off the request path; progress is written to the
+    upload state in Redis when ``upload_id`` is given.
+    """
+    from app.models.listing import Listing
+    from app.models.media import Video
+    from app.services.api_cache_service import api_cache_service
+    from app.services.video_upload_service import video_upload_service
+
+    db = SessionLocal()
+    try:
+        result = video_upload_service.process_video(db, video_id, upload_id)
+        return {"success": True, **result}
+    except Exception as exc:
+        logger.exception("Error transcoding video %s", video_id)
+        db.rollback()
+        video_upload_service.mark_transcode_failed(db, video_id, upload_id, str(exc))
+        return {"success": False, "video_id": video_id, "error": str(exc)}
+    finally:
+        video = db.query(Video).filter(Video.id == video_id).first()
+        listing = db.query(Listing).filter(Listing.id == video.listing_id).first() if video else None
+        if listing:
+            api_cache_service.invalidate_listing_detail(listing_id=str(listing.id), slug=listing.slug)
+        db.close()
+
+
+@celery_app.task(name="media.process_direct_upload")
+def process_direct_upload_task(upload_id: str) -> dict:
+    """
+    Download a file the client PUT directly to S3/MinIO and process it like
+    a regular upload. The API only verified the object and queued this task.
+    """
+    from app.models.listing import Listing
+    from app.services.api_cache_service import api_cache_service
+    from app.services.direct_upload_service import direct_upload_service
+    from app.services.search_cache_service import search_cache_service
+
+    db = SessionLocal()
+    try:
+        result = direct_upload_service.process(db, upload_id)
+        listing = db.query(Listing).filter(Listing.id == result["listing_id"]).first()
+        if listing:
+            api_cache_service.invalidate_listing_detail(listing_id=str(listing.id), slug=listing.slug)
+            search_cache_service.invalidate_on_listing_change("process_direct_upload")
+        return {"success": True, **result}
+    except Exception as exc:
+        logger.exception("Error processing direct upload %s", upload_id)
+        db.rollback()
+        direct_upload_service.mark_failed(upload_id, str(exc))
+        return {"success": False, "upload_id": upload_id, "error": str(exc)}
     finally:
         db.close()
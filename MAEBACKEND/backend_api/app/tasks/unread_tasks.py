@@ -0,0 +1,20 @@
+import logging
+
+from app.core.celery_app import celery_app
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="unread.reconcile_counters")
+def reconcile_unread_counters_task(batch_size: int = 500) -> dict:
+    """Recompute cached chat/notification unread counters from the database."""
+    db = SessionLocal()
+    try:
+        from app.services.unread_counter_service import unread_counter_service
+
+        result = unread_counter_service.reconcile(db, batch_size=batch_size)
+        logger.info("Unread counters reconciled: %s", result)
+        return result
+    finally:
+        db.close()
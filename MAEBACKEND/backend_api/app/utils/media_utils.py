@@ -7,13 +7,94 @@ import os
 import logging
 import subprocess
 from pathlib import Path
-from typing import Dict, Tuple, Optional, List, Any
-from PIL import Image, ImageFilter, ImageEnhance, ImageDraw, ImageFont
+from typing import Callable, Dict, Tuple, Optional, List, Any
+from PIL import Image, ImageFilter, ImageEnhance, ImageDraw, ImageFont, ImageOps
 import hashlib
 import mimetypes
 
 logger = logging.getLogger(__name__)
 
+
+# =====================================
+# HASH PERCEPTUAL (near-duplicates)
+# =====================================
+
+PHASH_BITS = 64
+
+
+def compute_phash(img: Image.Image) -> Optional[int]:
+    """
+    pHash de 64 bits como entero con signo (cabe en un BIGINT de Postgres).
+    Para JPEG sin decodificar aún se usa la escala DCT mínima: el hash solo
+    necesita una versión de 32x32 de la imagen.
+    """
+    try:
+        import imagehash
+    except ImportError:
+        logger.warning("imagehash library not available for perceptual hashing")
+        return None
+    
+    if img.format == 'JPEG':
+        img.draft('L', (64, 64))
+    value = int(str(imagehash.phash(img)), 16)
+    return value - (1 << PHASH_BITS) if value >= 1 << (PHASH_BITS - 1) else value
+
+
+def compute_upright_phash(img: Image.Image) -> Optional[int]:
+    """
+    pHash con la orientación EXIF aplicada. Todas las rutas (subida a
+    listings, subida a media, backfill) deben usarlo: una foto girada por
+    EXIF da el mismo hash esté guardada cruda o ya rotada.
+    """
+    if img.format == 'JPEG':
+        img.draft('L', (64, 64))
+    return compute_phash(ImageOps.exif_transpose(img))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << PHASH_BITS) - 1)).count('1')
+
+
+class BKTree:
+    """
+    BK-tree sobre distancia de Hamming: búsqueda de hashes a distancia <= k
+    sin comparar contra todos (desigualdad triangular poda las ramas).
+    """
+    
+    def __init__(self):
+        self._root: Optional[Tuple[int, List[Any], Dict[int, Any]]] = None
+    
+    def add(self, value: int, item: Any) -> None:
+        if self._root is None:
+            self._root = (value, [item], {})
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, [item], {})
+                return
+            node = child
+    
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """Items a distancia <= max_distance como (distancia, item)."""
+        results = []
+        pending = [self._root] if self._root else []
+        while pending:
+            node = pending.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, item) for item in node[1])
+            for edge, child in node[2].items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    pending.append(child)
+        return results
+
+
 class ImageProcessor:
     """
     Procesador avanzado de imágenes con funcionalidades de optimización,
@@ -159,41 +240,46 @@ class ImageProcessor:
             logger.error(f"Error adding watermark to {image_path}: {e}")
             return False
     
-    def detect_duplicates(self, image_paths: List[Path]) -> List[List[Path]]:
+    def detect_duplicates(self, image_paths: List[Path], max_distance: int = 0) -> List[List[Path]]:
         """
         Detecta imágenes duplicadas usando hashing perceptual
         
         Args:
             image_paths: Lista de rutas de imágenes
+            max_distance: Distancia de Hamming máxima entre pHash para
+                considerarlas duplicadas (0 = hash idéntico)
             
         Returns:
             Lista de grupos de imágenes duplicadas
         """
         try:
-            import imagehash  # Requiere pillow-simd o imagehash
-            
-            hashes = {}
+            tree = BKTree()
+            hashes = []
             for path in image_paths:
                 try:
                     with Image.open(path) as img:
                         # Hash perceptual para detectar imágenes similares
-                        phash = str(imagehash.phash(img))
-                        
-                        if phash not in hashes:
-                            hashes[phash] = []
-                        hashes[phash].append(path)
-                        
+                        phash = compute_upright_phash(img)
+                    if phash is None:
+                        return []
+                    tree.add(phash, path)
+                    hashes.append((phash, path))
                 except Exception as e:
                     logger.warning(f"Could not hash image {path}: {e}")
             
-            # Retornar solo grupos con más de una imagen
-            duplicates = [group for group in hashes.values() if len(group) > 1]
+            # Agrupar cada imagen con sus vecinas (cada imagen en un solo grupo)
+            grouped = set()
+            duplicates = []
+            for phash, path in hashes:
+                if path in grouped:
+                    continue
+                group = [match for _, match in tree.search(phash, max_distance) if match not in grouped]
+                if len(group) > 1:
+                    grouped.update(group)
+                    duplicates.append(group)
             
             return duplicates
             
-        except ImportError:
-            logger.warning("imagehash library not available for duplicate detection")
-            return []
         except Exception as e:
             logger.error(f"Error detecting duplicates: {e}")
             return []
@@ -325,7 +411,10 @@ class VideoProcessor:
             return False
     
     def compress_video(self, video_path: Path, output_path: Path,
-                      quality: str = 'medium') -> Dict[str, Any]:
+                      quality: str = 'medium', max_height: Optional[int] = None,
+                      duration: Optional[float] = None,
+                      progress_callback: Optional[Callable[[float], None]] = None,
+                      timeout: int = 300) -> Dict[str, Any]:
         """
         Comprime video para web manteniendo calidad aceptable
         
@@ -333,6 +422,10 @@ class VideoProcessor:
             video_path: Video original
             output_path: Video comprimido
             quality: Nivel de calidad (low, medium, high)
+            max_height: Alto máximo (p.ej. 720); nunca se agranda el original
+            duration: Duración en segundos, para calcular el progreso
+            progress_callback: Recibe el progreso (0-100) mientras codifica
+            timeout: Segundos máximos de codificación
             
         Returns:
             Dict con información del procesamiento
@@ -355,6 +448,7 @@ class VideoProcessor:
             cmd = [
                 'ffmpeg', '-i', str(video_path),
                 '-c:v', 'libx264',
+                '-pix_fmt', 'yuv420p',
                 '-crf', str(settings['crf']),
                 '-preset', settings['preset'],
                 '-maxrate', settings['max_bitrate'],
@@ -362,13 +456,19 @@ class VideoProcessor:
                 '-c:a', 'aac',
                 '-b:a', '128k',
                 '-movflags', '+faststart',  # Optimización para web
-                '-y',
-                str(output_path)
             ]
+            if max_height:
+                # Alto par requerido por H.264; ancho proporcional
+                cmd += ['-vf', f"scale=-2:'min({max_height},ih)'"]
+            cmd += ['-y', str(output_path)]
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+            if progress_callback and duration:
+                returncode, stderr = self._run_with_progress(cmd, duration, progress_callback, timeout)
+            else:
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+                returncode, stderr = result.returncode, result.stderr
             
-            if result.returncode == 0 and output_path.exists():
+            if returncode == 0 and output_path.exists():
                 new_size = output_path.stat().st_size
                 compression_ratio = (1 - new_size / original_size) * 100
                 
@@ -382,13 +482,47 @@ class VideoProcessor:
             else:
                 return {
                     'success': False,
-                    'error': f'Compression failed: {result.stderr}'
+                    'error': f'Compression failed: {stderr}'
                 }
                 
         except Exception as e:
             logger.error(f"Error compressing video {video_path}: {e}")
             return {'success': False, 'error': str(e)}
     
+    def _run_with_progress(self, cmd: List[str], duration: float,
+                           progress_callback: Callable[[float], None],
+                           timeout: int) -> Tuple[int, str]:
+        """
+        Ejecuta ffmpeg leyendo ``-progress`` por stdout para informar el
+        avance. stderr va a un archivo temporal (un pipe sin leer podría
+        bloquear a ffmpeg).
+        """
+        import tempfile
+        import time
+        
+        cmd = cmd[:1] + ['-progress', 'pipe:1', '-nostats'] + cmd[1:]
+        started = time.monotonic()
+        
+        with tempfile.TemporaryFile(mode='w+') as stderr_file:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+            try:
+                for line in process.stdout:
+                    key, _, value = line.strip().partition('=')
+                    # out_time_us (out_time_ms en ffmpeg antiguos, también en µs)
+                    if key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                        progress_callback(min(100.0, int(value) / 1_000_000 / duration * 100))
+                    if time.monotonic() - started > timeout:
+                        process.kill()
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+                returncode = process.wait(timeout=max(1, timeout - (time.monotonic() - started)))
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+            
+            stderr_file.seek(0)
+            return returncode, stderr_file.read()[-4000:]
+    
     def _parse_fraction(self, fraction_str: str) -> float:
         """Convierte fracción string a float (ej: '30/1' -> 30.0)"""
         try:
@@ -0,0 +1,132 @@
+"""
+Volcado en streaming de archivos subidos a disco.
+Copia el UploadFile por bloques a un archivo de spool con límite de tamaño,
+de modo que la memoria por subida es constante y el procesamiento posterior
+(endpoint o Celery) recibe solo la ruta del archivo.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+class UploadTooLargeError(ValueError):
+    """El archivo supera el tamaño máximo permitido."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        super().__init__(f"File too large. Max size: {max_bytes / (1024 * 1024):.1f}MB")
+
+
+def get_spool_directory() -> Path:
+    """
+    Directorio de spool compartido entre la API y los workers de Celery
+    (``{upload_path}/temp``, montado en ambos contenedores).
+    """
+    directory = Path(settings.upload_path) / "temp"
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def _copy_limited(source: BinaryIO, destination: Path, max_bytes: int, chunk_size: int) -> int:
+    written = 0
+    with open(destination, "wb") as output:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            output.write(chunk)
+    return written
+
+
+async def spool_upload(
+    upload: UploadFile,
+    max_bytes: int,
+    directory: Optional[Path] = None,
+    suffix: str = "",
+    chunk_size: Optional[int] = None,
+) -> Tuple[Path, int]:
+    """
+    Copiar un UploadFile a un archivo de spool por bloques.
+
+    La copia corre en el threadpool (una sola transición) y se corta en
+    cuanto se supera ``max_bytes``, sin leer el resto del archivo.
+
+    Args:
+        upload: Archivo recibido por FastAPI
+        max_bytes: Tamaño máximo permitido
+        directory: Directorio destino (por defecto el spool compartido)
+        suffix: Extensión del archivo de spool
+        chunk_size: Tamaño de bloque (por defecto ``upload_spool_chunk_size``)
+
+    Returns:
+        Tuple[Path, int]: (ruta del archivo de spool, bytes escritos)
+
+    Raises:
+        UploadTooLargeError: Si el archivo supera ``max_bytes``
+    """
+    directory = directory or get_spool_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    os.close(fd)
+    path = Path(name)
+
+    try:
+        await upload.seek(0)
+        size = await run_in_threadpool(
+            _copy_limited,
+            upload.file,
+            path,
+            max_bytes,
+            chunk_size or settings.upload_spool_chunk_size,
+        )
+    except BaseException:
+        discard_spool_file(path)
+        raise
+
+    return path, size
+
+
+def read_file_header(path: Path, length: int = 16) -> bytes:
+    """Primeros bytes del archivo (magic bytes) sin cargarlo completo."""
+    with open(path, "rb") as handle:
+        return handle.read(length)
+
+
+def hash_file(path: Path, chunk_size: Optional[int] = None) -> str:
+    """SHA-256 (hex) del archivo leyendo por bloques."""
+    digest = hashlib.sha256()
+    chunk_size = chunk_size or settings.upload_spool_chunk_size
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def move_spool_file(path: Path, destination: Path) -> Path:
+    """Mover el archivo de spool a su ubicación final (rename si es el mismo FS)."""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(path, destination)
+    except OSError:
+        shutil.move(str(path), str(destination))
+    return destination
+
+
+def discard_spool_file(path: Optional[Path]) -> None:
+    if not path:
+        return
+    try:
+        Path(path).unlink()
+    except FileNotFoundError:
+        pass
@@ -23,6 +23,13 @@ run_case "search_read_heavy" "${ROOT_DIR}/scenarios/k6-search-read-heavy.js"
 run_case "listing_detail_read_heavy" "${ROOT_DIR}/scenarios/k6-listing-detail-read-heavy.js"
 run_case "mixed_crud_listings" "${ROOT_DIR}/scenarios/k6-mixed-crud-listings.js"
 
+# El escenario de chat necesita conversaciones y tokens de sus participantes
+if [[ -n "${CONVERSATION_IDS:-}${CONVERSATION_ID:-}" && -n "${AUTH_TOKENS:-}${AUTH_TOKEN:-}" ]]; then
+  run_case "chat_websocket" "${ROOT_DIR}/scenarios/k6-chat-websocket.js"
+else
+  echo "[baseline] Skipping chat_websocket (set CONVERSATION_IDS and AUTH_TOKENS)"
+fi
+
 python3 "${ROOT_DIR}/tools/generate_baseline_report.py" \
   --input-dir "${OUT_DIR}" \
   --output-md "${OUT_DIR}/BASELINE_REPORT.md" \
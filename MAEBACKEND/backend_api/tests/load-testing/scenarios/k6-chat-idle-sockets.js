@@ -0,0 +1,62 @@
+import ws from 'k6/ws';
+import { check } from 'k6';
+import { Counter, Trend } from 'k6/metrics';
+import { API_PREFIX, BASE_URL, requiredEnv } from './_common.js';
+
+// Abre N sockets de chat y los mantiene inactivos (solo ping periódico) para
+// verificar que un socket abierto no retiene conexiones del pool de BD.
+const CONVERSATION_ID = requiredEnv('CONVERSATION_ID');
+const AUTH_TOKEN = requiredEnv('AUTH_TOKEN');
+const SOCKETS = Number(__ENV.SOCKETS || 200);
+const HOLD_SECONDS = Number(__ENV.HOLD_SECONDS || 60);
+const PING_INTERVAL_SECONDS = Number(__ENV.PING_INTERVAL_SECONDS || 20);
+
+const wsConnectDuration = new Trend('ws_connect_duration', true);
+const wsConnectErrors = new Counter('ws_connect_errors');
+
+export const options = {
+  scenarios: {
+    chat_idle_sockets: {
+      executor: 'per-vu-iterations',
+      vus: SOCKETS,
+      iterations: 1,
+      maxDuration: `${HOLD_SECONDS + 60}s`,
+    },
+  },
+  thresholds: {
+    ws_connect_errors: ['count<1'],
+  },
+};
+
+function wsUrl() {
+  const base = BASE_URL.replace(/^http/, 'ws');
+  return `${base}${API_PREFIX}/ws/chat/${CONVERSATION_ID}?token=${encodeURIComponent(AUTH_TOKEN)}`;
+}
+
+export default function () {
+  const startedAt = Date.now();
+
+  const response = ws.connect(wsUrl(), {}, (socket) => {
+    socket.on('open', () => {
+      wsConnectDuration.add(Date.now() - startedAt);
+      socket.setInterval(() => socket.send(JSON.stringify({ type: 'ping' })), PING_INTERVAL_SECONDS * 1000);
+      socket.setTimeout(() => socket.close(), HOLD_SECONDS * 1000);
+    });
+    socket.on('error', () => wsConnectErrors.add(1));
+  });
+
+  const ok = check(response, {
+    'chat socket upgraded': (r) => r && r.status === 101,
+  });
+  if (!ok) {
+    wsConnectErrors.add(1);
+  }
+}
+
+export function handleSummary(data) {
+  const resultFile = __ENV.RESULT_FILE || 'results/baseline/chat-idle-sockets.json';
+  return {
+    [resultFile]: JSON.stringify(data, null, 2),
+    stdout: `chat-idle-sockets finished | sockets=${SOCKETS} hold=${HOLD_SECONDS}s`,
+  };
+}
@@ -0,0 +1,211 @@
+import http from 'k6/http';
+import ws from 'k6/ws';
+import { check, sleep } from 'k6';
+import { Counter, Trend } from 'k6/metrics';
+import { API_PREFIX, BASE_URL, safeJson } from './_common.js';
+
+// Abre SOCKETS WebSockets de chat repartidos entre las conversaciones y
+// participantes indicados e intercambia frames message/typing/read a ritmo
+// configurable (por socket y minuto). Un VU monitor muestrea /chat/health,
+// que responde con memoria RSS y checkouts del pool del worker que atiende.
+//
+// La latencia de fan-out se mide con client_message_id = "<vu>:<seq>:<ms>":
+// el servidor lo devuelve en el evento "message" a todos los sockets de la
+// conversación (para el emisor es su ack).
+function listEnv(pluralName, singularName) {
+  const raw = __ENV[pluralName] || __ENV[singularName] || '';
+  const values = raw.split(',').map((v) => v.trim()).filter(Boolean);
+  if (!values.length) {
+    throw new Error(`Missing required env var: ${pluralName} (o ${singularName})`);
+  }
+  return values;
+}
+
+const CONVERSATION_IDS = listEnv('CONVERSATION_IDS', 'CONVERSATION_ID');
+const AUTH_TOKENS = listEnv('AUTH_TOKENS', 'AUTH_TOKEN');
+const SOCKETS = Number(__ENV.SOCKETS || 1000);
+const RAMP_SECONDS = Number(__ENV.RAMP_SECONDS || 60);
+const HOLD_SECONDS = Number(__ENV.HOLD_SECONDS || 180);
+const MESSAGES_PER_MINUTE = Number(__ENV.MESSAGES_PER_MINUTE || 2);
+const TYPING_PER_MINUTE = Number(__ENV.TYPING_PER_MINUTE || 6);
+const READS_PER_MINUTE = Number(__ENV.READS_PER_MINUTE || 2);
+const PING_INTERVAL_SECONDS = Number(__ENV.PING_INTERVAL_SECONDS || 30);
+const MONITOR_INTERVAL_SECONDS = Number(__ENV.MONITOR_INTERVAL_SECONDS || 2);
+
+const TOTAL_SECONDS = RAMP_SECONDS + HOLD_SECONDS;
+
+const wsConnectDuration = new Trend('ws_connect_duration', true);
+const wsConnectErrors = new Counter('ws_connect_errors');
+const chatFanoutDuration = new Trend('chat_fanout_duration', true);
+const chatAckDuration = new Trend('chat_ack_duration', true);
+const chatMessagesSent = new Counter('chat_messages_sent');
+const chatMessagesReceived = new Counter('chat_messages_received');
+const chatErrorFrames = new Counter('chat_error_frames');
+const dbPoolCheckedout = new Trend('chat_db_pool_checkedout');
+const workerRssMb = new Trend('chat_worker_rss_mb');
+const workerQueuedMessages = new Trend('chat_worker_queued_messages');
+
+export const options = {
+  scenarios: {
+    chat_sockets: {
+      executor: 'per-vu-iterations',
+      exec: 'chatSocket',
+      vus: SOCKETS,
+      iterations: 1,
+      maxDuration: `${TOTAL_SECONDS + 60}s`,
+    },
+    server_monitor: {
+      executor: 'constant-vus',
+      exec: 'monitorServer',
+      vus: 1,
+      duration: `${TOTAL_SECONDS}s`,
+    },
+  },
+  thresholds: {
+    ws_connect_errors: [`count<${Math.max(1, Math.ceil(SOCKETS * 0.01))}`],
+    chat_fanout_duration: ['p(95)<500', 'p(99)<1000'],
+    chat_error_frames: ['count<1'],
+  },
+  summaryTrendStats: ['avg', 'min', 'med', 'max', 'p(90)', 'p(95)', 'p(99)'],
+};
+
+function wsUrl(conversationId, token) {
+  const base = BASE_URL.replace(/^http/, 'ws');
+  return `${base}${API_PREFIX}/ws/chat/${conversationId}?token=${encodeURIComponent(token)}`;
+}
+
+// Arranca un timer periódico con desfase aleatorio para no sincronizar
+// todos los sockets en el mismo instante.
+function every(socket, perMinute, fn) {
+  if (perMinute <= 0) {
+    return;
+  }
+  const intervalMs = 60000 / perMinute;
+  socket.setTimeout(() => {
+    fn();
+    socket.setInterval(fn, intervalMs);
+  }, Math.random() * intervalMs);
+}
+
+export function chatSocket() {
+  const index = __VU - 1;
+  const conversationId = CONVERSATION_IDS[index % CONVERSATION_IDS.length];
+  const token = AUTH_TOKENS[Math.floor(index / CONVERSATION_IDS.length) % AUTH_TOKENS.length];
+
+  // Rampa de conexiones: cada VU espera su turno dentro de RAMP_SECONDS
+  sleep((index / SOCKETS) * RAMP_SECONDS);
+  const holdMs = (TOTAL_SECONDS - (index / SOCKETS) * RAMP_SECONDS) * 1000;
+
+  let sequence = 0;
+  let lastReceivedId = null;
+  const startedAt = Date.now();
+
+  const response = ws.connect(wsUrl(conversationId, token), {}, (socket) => {
+    socket.on('open', () => {
+      wsConnectDuration.add(Date.now() - startedAt);
+
+      socket.setInterval(() => socket.send(JSON.stringify({ type: 'ping' })), PING_INTERVAL_SECONDS * 1000);
+
+      every(socket, TYPING_PER_MINUTE, () => {
+        socket.send(JSON.stringify({ type: 'typing', is_typing: true }));
+      });
+
+      every(socket, MESSAGES_PER_MINUTE, () => {
+        sequence += 1;
+        socket.send(JSON.stringify({
+          type: 'message',
+          content: `k6 chat load ${__VU}-${sequence}`,
+          message_type: 'text',
+          client_message_id: `${__VU}:${sequence}:${Date.now()}`,
+        }));
+        chatMessagesSent.add(1);
+      });
+
+      every(socket, READS_PER_MINUTE, () => {
+        if (lastReceivedId) {
+          socket.send(JSON.stringify({ type: 'read', read_up_to: lastReceivedId }));
+        }
+      });
+
+      socket.setTimeout(() => socket.close(), holdMs);
+    });
+
+    socket.on('message', (raw) => {
+      let frame;
+      try {
+        frame = JSON.parse(raw);
+      } catch (_) {
+        return;
+      }
+
+      if (frame.type === 'error') {
+        chatErrorFrames.add(1);
+        return;
+      }
+      if (frame.type !== 'message') {
+        return;
+      }
+
+      chatMessagesReceived.add(1);
+      if (frame.data && frame.data.id) {
+        lastReceivedId = frame.data.id;
+      }
+
+      const parts = String(frame.client_message_id || '').split(':');
+      if (parts.length !== 3) {
+        return;
+      }
+      const latency = Date.now() - Number(parts[2]);
+      if (Number(parts[0]) === __VU) {
+        chatAckDuration.add(latency);
+      } else {
+        chatFanoutDuration.add(latency);
+      }
+    });
+
+    socket.on('error', () => wsConnectErrors.add(1));
+  });
+
+  const ok = check(response, {
+    'chat socket upgraded': (r) => r && r.status === 101,
+  });
+  if (!ok) {
+    wsConnectErrors.add(1);
+  }
+}
+
+export function monitorServer() {
+  const response = http.get(`${BASE_URL}${API_PREFIX}/chat/health`, {
+    tags: { name: 'chat_health_monitor' },
+  });
+  const body = safeJson(response);
+  const stats = body && body.websocket_stats;
+
+  if (stats) {
+    const tags = { worker: String(stats.worker_pid || 'unknown') };
+    if (stats.db_pool_checkedout !== null && stats.db_pool_checkedout !== undefined) {
+      dbPoolCheckedout.add(stats.db_pool_checkedout, tags);
+    }
+    if (stats.worker_rss_mb !== undefined) {
+      workerRssMb.add(stats.worker_rss_mb, tags);
+    }
+    if (stats.queued_messages !== undefined) {
+      workerQueuedMessages.add(stats.queued_messages, tags);
+    }
+  }
+
+  sleep(MONITOR_INTERVAL_SECONDS);
+}
+
+export function handleSummary(data) {
+  const resultFile = __ENV.RESULT_FILE || 'results/baseline/chat-websocket.json';
+  const fanout = data.metrics.chat_fanout_duration?.values || {};
+  return {
+    [resultFile]: JSON.stringify(data, null, 2),
+    stdout:
+      `chat-websocket finished | sockets=${SOCKETS} ` +
+      `sent=${data.metrics.chat_messages_sent?.values?.count || 0} ` +
+      `received=${data.metrics.chat_messages_received?.values?.count || 0} ` +
+      `fanout_p95=${(fanout['p(95)'] || 0).toFixed(1)}ms`,
+  };
+}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria y coste de connect/broadcast/disconnect del
+ConnectionManager del chat con N conexiones simuladas (sin red ni Redis).
+
+Uso (desde MAEBACKEND/backend_api):
+
+    python3 tests/load-testing/tools/benchmark_chat_connection_manager.py \
+        --connections 50000 --users 20000 --conversations 10000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+# Solo se mide el estado local del worker
+os.environ.setdefault("CHAT_PUBSUB_ENABLED", "false")
+
+from app.services.chat.websocket_manager import ConnectionManager  # noqa: E402
+
+
+class _IdleSocket:
+    """Socket simulado: acepta y descarta lo que se le envía."""
+
+    __slots__ = ("sent",)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def accept(self):
+        return None
+
+    async def send_json(self, message):
+        self.sent += 1
+
+    async def close(self, code: int = 1000):
+        return None
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run(connections: int, users: int, conversations: int, broadcasts: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    conversation_ids = [uuid.uuid4() for _ in range(conversations)]
+
+    manager = ConnectionManager()
+    sockets = []
+
+    gc.collect()
+    tracemalloc.start()
+    baseline_bytes, _ = tracemalloc.get_traced_memory()
+
+    started = time.perf_counter()
+    for _ in range(connections):
+        socket = _IdleSocket()
+        await manager.connect(socket, rng.choice(user_ids), rng.choice(conversation_ids))
+        sockets.append(socket)
+    connect_seconds = time.perf_counter() - started
+
+    # Dejar que arranquen las tareas escritoras
+    await asyncio.sleep(0)
+    gc.collect()
+    connected_bytes, peak_bytes = tracemalloc.get_traced_memory()
+
+    broadcast_latencies_ms = []
+    active_conversations = list(manager.conversation_sockets.keys())
+    for _ in range(broadcasts):
+        conversation_id = rng.choice(active_conversations)
+        started = time.perf_counter()
+        await manager._broadcast_local({"type": "message", "data": {}}, conversation_id)
+        broadcast_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    disconnect_latencies_ms = []
+    rng.shuffle(sockets)
+    for socket in sockets:
+        started = time.perf_counter()
+        await manager.disconnect(socket)
+        disconnect_latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    gc.collect()
+    final_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    manager_bytes = connected_bytes - baseline_bytes
+    return {
+        "connections": connections,
+        "users": users,
+        "conversations": conversations,
+        "connect_total_s": round(connect_seconds, 3),
+        "memory_mb": round(manager_bytes / (1024 * 1024), 2),
+        "peak_memory_mb": round((peak_bytes - baseline_bytes) / (1024 * 1024), 2),
+        "bytes_per_connection": round(manager_bytes / max(1, connections)),
+        "broadcast_p50_ms": round(_percentile(broadcast_latencies_ms, 50), 4),
+        "broadcast_p99_ms": round(_percentile(broadcast_latencies_ms, 99), 4),
+        "disconnect_p50_ms": round(_percentile(disconnect_latencies_ms, 50), 4),
+        "disconnect_p99_ms": round(_percentile(disconnect_latencies_ms, 99), 4),
+        "leftover_indexes": {
+            "active_connections": len(manager.active_connections),
+            "conversation_sockets": len(manager.conversation_sockets),
+            "user_conversations": len(manager.user_conversations),
+            "connections": len(manager.connections),
+        },
+        "residual_memory_mb": round((final_bytes - baseline_bytes) / (1024 * 1024), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ConnectionManager memory/latency")
+    parser.add_argument("--connections", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--conversations", type=int, default=10000)
+    parser.add_argument("--broadcasts", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-json", default=None)
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        _run(args.connections, args.users, args.conversations, args.broadcasts, args.seed)
+    )
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output_json:
+        Path(args.output_json).write_text(output, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput del pipeline de imágenes (imágenes/s y por core).
+
+Genera fotos sintéticas del tamaño de una cámara de móvil y las procesa con
+LocalMediaService.save_image_file: primero en serie en este proceso y luego
+con ImagePipeline (ProcessPoolExecutor) para cada número de workers.
+
+Uso (desde MAEBACKEND/backend_api):
+
+    python3 tests/load-testing/tools/benchmark_image_pipeline.py \
+        --images 40 --workers 1,2,4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[3]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+# Todo lo generado queda en un directorio temporal. Los procesos spawn del
+# pool reimportan este script: heredan el directorio por variable de entorno.
+if "IMAGE_PIPELINE_BENCH_DIR" not in os.environ:
+    os.environ["IMAGE_PIPELINE_BENCH_DIR"] = tempfile.mkdtemp(prefix="image_pipeline_bench_")
+WORK_DIR = Path(os.environ["IMAGE_PIPELINE_BENCH_DIR"])
+os.environ["UPLOAD_PATH"] = str(WORK_DIR / "uploads")
+os.environ.setdefault("MEDIA_BASE_URL", "http://localhost/media")
+
+from PIL import Image  # noqa: E402
+
+from app.services.image_pipeline import ImagePipeline  # noqa: E402
+from app.services.local_media_service import LocalMediaService  # noqa: E402
+
+LISTING_ID = "benchmark-listing"
+
+
+def _make_photo(path: Path, width: int, height: int, seed: int) -> None:
+    """Ruido de baja frecuencia ampliado: comprime como una foto real, no como ruido puro."""
+    base = Image.effect_noise((max(1, width // 16), max(1, height // 16)), 40 + seed % 20)
+    channels = [base.rotate(angle) for angle in (0, 90 * (seed % 2), 180)]
+    small = Image.merge("RGB", [c.resize(base.size) for c in channels])
+    small.resize((width, height), Image.BICUBIC).save(path, "JPEG", quality=92)
+
+
+def _generate_sources(count: int, width: int, height: int) -> list[Path]:
+    source_dir = WORK_DIR / "sources"
+    source_dir.mkdir(parents=True, exist_ok=True)
+    sources = []
+    for index in range(count):
+        path = source_dir / f"photo_{index}.jpg"
+        _make_photo(path, width, height, index)
+        sources.append(path)
+    return sources
+
+
+def _run_serial(sources: list[Path]) -> float:
+    service = LocalMediaService()
+    started = time.perf_counter()
+    for path in sources:
+        service.save_image_file(LISTING_ID, path, path.name)
+    return time.perf_counter() - started
+
+
+async def _run_pool(sources: list[Path], workers: int) -> float:
+    pipeline = ImagePipeline(max_workers=workers)
+    try:
+        # Calentar el pool (arranque de procesos spawn fuera de la medición)
+        await asyncio.gather(*[
+            pipeline.submit(LISTING_ID, sources[0], sources[0].name) for _ in range(workers)
+        ])
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            pipeline.submit(LISTING_ID, path, path.name) for path in sources
+        ])
+        return time.perf_counter() - started
+    finally:
+        pipeline.shutdown()
+
+
+def _row(mode: str, workers: int, images: int, seconds: float) -> dict:
+    images_per_second = images / seconds if seconds else 0.0
+    return {
+        "mode": mode,
+        "workers": workers,
+        "images": images,
+        "seconds": round(seconds, 3),
+        "images_per_second": round(images_per_second, 2),
+        "images_per_second_per_core": round(images_per_second / max(1, workers), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark image pipeline throughput")
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--workers", default=None,
+                        help="Lista separada por comas (por defecto 1,2,4,... hasta los cores)")
+    parser.add_argument("--output-json", default=None)
+    args = parser.parse_args()
+
+    cpu_count = os.cpu_count() or 1
+    if args.workers:
+        worker_counts = [int(value) for value in args.workers.split(",") if value.strip()]
+    else:
+        worker_counts = sorted({min(cpu_count, 2 ** power) for power in range(0, 8)})
+
+    sources = _generate_sources(args.images, args.width, args.height)
+
+    results = [_row("serial", 1, len(sources), _run_serial(sources))]
+    for workers in worker_counts:
+        seconds = asyncio.run(_run_pool(sources, workers))
+        results.append(_row("process_pool", workers, len(sources), seconds))
+
+    output = json.dumps({
+        "cpu_count": cpu_count,
+        "source_resolution": f"{args.width}x{args.height}",
+        "work_dir": str(WORK_DIR),
+        "results": results,
+    }, indent=2)
+    print(output)
+    if args.output_json:
+        Path(args.output_json).write_text(output, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,57 @@ def _extract_metrics(payload: dict) -> dict:
     }
 
 
+CHAT_KEYS = [
+    "ws_connect_p95_ms",
+    "ws_connect_errors",
+    "fanout_p50_ms",
+    "fanout_p95_ms",
+    "fanout_p99_ms",
+    "ack_p95_ms",
+    "messages_sent",
+    "messages_received",
+    "db_pool_checkedout_max",
+    "worker_rss_mb_max",
+    "worker_rss_mb_avg",
+]
+
+
+def _extract_chat_metrics(payload: dict) -> dict | None:
+    """Métricas del escenario k6-chat-websocket.js (None en escenarios HTTP)."""
+    metrics = payload.get("metrics", {})
+    if "chat_fanout_duration" not in metrics and "chat_messages_sent" not in metrics:
+        return None
+
+    def values(name: str) -> dict:
+        return metrics.get(name, {}).get("values", {})
+
+    return {
+        "ws_connect_p95_ms": values("ws_connect_duration").get("p(95)", 0.0),
+        "ws_connect_errors": values("ws_connect_errors").get("count", 0),
+        "fanout_p50_ms": values("chat_fanout_duration").get("med", 0.0),
+        "fanout_p95_ms": values("chat_fanout_duration").get("p(95)", 0.0),
+        "fanout_p99_ms": values("chat_fanout_duration").get("p(99)", 0.0),
+        "ack_p95_ms": values("chat_ack_duration").get("p(95)", 0.0),
+        "messages_sent": values("chat_messages_sent").get("count", 0),
+        "messages_received": values("chat_messages_received").get("count", 0),
+        "db_pool_checkedout_max": values("chat_db_pool_checkedout").get("max", 0),
+        "worker_rss_mb_max": values("chat_worker_rss_mb").get("max", 0.0),
+        "worker_rss_mb_avg": values("chat_worker_rss_mb").get("avg", 0.0),
+    }
+
+
+def _aggregate_keys(rows: list[dict], keys: list[str]) -> dict:
+    summary = {}
+    for key in keys:
+        values = [r[key] for r in rows]
+        summary[key] = {
+            "mean": statistics.mean(values) if values else 0,
+            "min": min(values) if values else 0,
+            "max": max(values) if values else 0,
+        }
+    return summary
+
+
 def _aggregate(rows: list[dict]) -> dict:
     keys = [
         "requests_total",
@@ -34,14 +85,7 @@ def _aggregate(rows: list[dict]) -> dict:
         "error_rate",
     ]
 
-    summary = {}
-    for key in keys:
-        values = [r[key] for r in rows]
-        summary[key] = {
-            "mean": statistics.mean(values) if values else 0,
-            "min": min(values) if values else 0,
-            "max": max(values) if values else 0,
-        }
+    summary = _aggregate_keys(rows, keys)
 
     # reproducibility score: relative spread on p95 and error_rate
     p95_mean = summary["p95_ms"]["mean"] or 1
@@ -94,6 +138,36 @@ def _to_markdown(summary_by_scenario: dict) -> str:
             )
         lines.append("")
 
+    chat_scenarios = {
+        scenario: data for scenario, data in summary_by_scenario.items() if data.get("chat")
+    }
+    if chat_scenarios:
+        lines += [
+            "## Chat WebSocket",
+            "",
+            "| Scenario | WS connect p95 ms | WS connect errors | Fan-out p50 ms | Fan-out p95 ms | "
+            "Fan-out p99 ms | Ack p95 ms | Sent | Received | DB pool checkedout max | "
+            "Worker RSS MB max | Worker RSS MB avg |",
+            "|---|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+        ]
+        for scenario, data in chat_scenarios.items():
+            chat = data["chat"]
+            lines.append(
+                f"| {scenario} | "
+                f"{chat['ws_connect_p95_ms']['mean']:.2f} | "
+                f"{chat['ws_connect_errors']['max']:.0f} | "
+                f"{chat['fanout_p50_ms']['mean']:.2f} | "
+                f"{chat['fanout_p95_ms']['mean']:.2f} | "
+                f"{chat['fanout_p99_ms']['mean']:.2f} | "
+                f"{chat['ack_p95_ms']['mean']:.2f} | "
+                f"{chat['messages_sent']['mean']:.0f} | "
+                f"{chat['messages_received']['mean']:.0f} | "
+                f"{chat['db_pool_checkedout_max']['max']:.0f} | "
+                f"{chat['worker_rss_mb_max']['max']:.2f} | "
+                f"{chat['worker_rss_mb_avg']['mean']:.2f} |"
+            )
+        lines.append("")
+
     return "\n".join(lines)
 
 
@@ -108,6 +182,7 @@ def main() -> None:
     files = sorted(input_dir.glob("*.json"))
 
     grouped = {}
+    chat_grouped = {}
     for file in files:
         name = file.stem
         if "_run" not in name:
@@ -116,6 +191,9 @@ def main() -> None:
         payload = json.loads(file.read_text(encoding="utf-8"))
         row = _extract_metrics(payload)
         grouped.setdefault(scenario, []).append(row)
+        chat_row = _extract_chat_metrics(payload)
+        if chat_row is not None:
+            chat_grouped.setdefault(scenario, []).append(chat_row)
 
     summary_by_scenario = {}
     for scenario, rows in grouped.items():
@@ -124,6 +202,9 @@ def main() -> None:
             "rows": rows,
             "aggregate": _aggregate(rows),
         }
+        if scenario in chat_grouped:
+            summary_by_scenario[scenario]["chat_rows"] = chat_grouped[scenario]
+            summary_by_scenario[scenario]["chat"] = _aggregate_keys(chat_grouped[scenario], CHAT_KEYS)
 
     output_json = Path(args.output_json)
     output_json.write_text(json.dumps(summary_by_scenario, indent=2), encoding="utf-8")
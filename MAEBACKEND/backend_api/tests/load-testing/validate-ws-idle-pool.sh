@@ -0,0 +1,86 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Valida que N sockets de chat inactivos no mantienen conexiones del pool
+# de BD en checkout: se muestrea `checkedout` mientras los sockets están
+# abiertos y se falla si supera el baseline medido antes de la carga.
+
+BASE_URL="${BASE_URL:-http://localhost:8080}"
+API_PREFIX="${API_PREFIX:-/v1}"
+SOCKETS="${SOCKETS:-200}"
+HOLD_SECONDS="${HOLD_SECONDS:-60}"
+SETTLE_SECONDS="${SETTLE_SECONDS:-15}"
+
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+SCENARIO_FILE="$ROOT_DIR/scenarios/k6-chat-idle-sockets.js"
+
+if [[ -z "${AUTH_TOKEN:-}" || -z "${CONVERSATION_ID:-}" ]]; then
+  echo "ERROR: AUTH_TOKEN y CONVERSATION_ID son obligatorios"
+  exit 1
+fi
+
+if [[ "$SETTLE_SECONDS" -ge "$HOLD_SECONDS" ]]; then
+  echo "ERROR: SETTLE_SECONDS debe ser menor que HOLD_SECONDS"
+  exit 1
+fi
+
+PRIMARY_POOL_ENDPOINT="${BASE_URL}${API_PREFIX}/system/stats/database/pool"
+FALLBACK_POOL_ENDPOINT="${BASE_URL}/stats/database/pool"
+
+resolve_pool_endpoint() {
+  local endpoint="$1"
+  local code
+  code="$(curl -s -o /dev/null -w "%{http_code}" "$endpoint" || true)"
+  if [[ "$code" == "200" ]]; then
+    echo "$endpoint"
+    return 0
+  fi
+  return 1
+}
+
+read_checkedout() {
+  curl -fsS "$POOL_ENDPOINT" | python3 -c 'import json,sys; d=json.loads(sys.stdin.read()); print((d.get("data") or {}).get("checkedout", 0))'
+}
+
+POOL_ENDPOINT="$(resolve_pool_endpoint "$PRIMARY_POOL_ENDPOINT" || resolve_pool_endpoint "$FALLBACK_POOL_ENDPOINT" || true)"
+
+if [[ -z "$POOL_ENDPOINT" ]]; then
+  echo "ERROR: no se encontró endpoint de pool (intentados: $PRIMARY_POOL_ENDPOINT y $FALLBACK_POOL_ENDPOINT)"
+  exit 1
+fi
+
+echo "[1/4] Snapshot inicial de pool: ${POOL_ENDPOINT}"
+BEFORE_CHECKEDOUT="$(read_checkedout)"
+echo "checkedout(before)=${BEFORE_CHECKEDOUT}"
+
+echo "[2/4] Abriendo ${SOCKETS} sockets de chat inactivos durante ${HOLD_SECONDS}s"
+BASE_URL="$BASE_URL" API_PREFIX="$API_PREFIX" SOCKETS="$SOCKETS" HOLD_SECONDS="$HOLD_SECONDS" \
+  k6 run "$SCENARIO_FILE" &
+K6_PID=$!
+trap 'kill "$K6_PID" 2>/dev/null || true' EXIT
+
+echo "[3/4] Muestreando pool con sockets abiertos (tras ${SETTLE_SECONDS}s de asentamiento)"
+sleep "$SETTLE_SECONDS"
+MAX_CHECKEDOUT=0
+SAMPLE_UNTIL=$(( $(date +%s) + HOLD_SECONDS - SETTLE_SECONDS - 5 ))
+
+while [[ "$(date +%s)" -lt "$SAMPLE_UNTIL" ]]; do
+  CURRENT="$(read_checkedout)"
+  if [[ "$CURRENT" -gt "$MAX_CHECKEDOUT" ]]; then
+    MAX_CHECKEDOUT="$CURRENT"
+  fi
+  sleep 2
+done
+
+wait "$K6_PID" || true
+trap - EXIT
+
+echo "[4/4] Resultado"
+echo "checkedout(before)=${BEFORE_CHECKEDOUT} checkedout(max con ${SOCKETS} sockets)=${MAX_CHECKEDOUT}"
+
+if [[ "$MAX_CHECKEDOUT" -gt "$BEFORE_CHECKEDOUT" ]]; then
+  echo "FAIL: los sockets inactivos mantienen conexiones del pool en checkout"
+  exit 2
+fi
+
+echo "OK: ${SOCKETS} sockets de chat inactivos no consumen conexiones del pool."